@@ -1,29 +1,82 @@
-from sklearn.linear_model import LinearRegression
+import hashlib
+import json
+import os
 import numpy as np
 
 class BatteryPredictionAi:
-    def __init__(self):
-        self._model = LinearRegression()
-        self._train_model()
+    # x [wind_kmh, temperature, raining]
+    _X_TRAIN = [
+        [0, 20, 0],
+        [0, 10, 1],
+        [0, 0, 0],
+        [0, -10, 0],
+        [10, 7, 1],
+        [10, 18, 0],
+        [30, 5, 0]
+    ]
+    _Y_TRAIN = [1.0, 1.1, 1.2, 1.5, 1.3, 1.1, 1.6]
+    _MODEL_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "battery_model.json")
 
-    def _train_model(self):
-        # x [wind_kmh, temperature, raining]
-        X_train = [
-            [0, 20, 0],
-            [0, 10, 1],
-            [0, 0, 0],
-            [0, -10, 0],
-            [10, 7, 1],
-            [10, 18, 0],
-            [30, 5, 0]
-        ]
-        y_train = [1.0, 1.1, 1.2, 1.5, 1.3, 1.1, 1.6]
-        self._model.fit(X_train, y_train)
-        
-    def predict_drain_multiplier(self, wind_speed, temperature, is_raining):
-        prediction = self._model.predict([[wind_speed, temperature, is_raining]])
-        return max(1.0, prediction[0])
-    
+    def __init__(self, model_file = None):
+        # the fitted coefficients are stored next to the module together with a hash of the training data,
+        # so startup only retrains (and only imports scikit-learn) when the training data changed
+        self._model_file = model_file or self._MODEL_FILE
+        self._coefficients = None
+        self._intercept = 0.0
+        if not self._load_model():
+            self._train_model()
+            self._save_model()
+
+    def _training_hash(self) -> str:
+        payload = json.dumps([self._X_TRAIN, self._Y_TRAIN])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _load_model(self) -> bool:
+        try:
+            with open(self._model_file, "r", encoding = "utf-8") as f:
+                stored = json.load(f)
+            if stored["training_hash"] != self._training_hash():
+                return False
+            self._coefficients = np.array(stored["coefficients"], dtype = float)
+            self._intercept = float(stored["intercept"])
+            return True
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
 
+    def _save_model(self):
+        stored = {
+            "training_hash": self._training_hash(),
+            "coefficients": self._coefficients.tolist(),
+            "intercept": self._intercept
+        }
+        try:
+            with open(self._model_file, "w", encoding = "utf-8") as f:
+                json.dump(stored, f, indent = 2)
+        except OSError as e:
+            print(f"WARNING: Could not save battery model {e}")
 
+    def _train_model(self):
+        try:
+            from sklearn.linear_model import LinearRegression
+        except ImportError:
+            # ordinary least squares with an intercept column gives the same fit
+            X = np.column_stack([np.ones(len(self._X_TRAIN)), np.array(self._X_TRAIN, dtype = float)])
+            solution = np.linalg.lstsq(X, np.array(self._Y_TRAIN, dtype = float), rcond = None)[0]
+            self._intercept = float(solution[0])
+            self._coefficients = solution[1:]
+            return
+        model = LinearRegression()
+        model.fit(self._X_TRAIN, self._Y_TRAIN)
+        self._coefficients = np.array(model.coef_, dtype = float)
+        self._intercept = float(model.intercept_)
+
+    def predict_drain_multiplier(self, wind_speed, temperature, is_raining):
+        c = self._coefficients
+        prediction = self._intercept + c[0] * wind_speed + c[1] * temperature + c[2] * is_raining
+        return max(1.0, float(prediction))
 
+    def predict_drain_multiplier_batch(self, wind_speeds, temperatures, is_raining) -> np.ndarray:
+        """Drain multipliers for many samples at once, arguments are equal length arrays"""
+        X = np.column_stack([np.asarray(wind_speeds, dtype = float), np.asarray(temperatures, dtype = float),
+                             np.asarray(is_raining, dtype = float)])
+        return np.maximum(1.0, X @ self._coefficients + self._intercept)
@@ -5,7 +5,7 @@ a = Analysis(
     ['main.py'],
     pathex=[],
     binaries=[],
-    datas=[],
+    datas=[('AI/battery_model.json', 'AI')],
     hiddenimports=['uvicorn', 'fastapi', 'sklearn', 'pandas'],
     hookspath=[],
     hooksconfig={},
@@ -1,52 +1,173 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 import uvicorn
-from fastapi.responses import HTMLResponse
+import asyncio
+import codecs
+import functools
+import json
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
+from models.status import DroneStatus, ParcelStatus
+from services.metrics import REGISTRY
+from services.ingest import RecordParser, ingest_chunk
 
 app = FastAPI(title="Drone App Manager")
 drone_repo = None
 parcel_repo = None
+# routes run on the event loop and only call the services (blocking SQLite/file I/O) through this pool,
+# so a slow repository read queues here instead of stalling every other request
+_IO_WORKERS = 4
+_executor = ThreadPoolExecutor(max_workers = _IO_WORKERS, thread_name_prefix = "api-io")
+# without an event bus (a standalone server process) writes happen in another process and the
+# repository versions never move, the snapshots then expire every _snapshot_ttl seconds instead
+# and the pages poll for them at the same interval
+_snapshot_ttl = None
+_event_bus = None
 
 def set_repo(repo_drone, repo_parcel):
     global drone_repo, parcel_repo
     drone_repo = repo_drone
     parcel_repo = repo_parcel
+    _row_cache.clear()
+    _page_cache.clear()
 
+def set_event_bus(bus):
+    global _event_bus
+    _event_bus = bus
+    _page_cache.clear()
+    bus.subscribe(_broadcast)
+
+def set_snapshot_ttl(seconds):
+    global _snapshot_ttl
+    _snapshot_ttl = seconds
+    _page_cache.clear()
+
+async def _offload(function, *args):
+    return await asyncio.get_running_loop().run_in_executor(_executor, functools.partial(function, *args))
+
+def _snapshot_version(version):
+    if not _snapshot_ttl:
+        return version
+    return f"{version}.{int(time.time() // _snapshot_ttl)}"
+
+# the page chrome is served as versioned static assets, browsers keep them for a year and the
+# ?v= query changes whenever their content does
+_CSS = """
+body { font-family: 'Segoe UI', sans-serif; background-color: #121212; color: #e0e0e0; padding: 0; margin: 0; }
+
+/* Navigation Bar */
+.navbar { background-color: #1e1e1e; padding: 15px; text-align: center; border-bottom: 2px solid #333; position: sticky; top: 0; z-index: 100; }
+.nav-btn { text-decoration: none; color: #888; padding: 10px 20px; font-weight: bold; border-radius: 20px; margin: 0 5px; transition: 0.3s; }
+.nav-btn.active { background-color: #2196F3; color: white; }
+.nav-btn:hover { background-color: #333; }
+
+.container { padding: 20px; max-width: 800px; margin: 0 auto; }
+.card { background: #1e1e1e; border-radius: 12px; padding: 0; box-shadow: 0 4px 6px rgba(0,0,0,0.3); overflow: hidden; }
+
+table { width: 100%; border-collapse: collapse; }
+th { background: #252525; text-align: left; color: #aaa; padding: 12px 15px; font-size: 0.85em; text-transform: uppercase; letter-spacing: 1px; }
+td { padding: 15px; border-bottom: 1px solid #2c2c2c; vertical-align: middle; font-size: 0.95em; }
+tr:last-child td { border-bottom: none; }
+
+.badge { padding: 5px 10px; border-radius: 6px; font-size: 0.8em; font-weight: bold; color: white; display: inline-block; }
+.badge-yellow { background-color: #FFC107; color: black; } /* Pending */
+.badge-blue { background-color: #2196F3; } /* Assigned */
+.badge-green { background-color: #4CAF50; } /* Delivered */
+.badge-gray { background-color: #666; } /* Unknown */
+
+.detail-text { display: block; font-size: 0.8em; color: #888; margin-top: 4px; }
+"""
+
+# patches the tables from /events: changed rows arrive already rendered and replace the old ones by id,
+# charging drones are ticked locally with the same charge curve as models.drone so nothing is pushed while they charge
+_LIVE_SCRIPT = """
+const FAST_RATE = 0.3, SLOW_RATE = 0.1, FAST_LIMIT = 80;
+function chargedLevel(level, seconds) {
+    if (level >= 100) return level;
+    if (level < FAST_LIMIT) {
+        const fast = Math.min(seconds, (FAST_LIMIT - level) / FAST_RATE);
+        level += fast * FAST_RATE;
+        seconds -= fast;
+    }
+    return Math.floor(Math.min(100, level + seconds * SLOW_RATE));
+}
+function stamp(row) { row.dataset.received = Date.now(); }
+function tickBatteries() {
+    document.querySelectorAll("tr[data-charging='1']").forEach(row => {
+        const level = chargedLevel(Number(row.dataset.battery), (Date.now() - Number(row.dataset.received)) / 1000);
+        const bar = row.querySelector(".battery-bar");
+        bar.style.width = level + "%";
+        bar.style.background = level > 50 ? "#4CAF50" : (level > 20 ? "#FFC107" : "#F44336");
+        bar.textContent = level + "%";
+    });
+}
+function patchRow(tbody, id, html, show) {
+    const current = document.getElementById(id);
+    if (!show) { if (current) current.remove(); return; }
+    const template = document.createElement("template");
+    template.innerHTML = html.trim();
+    const row = template.content.firstElementChild;
+    stamp(row);
+    if (current) { current.replaceWith(row); return; }
+    const before = Array.from(tbody.rows).find(other => Number(other.dataset.id) > Number(row.dataset.id));
+    tbody.insertBefore(row, before || null);
+}
+async function pollPage(tbody, last) {
+    const response = await fetch(location.href, {cache: "no-cache"});
+    if (!response.ok) return last;
+    const page = new DOMParser().parseFromString(await response.text(), "text/html");
+    const fresh = page.querySelector("tbody[data-stream]");
+    if (!fresh || fresh.innerHTML === last) return last;
+    tbody.innerHTML = fresh.innerHTML;
+    tbody.querySelectorAll("tr").forEach(stamp);
+    return fresh.innerHTML;
+}
+const tbody = document.querySelector("tbody[data-stream]");
+const pollSeconds = Number(document.body.dataset.poll || 0);
+if (tbody && pollSeconds) {
+    // no event bus behind this server, the snapshot is fetched again once per window and swapped in when it changed
+    let last = tbody.innerHTML;
+    document.querySelectorAll("tbody[data-stream] tr").forEach(stamp);
+    setInterval(tickBatteries, 1000);
+    setInterval(async () => { last = await pollPage(tbody, last).catch(() => last); }, pollSeconds * 1000);
+} else if (tbody) {
+    document.querySelectorAll("tbody[data-stream] tr").forEach(stamp);
+    setInterval(tickBatteries, 1000);
+    const source = new EventSource("/events");
+    const kind = tbody.dataset.stream;
+    source.addEventListener(kind, event => {
+        const data = JSON.parse(event.data);
+        const show = kind !== "parcel" || (data.status === "DELIVERED") === (tbody.dataset.delivered === "1");
+        patchRow(tbody, kind + "-" + data.id, data.html, show);
+    });
+    source.addEventListener(kind + "_removed", event => patchRow(tbody, kind + "-" + JSON.parse(event.data).id, "", false));
+    source.addEventListener("resync", () => location.reload());
+}
+"""
+
+_STATIC = {"dashboard.css": (_CSS, "text/css"), "live.js": (_LIVE_SCRIPT, "application/javascript")}
+_STATIC_VERSIONS = {name: f"{zlib.crc32(body.encode()):08x}" for name, (body, _) in _STATIC.items()}
+
+@app.get("/static/{name}")
+async def static_asset(name : str):
+    if name not in _STATIC:
+        raise HTTPException(status_code = 404, detail = "Not found")
+    body, media_type = _STATIC[name]
+    return Response(body, media_type = media_type, headers = {"Cache-Control": "public, max-age=31536000, immutable"})
 
 def get_base_html(title, content):
+    poll = f' data-poll="{_snapshot_ttl}"' if _event_bus is None and _snapshot_ttl else ""
     return f"""
     <!DOCTYPE html>
     <html>
     <head>
         <title>{title}</title>
-        <meta http-equiv="refresh" content="5"> 
         <meta name="viewport" content="width=device-width, initial-scale=1">
-        <style>
-            body {{ font-family: 'Segoe UI', sans-serif; background-color: #121212; color: #e0e0e0; padding: 0; margin: 0; }}
-            
-            /* Navigation Bar */
-            .navbar {{ background-color: #1e1e1e; padding: 15px; text-align: center; border-bottom: 2px solid #333; position: sticky; top: 0; z-index: 100; }}
-            .nav-btn {{ text-decoration: none; color: #888; padding: 10px 20px; font-weight: bold; border-radius: 20px; margin: 0 5px; transition: 0.3s; }}
-            .nav-btn.active {{ background-color: #2196F3; color: white; }}
-            .nav-btn:hover {{ background-color: #333; }}
-
-            .container {{ padding: 20px; max-width: 800px; margin: 0 auto; }}
-            .card {{ background: #1e1e1e; border-radius: 12px; padding: 0; box-shadow: 0 4px 6px rgba(0,0,0,0.3); overflow: hidden; }}
-            
-            table {{ width: 100%; border-collapse: collapse; }}
-            th {{ background: #252525; text-align: left; color: #aaa; padding: 12px 15px; font-size: 0.85em; text-transform: uppercase; letter-spacing: 1px; }}
-            td {{ padding: 15px; border-bottom: 1px solid #2c2c2c; vertical-align: middle; font-size: 0.95em; }}
-            tr:last-child td {{ border-bottom: none; }}
-            
-            .badge {{ padding: 5px 10px; border-radius: 6px; font-size: 0.8em; font-weight: bold; color: white; display: inline-block; }}
-            .badge-yellow {{ background-color: #FFC107; color: black; }} /* Pending */
-            .badge-blue {{ background-color: #2196F3; }} /* Assigned */
-            .badge-green {{ background-color: #4CAF50; }} /* Delivered */
-            .badge-gray {{ background-color: #666; }} /* Unknown */
-
-            .detail-text {{ display: block; font-size: 0.8em; color: #888; margin-top: 4px; }}
-        </style>
+        <link rel="stylesheet" href="/static/dashboard.css?v={_STATIC_VERSIONS['dashboard.css']}">
     </head>
-    <body>
+    <body{poll}>
         <div class="navbar">
             <a href="/drones" class="nav-btn {'active' if 'Drone' in title else ''}"> Drones</a>
             <a href="/parcels" class="nav-btn {'active' if 'Parcel' in title else ''}"> Parcels</a>
@@ -57,34 +178,53 @@ def get_base_html(title, content):
                 {content}
             </div>
             <p style="text-align: center; color: #555; font-size: 0.8em; margin-top: 20px;">
-                Live Connection • Auto-Refresh (5s)
+                Live Connection • {'Polling Updates' if poll else 'Push Updates'}
             </p>
         </div>
+        <script src="/static/live.js?v={_STATIC_VERSIONS['live.js']}"></script>
     </body>
     </html>
     """
 
-@app.get("/drones", response_class=HTMLResponse)
-@app.get("/", response_class=HTMLResponse)
-def drone_status():
-    if drone_repo is None:
-        return "<h1> System Offline (Repo not connected) <h1>"
-    
-    drones = drone_repo.list_the_drones()
-    rows_html = ""
-    for drone in drones:
-        status_color = "#4CAF50" if drone.get_status() == "IDLE" else "#FF5722"
-        battery = drone.get_battery_level()
-        batt_color = "#4CAF50" if battery > 50 else ("#FFC107" if battery > 20 else "#F44336")
-
-        rows_html += f"""
-        <tr>
+# rendered rows keyed by (kind, id) and stored with the field values they were rendered from, so a row is
+# only rendered again once one of those changed; whole pages are kept per repository version on top of that
+_row_cache = {}
+_page_cache = {}
+
+def _cached_row(kind : str, item_id : int, signature : tuple, render):
+    cached = _row_cache.get((kind, item_id))
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    html = render()
+    _row_cache[(kind, item_id)] = (signature, html)
+    return html
+
+async def _cached_page(name : str, version, build):
+    version = _snapshot_version(version)
+    cached = _page_cache.get(name)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    html = await _offload(build)
+    _page_cache[name] = (version, html)
+    return html
+
+def _drone_row(drone):
+    battery = drone.get_battery_level()
+    charging = 0 if drone.get_charging_since() is None else 1
+    signature = (drone.get_model_type(), drone.get_status(), battery, charging)
+    return _cached_row("drone", drone.get_id(), signature, lambda: _render_drone_row(drone, battery, charging))
+
+def _render_drone_row(drone, battery, charging):
+    status_color = "#4CAF50" if drone.get_status() == "IDLE" else "#FF5722"
+    batt_color = "#4CAF50" if battery > 50 else ("#FFC107" if battery > 20 else "#F44336")
+    return f"""
+        <tr id="drone-{drone.get_id()}" data-id="{drone.get_id()}" data-battery="{battery}" data-charging="{charging}">
             <td><strong>#{drone.get_id()}</strong></td>
             <td>{drone.get_model_type()}</td>
             <td><span style="background-color: {status_color}; padding: 4px 8px; border-radius: 4px; color: white; font-size: 0.9em;">{drone.get_status()}</span></td>
             <td>
                 <div style="background: #333; width: 100%; height: 20px; border-radius: 10px; overflow: hidden;">
-                    <div style="width: {battery}%; height: 100%; background: {batt_color}; text-align: center; line-height: 20px; font-size: 0.8em; color: black; font-weight: bold;">
+                    <div class="battery-bar" style="width: {battery}%; height: 100%; background: {batt_color}; text-align: center; line-height: 20px; font-size: 0.8em; color: black; font-weight: bold;">
                         {battery}%
                     </div>
                 </div>
@@ -92,29 +232,19 @@ def drone_status():
         </tr>
         """
 
-    content = f"<table><thead><tr><th>ID</th><th>Model</th><th>Status</th><th>Battery</th></tr></thead><tbody>{rows_html}</tbody></table>"
-    return get_base_html("Drone Status", content)
-    
+_BADGES = {"PENDING": "badge-yellow", "ASSIGNED": "badge-blue", "DELIVERED": "badge-green"}
 
-@app.get("/parcels", response_class=HTMLResponse)
-def parcels_status():
-    if parcel_repo is None:
-        return "<h1> System Offline (Repo not connected) <h1>"
-    
-    parcels = parcel_repo.get_parcels()
-    rows_html = ""
-    for parcel in parcels:
-        if parcel.get_status() != "DELIVERED":
-            status = parcel.get_status()
-            if status == "PENDING": badge_class = "badge-yellow"
-            elif status == "ASSIGNED": badge_class = "badge-blue"
-            else: badge_class = "badge-gray"
-
-            rows_html += f"""
-            <tr>
+def _parcel_row(parcel):
+    signature = (parcel.get_status(), parcel.get_weight(), parcel.get_delivery_address(), parcel.get_distance())
+    return _cached_row("parcel", parcel.get_id(), signature, lambda: _render_parcel_row(parcel))
+
+def _render_parcel_row(parcel):
+    status = parcel.get_status()
+    return f"""
+            <tr id="parcel-{parcel.get_id()}" data-id="{parcel.get_id()}">
                 <td style="font-weight: bold; color: #fff;">#{parcel.get_id()}</td>
                 <td>
-                    <span class="badge {badge_class}">{status}</span>
+                    <span class="badge {_BADGES.get(status, 'badge-gray')}">{status}</span>
                 </td>
                 <td>
                     {parcel.get_weight()}kg
@@ -127,39 +257,279 @@ def parcels_status():
             </tr>
             """
 
-    content = f"<table><thead><tr><th>ID</th><th>Status</th><th>Details</th><th>Dest</th></tr></thead><tbody>{rows_html}</tbody></table>"
-    return get_base_html("Parcel Manifest", content)
+@app.get("/drones", response_class=HTMLResponse)
+@app.get("/", response_class=HTMLResponse)
+async def drone_status():
+    if drone_repo is None:
+        return "<h1> System Offline (Repo not connected) <h1>"
+    
+    def build():
+        rows_html = "".join(_drone_row(drone) for drone in drone_repo.iter_drones())
+        content = f"<table><thead><tr><th>ID</th><th>Model</th><th>Status</th><th>Battery</th></tr></thead><tbody data-stream=\"drone\">{rows_html}</tbody></table>"
+        return get_base_html("Drone Status", content)
+    return await _cached_page("drones", _drones_page_version(), build)
+    
+
+@app.get("/parcels", response_class=HTMLResponse)
+async def parcels_status():
+    if parcel_repo is None:
+        return "<h1> System Offline (Repo not connected) <h1>"
+    
+    def build():
+        rows_html = "".join(_parcel_row(parcel) for parcel in parcel_repo.iter_parcels() if parcel.get_status() != "DELIVERED")
+        content = f"<table><thead><tr><th>ID</th><th>Status</th><th>Details</th><th>Dest</th></tr></thead><tbody data-stream=\"parcel\" data-delivered=\"0\">{rows_html}</tbody></table>"
+        return get_base_html("Parcel Manifest", content)
+    return await _cached_page("parcels", parcel_repo.parcels_version(), build)
         
 @app.get("/parcels_history", response_class=HTMLResponse)
-def parcels_history():
+async def parcels_history():
     if parcel_repo is None:
         return "<h1> System Offline (Repo not connected) <h1>"
     
-    parcels = parcel_repo.get_delivered_parcels()
-    rows_html = ""
-    for parcel in parcels:
+    def build():
+        rows_html = "".join(_parcel_row(parcel) for parcel in parcel_repo.get_delivered_parcels())
+        content = f"<table><thead><tr><th>ID</th><th>Status</th><th>Details</th><th>Dest</th></tr></thead><tbody data-stream=\"parcel\" data-delivered=\"1\">{rows_html}</tbody></table>"
+        return get_base_html("Parcel History", content)
+    return await _cached_page("parcels_history", parcel_repo.parcels_version(), build)
 
-        badge_class = "badge-green"
+# idle drones charge lazily, their battery changes without a write, so drone ETags and the cached drone page also roll over every window
+_CHARGE_WINDOW_SECONDS = 10
 
-        rows_html += f"""
-            <tr>
-            <td style="font-weight: bold; color: #fff;">#{parcel.get_id()}</td>
-            <td>
-             <span class="badge {badge_class}">{parcel.get_status()}</span>
-            </td>
-            <td>
-            {parcel.get_weight()}kg
-             <span class="detail-text">Priority: Standard</span>
-            </td>
-            <td>
-            <span style="color: #ddd;">{parcel.get_delivery_address()[:15]}...</span>
-            <span class="detail-text">{parcel.get_distance()} km</span>
-                </td>
-            </tr>
-            """
-        
-    content = f"<table><thead><tr><th>ID</th><th>Status</th><th>Details</th><th>Dest</th></tr></thead><tbody>{rows_html}</tbody></table>"
-    return get_base_html("Parcel History", content)
+_DRONE_FIELDS = {
+    "id": lambda d: d.get_id(),
+    "serial_number": lambda d: d.get_serial_number(),
+    "model_type": lambda d: d.get_model_type(),
+    "max_payload": lambda d: d.get_max_payload(),
+    "status": lambda d: d.get_status(),
+    "battery_level": lambda d: d.get_battery_level(),
+    "charging_since": lambda d: d.get_charging_since(),
+}
+_PARCEL_FIELDS = {
+    "id": lambda p: p.get_id(),
+    "recipient_name": lambda p: p.get_recipient_name(),
+    "delivery_address": lambda p: p.get_delivery_address(),
+    "weight": lambda p: p.get_weight(),
+    "distance": lambda p: p.get_distance(),
+    "priority": lambda p: p.get_priority(),
+    "status": lambda p: p.get_status(),
+}
+_MISSION_FIELDS = {
+    "id": lambda m: m.get_id(),
+    "drone_id": lambda m: m.get_drone_id(),
+    "parcel_id": lambda m: m.get_parcel_id(),
+    "start_time": lambda m: m.get_start_time(),
+    "status": lambda m: m.get_status(),
+}
+
+def _drones_page_version():
+    return f"{drone_repo.drones_version()}.{int(time.time() // _CHARGE_WINDOW_SECONDS)}"
+
+async def _json_page(request : Request, resource : str, version, serializers : dict, fetch, fields, offset : int, limit : int):
+    """Serves one page as JSON, answering 304 without touching the repository when the ETag still matches"""
+    selected = list(serializers) if not fields else [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in selected if field not in serializers]
+    if unknown:
+        raise HTTPException(status_code = 400, detail = f"Unknown fields: {', '.join(unknown)}")
+
+    etag = f'"{resource}-{_snapshot_version(version)}-{zlib.crc32(str(request.url.query).encode()):08x}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]):
+        return Response(status_code = 304, headers = headers)
+
+    def build():
+        items = fetch(offset, limit)
+        return {
+            "items": [{field: serializers[field](item) for field in selected} for item in items],
+            "offset": offset,
+            "limit": limit,
+            "next_offset": offset + limit if len(items) == limit else None
+        }
+    try:
+        body = await _offload(build)
+    except ValueError as e:
+        raise HTTPException(status_code = 400, detail = str(e))
+    return JSONResponse(body, headers = headers)
+
+def _criteria(status):
+    return {"status": status} if status else {}
+
+@app.get("/api/drones")
+async def api_drones(request : Request, offset : int = Query(0, ge = 0), limit : int = Query(50, ge = 1, le = 500),
+               status : str = None, fields : str = None, order_by : str = "id"):
+    if drone_repo is None:
+        raise HTTPException(status_code = 503, detail = "Repository not connected")
+    version = _drones_page_version()
+    fetch = lambda offset, limit: drone_repo.get_drones_page(offset, limit, order_by, **_criteria(status))
+    return await _json_page(request, "drones", version, _DRONE_FIELDS, fetch, fields, offset, limit)
+
+@app.get("/api/parcels")
+async def api_parcels(request : Request, offset : int = Query(0, ge = 0), limit : int = Query(50, ge = 1, le = 500),
+                status : str = None, fields : str = None, order_by : str = "id"):
+    if parcel_repo is None:
+        raise HTTPException(status_code = 503, detail = "Repository not connected")
+    fetch = lambda offset, limit: parcel_repo.get_parcels_page(offset, limit, order_by, **_criteria(status))
+    return await _json_page(request, "parcels", parcel_repo.parcels_version(), _PARCEL_FIELDS, fetch, fields, offset, limit)
+
+@app.get("/api/parcels/delivered")
+async def api_delivered_parcels(request : Request, offset : int = Query(0, ge = 0), limit : int = Query(50, ge = 1, le = 500),
+                          fields : str = None, order_by : str = "id"):
+    if parcel_repo is None:
+        raise HTTPException(status_code = 503, detail = "Repository not connected")
+    fetch = lambda offset, limit: parcel_repo.get_parcels_page(offset, limit, order_by, status = ParcelStatus.DELIVERED)
+    return await _json_page(request, "delivered", parcel_repo.parcels_version(), _PARCEL_FIELDS, fetch, fields, offset, limit)
+
+@app.get("/api/missions")
+async def api_missions(request : Request, offset : int = Query(0, ge = 0), limit : int = Query(50, ge = 1, le = 500),
+                 status : str = None, fields : str = None, order_by : str = "id"):
+    if parcel_repo is None:
+        raise HTTPException(status_code = 503, detail = "Repository not connected")
+    fetch = lambda offset, limit: parcel_repo.get_missions_page(offset, limit, order_by, **_criteria(status))
+    return await _json_page(request, "missions", parcel_repo.missions_version(), _MISSION_FIELDS, fetch, fields, offset, limit)
+
+# the upload is read line by line and handed to the I/O pool one chunk at a time, so a large file never
+# sits in memory and the event loop only splits lines
+_INGEST_ERROR_LIMIT = 1000
+
+async def _request_lines(request : Request):
+    decoder = codecs.getincrementaldecoder("utf-8")(errors = "replace")
+    pending = ""
+    async for data in request.stream():
+        pending += decoder.decode(data)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line
+    pending += decoder.decode(b"", final = True)
+    if pending:
+        yield pending
+
+@app.post("/api/parcels/ingest")
+async def api_ingest_parcels(request : Request, format : str = None, chunk_size : int = Query(1000, ge = 1, le = 10000)):
+    """Bulk parcel upload as NDJSON (default) or CSV, reports every rejected line (up to a limit) instead of aborting"""
+    if parcel_repo is None:
+        raise HTTPException(status_code = 503, detail = "Repository not connected")
+    if format is None:
+        format = "csv" if "csv" in request.headers.get("content-type", "") else "ndjson"
+    try:
+        parser = RecordParser(format)
+    except ValueError as e:
+        raise HTTPException(status_code = 400, detail = str(e))
+
+    added, failed, errors = 0, 0, []
+    chunk = []
+    async def flush():
+        nonlocal added, failed
+        count, chunk_errors = await _offload(ingest_chunk, parcel_repo, parser, list(chunk))
+        chunk.clear()
+        added += count
+        failed += len(chunk_errors)
+        errors.extend({"line": line_number, "error": message} for line_number, message in chunk_errors[:_INGEST_ERROR_LIMIT - len(errors)])
+
+    line_number = 0
+    async for line in _request_lines(request):
+        line_number += 1
+        chunk.append((line_number, line))
+        if len(chunk) >= chunk_size:
+            await flush()
+    if chunk:
+        await flush()
+    return {"added": added, "failed": failed, "errors": errors, "errors_truncated": failed > len(errors)}
+
+# one bounded queue per open /events stream, filled from whichever thread published the change
+_SSE_QUEUE_SIZE = 256
+_SSE_KEEPALIVE_SECONDS = 15
+_EVENT_FIELDS = {"drone": (_DRONE_FIELDS, _drone_row), "parcel": (_PARCEL_FIELDS, _parcel_row), "mission": (_MISSION_FIELDS, None)}
+_sse_clients = set()
+_sse_lock = threading.Lock()
+
+def _broadcast(kind : str, item):
+    """Serializes a change once and hands it to every connected stream, removed kinds only carry the id"""
+    if kind.endswith("_removed"):
+        # a removed row is never rendered again, drop it before the ids get reused
+        _row_cache.pop((kind[:-len("_removed")], item), None)
+    with _sse_lock:
+        clients = list(_sse_clients)
+    if not clients:
+        return
+    if kind in _EVENT_FIELDS:
+        serializers, render = _EVENT_FIELDS[kind]
+        data = {field: serialize(item) for field, serialize in serializers.items()}
+        if render is not None:
+            data["html"] = render(item)
+    else:
+        data = {"id": item}
+    message = f"event: {kind}\ndata: {json.dumps(data)}\n\n"
+    for loop, queue in clients:
+        try:
+            loop.call_soon_threadsafe(_enqueue, queue, message)
+        except RuntimeError:
+            with _sse_lock:
+                _sse_clients.discard((loop, queue))
+
+def _enqueue(queue, message):
+    if queue.full():
+        # a stream this far behind reloads the page instead of catching up on stale deltas
+        while not queue.empty():
+            queue.get_nowait()
+        message = "event: resync\ndata: {}\n\n"
+    queue.put_nowait(message)
+
+@app.get("/events")
+async def events(request : Request):
+    client = (asyncio.get_running_loop(), asyncio.Queue(maxsize = _SSE_QUEUE_SIZE))
+    with _sse_lock:
+        _sse_clients.add(client)
+
+    async def stream():
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    yield await asyncio.wait_for(client[1].get(), _SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+        finally:
+            with _sse_lock:
+                _sse_clients.discard(client)
+
+    return StreamingResponse(stream(), media_type = "text/event-stream", headers = {"Cache-Control": "no-cache"})
+
+def _sse_backlog():
+    with _sse_lock:
+        clients = list(_sse_clients)
+    return sum(queue.qsize() for _, queue in clients)
+
+# the gauges below only run when /metrics is scraped, the status counts come from the repository's status index
+# or a GROUP BY instead of a pass over every row
+def _count_by_status(counted, statuses):
+    counts = dict.fromkeys(statuses, 0)
+    counts.update(counted)
+    return {(("status", str(status)),): count for status, count in counts.items()}
+
+REGISTRY.gauge("aerologistics_drones", "Drones in the fleet by status",
+               lambda: {} if drone_repo is None else _count_by_status(drone_repo.count_by_status(), DroneStatus))
+REGISTRY.gauge("aerologistics_parcels", "Parcels by status",
+               lambda: {} if parcel_repo is None else _count_by_status(parcel_repo.count_parcels_by_status(), ParcelStatus))
+REGISTRY.gauge("aerologistics_scheduled_missions", "Missions waiting in the scheduler",
+               lambda: {} if parcel_repo is None else parcel_repo.scheduled_missions())
+def _replication(measure):
+    repos = {}
+    for service in (drone_repo, parcel_repo):
+        if service is not None:
+            repos.update(service.replicated_repositories())
+    return {(("repository", name),): measure(repo) for name, repo in repos.items()}
+
+REGISTRY.gauge("aerologistics_replication_queue_depth", "Changes queued for the secondary repositories",
+               lambda: _replication(lambda repo: repo.queue_depth()))
+REGISTRY.gauge("aerologistics_replication_lag_seconds", "Age of the oldest change not yet on the secondary repositories",
+               lambda: _replication(lambda repo: repo.replication_lag()))
+REGISTRY.gauge("aerologistics_event_streams", "Open /events streams", lambda: len(_sse_clients))
+REGISTRY.gauge("aerologistics_event_stream_backlog", "Events queued but not yet sent on all /events streams", lambda: _sse_backlog())
+
+@app.get("/metrics")
+async def metrics():
+    body = await _offload(REGISTRY.render)
+    return Response(body, media_type = "text/plain; version=0.0.4; charset=utf-8")
 
 def start_server_thread():
     uvicorn.run(app, host="0.0.0.0", port=8000, log_level="error")
@@ -186,8 +186,7 @@ class LogisticApp(ctk.CTk):
         for widget in self.drone_list_frame.winfo_children():
             widget.destroy()
 
-        drones = self._drone_service.list_the_drones()
-        for drone in drones:
+        for drone in self._drone_service.iter_drones():
 
             row_frame = ctk.CTkFrame(self.drone_list_frame, fg_color="transparent")
             row_frame.pack(fill="x", pady = 2)
@@ -217,8 +216,7 @@ class LogisticApp(ctk.CTk):
         for widget in self.parcel_list_frame.winfo_children():
             widget.destroy()
 
-        parcels = self._logistic_service.get_parcels()
-        for parcel in parcels:
+        for parcel in self._logistic_service.iter_parcels():
             if parcel.get_status() != "DELIVERED":
                 row_frame = ctk.CTkFrame(self.parcel_list_frame, fg_color="transparent")
                 row_frame.pack(fill = "x", pady = 2)
@@ -248,8 +246,7 @@ class LogisticApp(ctk.CTk):
         for widget in self.mission_list_frame.winfo_children():
             widget.destroy()
 
-        missions = self._logistic_service.get_missions()
-        for mission in missions:
+        for mission in self._logistic_service.iter_missions():
             row_frame = ctk.CTkFrame(self.mission_list_frame, fg_color="transparent")
             row_frame.pack(fill="x", pady = 2)
 
@@ -541,9 +538,8 @@ class AssignDroneMissionWindow(ctk.CTkToplevel):
         for widget in self._parcel_list_frame.winfo_children():
             widget.destroy()
 
-        parcels = self._logistic_service.get_parcels()
         ok = False
-        for parcel in parcels:
+        for parcel in self._logistic_service.iter_parcels():
             if parcel.get_weight() < self._drone.get_max_payload() and parcel.get_status() == "PENDING":
                 ok = True
                 row_frame = ctk.CTkFrame(self._parcel_list_frame, fg_color="transparent")
@@ -0,0 +1,41 @@
+import argparse
+import sys
+import time
+from settings import load_settings, build_repositories, flush_repositories
+from services.logistics_service import LogisticService
+from services.ingest import RecordParser, ingest_lines
+
+# Bulk parcel import from the command line:
+#   python import_parcels.py parcels.ndjson
+#   python import_parcels.py parcels.csv --format csv --chunk-size 5000
+# Rejected lines are printed to stderr and the import carries on with the rest of the file.
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "Streams parcels from an NDJSON or CSV file into the configured repository")
+    parser.add_argument("file", help = "path of the file, - reads stdin")
+    parser.add_argument("--format", choices = RecordParser.FORMATS,
+                        help = "defaults to csv for .csv files and ndjson otherwise")
+    parser.add_argument("--chunk-size", type = int, default = 1000)
+    args = parser.parse_args()
+    format = args.format or ("csv" if args.file.lower().endswith(".csv") else "ndjson")
+
+    try:
+        settings = load_settings()
+        d_repo, p_repo, m_repo = build_repositories(settings)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    # only the parcel repository is touched, the weather service and AI are never reached, and an empty
+    # store is not seeded with generated parcels that would clash with the imported ids
+    service = LogisticService(p_repo, m_repo, d_repo, None, None, seed = False)
+
+    def report(line_number, message):
+        print(f"line {line_number}: {message}", file = sys.stderr)
+
+    started = time.perf_counter()
+    source = sys.stdin if args.file == "-" else open(args.file, "r", encoding = "utf-8", newline = "")
+    with source:
+        added, failed = ingest_lines(service, source, format, args.chunk_size, report)
+    flush_repositories(p_repo)
+    print(f"Imported {added} parcels, rejected {failed} lines in {time.perf_counter() - started:.1f}s")
+    sys.exit(1 if failed else 0)
@@ -1,11 +1,30 @@
-class Drone:
-    def __init__(self, id : int, serial_number : str, model_type : str, max_payload_kg : float, status : float, battery_level : int):
+import time
+from models.model import SlottedModel
+from models.status import DroneStatus, normalize
+
+class Drone(SlottedModel):
+    __slots__ = ("_id", "_serial_number", "_model_type", "_max_payload", "_status", "_battery_level", "_charging_since")
+    # an IDLE drone on the charger gains 0.3 %/s up to 80 % and 0.1 %/s after that, the rates of the old 10 s charger sweep.
+    # _battery_level is the level at the last state change and _charging_since the epoch time charging started,
+    # the current level is worked out when it is read so nothing has to be written while a drone charges
+    _FAST_CHARGE_RATE = 0.3
+    _SLOW_CHARGE_RATE = 0.1
+    _FAST_CHARGE_LIMIT = 80
+
+    def __init__(self, id : int, serial_number : str, model_type : str, max_payload_kg : float, status : float, battery_level : int,
+                 charging_since : float = None):
         self._id = id
         self._serial_number = serial_number
         self._model_type = model_type
         self._max_payload = max_payload_kg
-        self._status = status
+        self._status = normalize(DroneStatus, status)
         self._battery_level = battery_level
+        self._charging_since = charging_since
+
+    def _normalize_codes(self):
+        self._status = normalize(DroneStatus, self._status)
+        if not hasattr(self, "_charging_since"):
+            self._charging_since = None
 
 
     def get_id(self):
@@ -24,15 +43,51 @@ class Drone:
         return self._status
     
     def set_status(self, new_status):
+        new_status = normalize(DroneStatus, new_status)
+        if new_status == DroneStatus.IDLE and self._status != DroneStatus.IDLE:
+            self.start_charging()
+        elif new_status != DroneStatus.IDLE and self._status == DroneStatus.IDLE:
+            self.stop_charging()
         self._status = new_status
 
-    def get_battery_level(self):
-        return self._battery_level
+    def get_charging_since(self):
+        return self._charging_since
+
+    def start_charging(self, now : float = None):
+        now = time.time() if now is None else now
+        self._settle(now)
+        self._charging_since = now
+
+    def stop_charging(self, now : float = None):
+        self._settle(time.time() if now is None else now)
+        self._charging_since = None
+
+    def _settle(self, now):
+        # folds the charge gained so far into _battery_level, so the clock can restart from now
+        if self._charging_since is not None:
+            self._battery_level = self.get_battery_level(now)
+            self._charging_since = now
+
+    def get_battery_level(self, now : float = None):
+        if self._charging_since is None:
+            return self._battery_level
+        elapsed = max(0.0, (time.time() if now is None else now) - self._charging_since)
+        level = self._battery_level
+        if level >= 100:
+            return level
+        if level < self._FAST_CHARGE_LIMIT:
+            fast_seconds = min(elapsed, (self._FAST_CHARGE_LIMIT - level) / self._FAST_CHARGE_RATE)
+            level += fast_seconds * self._FAST_CHARGE_RATE
+            elapsed -= fast_seconds
+        level = min(100, level + elapsed * self._SLOW_CHARGE_RATE)
+        return int(level)
     
     def update_battery(self, battery_consumed : int):
+        self._settle(time.time())
         self._battery_level = self._battery_level - battery_consumed
 
     def charge_battery(self, procentage : int):
+        self._settle(time.time())
         self._battery_level = self._battery_level + procentage
     
     def fuzzy_match(self, query):
@@ -46,4 +101,4 @@ class Drone:
 
     def __str__(self):
         return f"""ID : {self._id} | Serial Number : {self._serial_number} | Model Type : {self._model_type} | 
-                    Max Payload : {self._max_payload} | Status : {self._status} | Battery Level : {self._battery_level}% \n"""     
\ No newline at end of file
+                    Max Payload : {self._max_payload} | Status : {self._status} | Battery Level : {self.get_battery_level()}% \n"""     
\ No newline at end of file
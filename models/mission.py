@@ -1,10 +1,18 @@
-class Mission:
+from models.model import SlottedModel
+from models.status import MissionStatus, normalize
+
+class Mission(SlottedModel):
+    __slots__ = ("_id", "_drone_id", "_parcel_id", "_start_time", "_status")
+
     def __init__(self, id : int, drone_id : int, parcel_id : int, start_time : str, status : str):
         self._id = id
         self._drone_id = drone_id
         self._parcel_id = parcel_id
         self._start_time = start_time
-        self._status = status
+        self._status = normalize(MissionStatus, status)
+
+    def _normalize_codes(self):
+        self._status = normalize(MissionStatus, self._status)
 
     def get_id(self):
         return self._id
@@ -22,7 +30,7 @@ class Mission:
         return self._status
     
     def set_status(self, new_status):
-        self._status = new_status
+        self._status = normalize(MissionStatus, new_status)
         
     def __str__(self):
          return f"""ID : {self._id} | Drone ID : {self._drone_id} | Parcel ID : {self._parcel_id} |
@@ -0,0 +1,24 @@
+class SlottedModel:
+    __slots__ = ()
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __setstate__(self, state):
+        # objects pickled before the models were slotted carry their plain __dict__, both forms are a name -> value map
+        if isinstance(state, tuple):
+            state = {**(state[0] or {}), **(state[1] or {})}
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
+        self._normalize_codes()
+
+    def _normalize_codes(self):
+        pass
+
+    @classmethod
+    def order_key(cls, order_by : str):
+        """Sort key for "field" or "-field", ValueError for a field the model does not have. None sorts first, as in SQL"""
+        attribute = "_" + order_by.lstrip("-")
+        if attribute not in cls.__slots__:
+            raise ValueError(f"Can not order {cls.__name__} by {order_by}")
+        return lambda item: (getattr(item, attribute) is not None, getattr(item, attribute))
@@ -1,4 +1,9 @@
-class Parcel:
+from models.model import SlottedModel
+from models.status import ParcelStatus, Priority, normalize
+
+class Parcel(SlottedModel):
+    __slots__ = ("_id", "_recipient_name", "_delivery_address", "_weight", "_distance", "_priority", "_status")
+
     def __init__(self, id : int, recipient_name : str, delivery_address : str, weight_kg : float, 
                  priority : str, status : str, distance : float):
         self._id = id
@@ -6,8 +11,12 @@ class Parcel:
         self._delivery_address = delivery_address
         self._weight = weight_kg
         self._distance = distance
-        self._priority = priority
-        self._status = status
+        self._priority = normalize(Priority, priority)
+        self._status = normalize(ParcelStatus, status)
+
+    def _normalize_codes(self):
+        self._priority = normalize(Priority, self._priority)
+        self._status = normalize(ParcelStatus, self._status)
 
 
     def get_id(self):
@@ -32,7 +41,7 @@ class Parcel:
         return self._distance
     
     def set_status(self, new_status):
-        self._status = new_status
+        self._status = normalize(ParcelStatus, new_status)
     
     def fuzzy_match(self, query):
         query = str(query)
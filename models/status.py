@@ -0,0 +1,33 @@
+import sys
+from enum import StrEnum
+
+class DroneStatus(StrEnum):
+    IDLE = "IDLE"
+    MAINTENANCE = "MAINTENANCE"
+    FLIGHT_SCHEDULED = "FLIGHT SCHEDULED"
+    IN_FLIGHT = "IN_FLIGHT"
+    ASSIGNED = "ASSIGNED"
+
+class ParcelStatus(StrEnum):
+    PENDING = "PENDING"
+    ASSIGNED = "ASSIGNED"
+    DELIVERED = "DELIVERED"
+
+class MissionStatus(StrEnum):
+    SCHEDULED = "SCHEDULED"
+    EN_ROUTE = "EN_ROUTE"
+    DELIVERED = "DELIVERED"
+    FAILED = "FAILED"
+
+class Priority(StrEnum):
+    HIGH = "HIGH"
+    STANDARD = "STANDARD"
+
+def normalize(enum_type, value):
+    """Returns the enum member for a known code, unknown codes are kept as interned strings"""
+    if isinstance(value, enum_type):
+        return value
+    try:
+        return enum_type(value)
+    except ValueError:
+        return sys.intern(value) if type(value) is str else value
@@ -1,36 +1,199 @@
+import itertools
+import queue
+import threading
+import time
+
 class CompositeRepository:
-    def __init__(self, primary_repo, secondary_repos):
+    _FAILURE_MESSAGES = {
+        "add": "Failed to sync one repo",
+        "update": "Failed to update in one repo",
+        "remove": "Failed to remove from one repo"
+    }
+
+    def __init__(self, primary_repo, secondary_repos, async_replication = False, max_queue_size = 10000,
+                 batch_size = 500):
         self._primary_repo = primary_repo
         self._secondary_repos = secondary_repos
         self._all_repos = [primary_repo] + secondary_repos
+        # in async mode only the primary is written on the caller's thread, the secondaries are fed
+        # from a bounded queue by a background writer that coalesces changes per id and applies them in batches
+        self._async_replication = async_replication
+        self._batch_size = batch_size
+        self._replicated_changes = 0
+        self._in_flight_since = None
+        self._replication_queue = None
+        if async_replication:
+            self._replication_queue = queue.Queue(maxsize = max_queue_size)
+            writer = threading.Thread(target = self._replication_writer, daemon = True)
+            writer.start()
 
-    def add_item(self, item):
-        for repo in self._all_repos:
+    def _write_primary(self, operation, method, payload):
+        try:
+            getattr(self._primary_repo, method)(payload)
+        except Exception as e:
+            print(f"WARNING: {self._FAILURE_MESSAGES[operation]} {e}")
+
+    def _replicate(self, operation, items):
+        if self._async_replication:
+            self._replication_queue.put((operation, items, time.monotonic()))
+            return
+        method = {"add": "add_items", "update": "update_many", "remove": "remove_many"}[operation]
+        for repo in self._secondary_repos:
             try:
-                repo.add_item(item)
+                getattr(repo, method)(items)
             except Exception as e:
-                print(f"WARNING: Failed to sync one repo {e}")
-    
-    def remove_item(self, item_id):
-        for repo in self._all_repos:
+                print(f"WARNING: {self._FAILURE_MESSAGES[operation]} {e}")
+
+    def _replication_writer(self):
+        while True:
+            batch = [self._replication_queue.get()]
+            while len(batch) < self._batch_size:
+                try:
+                    batch.append(self._replication_queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._in_flight_since = batch[0][2]
             try:
-                repo.remove_item(item_id)
+                self._apply_batch(batch)
             except Exception as e:
-                print(f"WARNING: Failed to remove from one repo {e}")
+                print(f"WARNING: Replication batch failed {e}")
+            finally:
+                self._in_flight_since = None
+                for _ in batch:
+                    self._replication_queue.task_done()
+
+    def _apply_batch(self, batch):
+        # only the last change per id matters, an add followed by updates stays an add. An id removed and then
+        # written again still has its remove applied first, a secondary whose add is not an upsert would keep the old row
+        changes = {}
+        removed_first = {}
+        for operation, items, _ in batch:
+            for item in items:
+                if operation == "remove":
+                    changes[item] = ("remove", item)
+                    continue
+                previous = changes.get(item._id)
+                if previous and previous[0] == "remove":
+                    removed_first[item._id] = None
+                if operation == "update" and previous and previous[0] == "add":
+                    operation_for_item = "add"
+                else:
+                    operation_for_item = operation
+                changes[item._id] = (operation_for_item, item)
+
+        grouped = {"add": [], "update": [], "remove": []}
+        for operation, payload in changes.values():
+            grouped[operation].append(payload)
+        grouped["remove"].extend(item_id for item_id in removed_first if changes[item_id][0] != "remove")
+        for operation, method in (("remove", "remove_many"), ("add", "add_items"), ("update", "update_many")):
+            if not grouped[operation]:
+                continue
+            for repo in self._secondary_repos:
+                try:
+                    getattr(repo, method)(grouped[operation])
+                except Exception as e:
+                    print(f"WARNING: {self._FAILURE_MESSAGES[operation]} {e}")
+        self._replicated_changes += len(changes)
+
+    def queue_depth(self) -> int:
+        if not self._async_replication:
+            return 0
+        return self._replication_queue.unfinished_tasks
+
+    def replication_lag(self) -> float:
+        """Seconds the oldest change still waiting for the secondaries has been queued"""
+        if not self._async_replication:
+            return 0.0
+        oldest = self._in_flight_since
+        if oldest is None:
+            with self._replication_queue.mutex:
+                if self._replication_queue.queue:
+                    oldest = self._replication_queue.queue[0][2]
+        if oldest is None:
+            return 0.0
+        return max(0.0, time.monotonic() - oldest)
+
+    def replication_stats(self) -> dict:
+        return {
+            "mode": "async" if self._async_replication else "sync",
+            "queue_depth": self.queue_depth(),
+            "lag_seconds": self.replication_lag(),
+            "replicated_changes": self._replicated_changes
+        }
+
+    def flush(self):
+        if self._async_replication:
+            self._replication_queue.join()
+
+    def add_item(self, item):
+        self._write_primary("add", "add_item", item)
+        self._replicate("add", [item])
+
+    def remove_item(self, item_id):
+        self._write_primary("remove", "remove_item", item_id)
+        self._replicate("remove", [item_id])
 
     def search_by_id(self, item_id):
         return self._primary_repo.search_by_id(item_id)
-    
+
+    def existing_ids(self, item_ids) -> set:
+        return self._primary_repo.existing_ids(item_ids)
+
     def get_data(self):
         return self._primary_repo.get_data()
-    
+
+    def iter_data(self):
+        return self._primary_repo.iter_data()
+
+    def get_page(self, offset = 0, limit = 50, order_by = "id", **criteria):
+        return self._primary_repo.get_page(offset, limit, order_by, **criteria)
+
+    def version(self) -> int:
+        return self._primary_repo.version()
+
+    def find_by(self, **criteria) -> list:
+        return self._primary_repo.find_by(**criteria)
+
+    def count_by_status(self) -> dict:
+        return self._primary_repo.count_by_status()
+
+    def find_range(self, field, low = None, high = None, **criteria) -> list:
+        return self._primary_repo.find_range(field, low, high, **criteria)
+
+    def transaction_factory(self):
+        factory = getattr(self._primary_repo, "transaction_factory", None)
+        return factory() if factory else None
+
+    def _apply_in_session(self, session, changes):
+        self._primary_repo._apply_in_session(session, changes)
+
+    def _after_commit(self, changes):
+        # the primary committed with the rest of the unit of work, the secondaries follow as usual
+        self._primary_repo._after_commit(changes)
+        for operation, run in itertools.groupby(changes, key = lambda change: change[0]):
+            self._replicate(operation, [payload for _, payload in run])
+
+    def next_id(self) -> int:
+        return self._primary_repo.next_id()
+
     def update(self, new_item):
-        for repo in self._all_repos:
-            try:
-                repo.update(new_item)
-            except Exception as e:
-                print(f"WARNING: Failed to update in one repo {e}")
+        self._write_primary("update", "update", new_item)
+        self._replicate("update", [new_item])
+
+    def add_items(self, items):
+        items = list(items)
+        self._write_primary("add", "add_items", items)
+        self._replicate("add", items)
+
+    def update_many(self, new_items):
+        new_items = list(new_items)
+        self._write_primary("update", "update_many", new_items)
+        self._replicate("update", new_items)
+
+    def remove_many(self, item_ids):
+        item_ids = list(item_ids)
+        self._write_primary("remove", "remove_many", item_ids)
+        self._replicate("remove", item_ids)
 
     def __len__(self):
         return len(self._primary_repo)
-    
\ No newline at end of file
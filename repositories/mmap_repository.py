@@ -0,0 +1,373 @@
+import heapq
+import math
+import mmap
+import os
+import struct
+import threading
+from abc import ABC, abstractmethod
+from models.drone import Drone
+from models.parcel import Parcel
+from models.status import DroneStatus, ParcelStatus, Priority
+
+class MemoryMappedRepository(ABC):
+    # fixed-width rows in a memory-mapped file, strings live in an append-only <file>.heap side file and rows
+    # only keep (offset, length) references to them. Numeric and status fields are read and written in place,
+    # so other processes can map the same file read-only and see updates without copies
+    _MAGIC = b"AEROMMAP"
+    _VERSION = 3
+    # magic, version, row size, rows used, row capacity, highest id ever stored, generation
+    # (bumped whenever a row is taken or freed, so readers notice a freed row being reused for a new id)
+    _HEADER = struct.Struct("<8sIIQQqQ")
+    _ROW_PREFIX = struct.Struct("<Bq")
+    _ROW = None
+    _MODEL = None
+    _STATUS_POSITION = None
+    _STATUS_CODES = ()
+    _LIVE = 1
+    _FREE = 0
+
+    def __init__(self, file, readonly = False, initial_capacity = 1024):
+        self._file = file
+        self._heap_file = file + ".heap"
+        self._readonly = readonly
+        self._lock = threading.RLock()
+        self._strings = {}
+        self._index = {}
+        self._free_rows = []
+        self._rows_used = 0
+        self._capacity = 0
+        self._generation = 0
+        self._version = 0
+        self._open(initial_capacity)
+
+    def _open(self, initial_capacity):
+        if not os.path.exists(self._file) or os.path.getsize(self._file) == 0:
+            if self._readonly:
+                raise FileNotFoundError(self._file)
+            with open(self._file, "wb") as f:
+                f.write(self._HEADER.pack(self._MAGIC, self._VERSION, self._ROW.size, 0, initial_capacity, 0, 0))
+                f.truncate(self._HEADER.size + initial_capacity * self._ROW.size)
+        self._handle = open(self._file, "rb" if self._readonly else "r+b")
+        self._heap = open(self._heap_file, "rb" if self._readonly else "a+b")
+        self._map_file()
+        magic, version, row_size = struct.unpack_from("<8sII", self._map, 0)
+        if magic != self._MAGIC or version != self._VERSION or row_size != self._ROW.size:
+            raise ValueError(f"{self._file} is not a compatible memory-mapped store")
+        self._rebuild_index()
+
+    def _map_file(self):
+        access = mmap.ACCESS_READ if self._readonly else mmap.ACCESS_WRITE
+        self._map = mmap.mmap(self._handle.fileno(), 0, access = access)
+
+    def _header(self):
+        return self._HEADER.unpack_from(self._map, 0)
+
+    def _write_header(self, rows_used = None, capacity = None, high_water_id = None, generation = None):
+        _, _, _, current_rows, current_capacity, current_high_water, current_generation = self._header()
+        self._HEADER.pack_into(self._map, 0, self._MAGIC, self._VERSION, self._ROW.size,
+                               current_rows if rows_used is None else rows_used,
+                               current_capacity if capacity is None else capacity,
+                               current_high_water if high_water_id is None else high_water_id,
+                               current_generation if generation is None else generation)
+
+    def _row_offset(self, row):
+        return self._HEADER.size + row * self._ROW.size
+
+    def _rebuild_index(self):
+        _, _, _, rows_used, capacity, _, generation = self._header()
+        self._index = {}
+        self._free_rows = []
+        for row in range(rows_used):
+            flag, item_id = self._ROW_PREFIX.unpack_from(self._map, self._row_offset(row))
+            if flag == self._LIVE:
+                self._index[item_id] = row
+            else:
+                self._free_rows.append(row)
+        self._rows_used = rows_used
+        self._capacity = capacity
+        self._generation = generation
+
+    def _refresh(self):
+        # a read-only view follows the writer: remap when the file grew and rescan when rows were taken or freed
+        if not self._readonly:
+            return
+        _, _, _, rows_used, capacity, _, generation = self._header()
+        if capacity != self._capacity:
+            self._map.close()
+            self._map_file()
+        if rows_used != self._rows_used or capacity != self._capacity or generation != self._generation:
+            self._rebuild_index()
+
+    def _grow(self):
+        new_capacity = max(1, self._capacity * 2)
+        self._map.flush()
+        self._map.close()
+        self._handle.truncate(self._row_offset(new_capacity))
+        self._map_file()
+        self._capacity = new_capacity
+        self._write_header(capacity = new_capacity)
+
+    def _read_string(self, offset, length):
+        value = self._strings.get(offset)
+        if value is None:
+            self._heap.seek(offset)
+            value = self._heap.read(length).decode("utf-8")
+            self._strings[offset] = value
+        return value
+
+    def _string_ref(self, value, current_ref = None):
+        value = str(value)
+        if current_ref is not None and current_ref[1] == len(value.encode("utf-8")) \
+           and self._read_string(*current_ref) == value:
+            return current_ref
+        encoded = value.encode("utf-8")
+        offset = self._heap.seek(0, os.SEEK_END)
+        self._heap.write(encoded)
+        self._heap.flush()
+        self._strings[offset] = value
+        return offset, len(encoded)
+
+    def _encode_status(self, status):
+        try:
+            return self._STATUS_CODES.index(status)
+        except ValueError:
+            raise ValueError(f"Status {status} can not be stored in {self._file}")
+
+    def _read_row(self, item_id):
+        row = self._index.get(item_id)
+        if row is None:
+            return None
+        values = self._ROW.unpack_from(self._map, self._row_offset(row))
+        if values[0] != self._LIVE or values[1] != item_id:
+            # the writer reused or freed this row since the index was built
+            self._rebuild_index()
+            row = self._index.get(item_id)
+            if row is None:
+                return None
+            values = self._ROW.unpack_from(self._map, self._row_offset(row))
+        return values
+
+    def _write_item(self, item):
+        row = self._index.get(item._id)
+        current = None
+        if row is None:
+            if self._free_rows:
+                row = self._free_rows.pop()
+            else:
+                if self._rows_used == self._capacity:
+                    self._grow()
+                row = self._rows_used
+        else:
+            current = self._ROW.unpack_from(self._map, self._row_offset(row))
+        self._ROW.pack_into(self._map, self._row_offset(row), *self._pack(item, current))
+        if item._id not in self._index:
+            self._generation += 1
+        self._index[item._id] = row
+        if row == self._rows_used:
+            self._rows_used += 1
+        high_water_id = self._header()[5]
+        self._write_header(rows_used = self._rows_used, high_water_id = max(high_water_id, item._id), generation = self._generation)
+        self._version += 1
+
+    @abstractmethod
+    def _pack(self, item, current) -> tuple:
+        pass
+
+    @abstractmethod
+    def _unpack(self, values):
+        pass
+
+    def _field_offset(self, position):
+        return struct.calcsize(self._ROW.format[:position + 1])
+
+    def _write_field(self, item_id, position, value):
+        row = self._index.get(item_id)
+        if row is None:
+            return False
+        struct.pack_into("<" + self._ROW.format[position + 1], self._map, self._row_offset(row) + self._field_offset(position), value)
+        self._version += 1
+        return True
+
+    def version(self) -> int:
+        return self._version
+
+    def set_status(self, item_id, status) -> bool:
+        """Rewrites only the status byte of a row"""
+        with self._lock:
+            return self._write_field(item_id, self._STATUS_POSITION, self._encode_status(status))
+
+    def add_item(self, item):
+        with self._lock:
+            self._write_item(item)
+
+    def add_items(self, items):
+        with self._lock:
+            for item in items:
+                self._write_item(item)
+
+    def update(self, new_item):
+        with self._lock:
+            if new_item._id in self._index:
+                self._write_item(new_item)
+
+    def update_many(self, new_items):
+        with self._lock:
+            for new_item in new_items:
+                if new_item._id in self._index:
+                    self._write_item(new_item)
+
+    def remove_item(self, item_id):
+        with self._lock:
+            row = self._index.pop(item_id, None)
+            if row is not None:
+                self._map[self._row_offset(row)] = self._FREE
+                self._free_rows.append(row)
+                self._generation += 1
+                self._write_header(generation = self._generation)
+                self._version += 1
+
+    def remove_many(self, item_ids):
+        for item_id in item_ids:
+            self.remove_item(item_id)
+
+    def search_by_id(self, item_id):
+        with self._lock:
+            self._refresh()
+            values = self._read_row(item_id)
+            return None if values is None else self._unpack(values)
+
+    def existing_ids(self, item_ids) -> set:
+        with self._lock:
+            self._refresh()
+            return {item_id for item_id in item_ids if item_id in self._index}
+
+    def iter_data(self):
+        with self._lock:
+            self._refresh()
+            item_ids = list(self._index)
+        for item_id in item_ids:
+            item = self.search_by_id(item_id)
+            if item is not None:
+                yield item
+
+    def get_data(self):
+        return list(self.iter_data())
+
+    def get_page(self, offset = 0, limit = 50, order_by = "id", **criteria):
+        key = self._MODEL.order_key(order_by)
+        select = heapq.nlargest if order_by.startswith("-") else heapq.nsmallest
+        items = self._iter_matching(criteria) if criteria else self.iter_data()
+        return select(offset + limit, items, key = key)[offset:]
+
+    def _iter_matching(self, criteria):
+        status_code = None
+        if "status" in criteria:
+            if criteria["status"] not in self._STATUS_CODES:
+                return
+            status_code = self._encode_status(criteria["status"])
+        with self._lock:
+            self._refresh()
+            status_offset = self._field_offset(self._STATUS_POSITION)
+            # the status byte is checked straight from the mapping, only matching rows become objects
+            item_ids = [item_id for item_id, row in self._index.items()
+                        if status_code is None or self._map[self._row_offset(row) + status_offset] == status_code]
+        for item_id in item_ids:
+            item = self.search_by_id(item_id)
+            if item is not None and all(getattr(item, "_" + field, None) == value for field, value in criteria.items()):
+                yield item
+
+    def find_by(self, **criteria) -> list:
+        return list(self._iter_matching(criteria))
+
+    def count_by_status(self) -> dict:
+        with self._lock:
+            self._refresh()
+            status_offset = self._field_offset(self._STATUS_POSITION)
+            counts = {}
+            for row in self._index.values():
+                status = self._STATUS_CODES[self._map[self._row_offset(row) + status_offset]]
+                counts[status] = counts.get(status, 0) + 1
+            return counts
+
+    def find_range(self, field, low = None, high = None, **criteria) -> list:
+        matches = [item for item in self._iter_matching(criteria)
+                   if (low is None or getattr(item, "_" + field) >= low) and (high is None or getattr(item, "_" + field) <= high)]
+        matches.sort(key = lambda item: getattr(item, "_" + field))
+        return matches
+
+    def high_water_id(self) -> int:
+        with self._lock:
+            self._refresh()
+            return self._header()[5]
+
+    def next_id(self) -> int:
+        with self._lock:
+            next_id = self._header()[5] + 1
+            self._write_header(high_water_id = next_id)
+            return next_id
+
+    def flush(self):
+        with self._lock:
+            if not self._readonly:
+                self._map.flush()
+
+    def close(self):
+        with self._lock:
+            self.flush()
+            self._map.close()
+            self._handle.close()
+            self._heap.close()
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return len(self._index)
+
+class DroneMemoryMappedRepository(MemoryMappedRepository):
+    # flag, id, serial (offset, length), model type (offset, length), max payload, status code, battery level,
+    # charging start (NaN when the drone is not charging)
+    _ROW = struct.Struct("<BqQIQIdBdd")
+    _MODEL = Drone
+    _STATUS_POSITION = 7
+    _BATTERY_POSITION = 8
+    _STATUS_CODES = (DroneStatus.IDLE, DroneStatus.MAINTENANCE, DroneStatus.FLIGHT_SCHEDULED, DroneStatus.IN_FLIGHT,
+                     DroneStatus.ASSIGNED)
+
+    def _pack(self, drone, current):
+        serial = self._string_ref(drone._serial_number, current[2:4] if current else None)
+        model_type = self._string_ref(drone._model_type, current[4:6] if current else None)
+        return (self._LIVE, drone._id, *serial, *model_type, float(drone._max_payload),
+                self._encode_status(drone._status), float(drone._battery_level),
+                math.nan if drone._charging_since is None else float(drone._charging_since))
+
+    def _unpack(self, values):
+        battery = values[8]
+        return Drone(values[1], self._read_string(values[2], values[3]), self._read_string(values[4], values[5]),
+                     values[6], self._STATUS_CODES[values[7]], int(battery) if battery.is_integer() else battery,
+                     None if math.isnan(values[9]) else values[9])
+
+    def set_battery_level(self, drone_id, battery_level) -> bool:
+        """Rewrites only the battery field of a row"""
+        with self._lock:
+            return self._write_field(drone_id, self._BATTERY_POSITION, float(battery_level))
+
+class ParcelMemoryMappedRepository(MemoryMappedRepository):
+    # flag, id, recipient (offset, length), address (offset, length), weight, distance, priority code, status code
+    _ROW = struct.Struct("<BqQIQIddBB")
+    _MODEL = Parcel
+    _PRIORITY_POSITION = 8
+    _STATUS_POSITION = 9
+    _PRIORITY_CODES = (Priority.STANDARD, Priority.HIGH)
+    _STATUS_CODES = (ParcelStatus.PENDING, ParcelStatus.ASSIGNED, ParcelStatus.DELIVERED)
+
+    def _pack(self, parcel, current):
+        if parcel._priority not in self._PRIORITY_CODES:
+            raise ValueError(f"Priority {parcel._priority} can not be stored in {self._file}")
+        recipient = self._string_ref(parcel._recipient_name, current[2:4] if current else None)
+        address = self._string_ref(parcel._delivery_address, current[4:6] if current else None)
+        return (self._LIVE, parcel._id, *recipient, *address, float(parcel._weight), float(parcel._distance),
+                self._PRIORITY_CODES.index(parcel._priority), self._encode_status(parcel._status))
+
+    def _unpack(self, values):
+        return Parcel(values[1], self._read_string(values[2], values[3]), self._read_string(values[4], values[5]),
+                      values[6], self._PRIORITY_CODES[values[8]], self._STATUS_CODES[values[9]], values[7])
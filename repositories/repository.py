@@ -1,51 +1,221 @@
 import os
-from models import drone
+from abc import ABC, abstractmethod
 from models.drone import Drone
 from models.parcel import Parcel
 from models.mission import Mission
+import bisect
+import heapq
 import pickle
-from sqlalchemy import create_engine, Float,String,Integer, Column
+import struct
+import threading
+from sqlalchemy import create_engine, event, Float,String,Integer, Column, case, func, inspect, select, text, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import StaticPool
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 Base = declarative_base()
 
 
 class Repository:
+    # secondary indexes kept for the fields the services filter on, equality fields map value -> ids,
+    # range fields keep a sorted list of (value, id) so bounds are found with bisect
+    _EQUALITY_FIELDS = ("status",)
+    _RANGE_FIELDS = ("start_time", "max_payload")
+
     def __init__(self):
-        self._data = []
+        # insertion-ordered id -> item map, so lookups by id don't scan the whole fleet
+        self._data = {}
+        self._equality_index = {field: {} for field in self._EQUALITY_FIELDS}
+        self._range_index = {field: [] for field in self._RANGE_FIELDS}
+        self._indexed_values = {}
+        # highest id ever stored or handed out by next_id, file backends keep it in <file>.seq
+        self._high_water_id = 0
+        self._sequence_file = None
+        self._id_lock = threading.Lock()
+        # bumped after every change, readers compare it to know whether anything changed since they last looked
+        self._version = 0
+
+    def _touch(self):
+        self._version += 1
+
+    def version(self) -> int:
+        return self._version
+
+    def _store(self, item):
+        with self._id_lock:
+            if item._id > self._high_water_id:
+                self._high_water_id = item._id
+        self._unindex(item._id)
+        self._data[item._id] = item
+        values = {}
+        for field in self._EQUALITY_FIELDS + self._RANGE_FIELDS:
+            value = getattr(item, "_" + field, None)
+            if value is None:
+                continue
+            values[field] = value
+            if field in self._equality_index:
+                self._equality_index[field].setdefault(value, {})[item._id] = None
+            else:
+                bisect.insort(self._range_index[field], (value, item._id))
+        self._indexed_values[item._id] = values
+
+    def _discard(self, item_id):
+        self._unindex(item_id)
+        self._data.pop(item_id, None)
+
+    def _unindex(self, item_id):
+        # items are mutated in place by the services, so remove them by the values they were indexed under
+        for field, value in self._indexed_values.pop(item_id, {}).items():
+            if field in self._equality_index:
+                ids = self._equality_index[field].get(value)
+                if ids is not None:
+                    ids.pop(item_id, None)
+                    if not ids:
+                        del self._equality_index[field][value]
+            else:
+                entries = self._range_index[field]
+                position = bisect.bisect_left(entries, (value, item_id))
+                if position < len(entries) and entries[position] == (value, item_id):
+                    del entries[position]
+
+    def _load_sequence(self, sequence_file, item_ids):
+        self._sequence_file = sequence_file
+        self._high_water_id = max(self._high_water_id, max(item_ids, default = 0))
+        try:
+            with open(sequence_file, "r") as f:
+                self._high_water_id = max(self._high_water_id, int(f.read().strip()))
+        except (OSError, ValueError):
+            pass
+
+    def next_id(self) -> int:
+        """Allocates an id above every id stored or allocated before"""
+        with self._id_lock:
+            self._high_water_id += 1
+            if self._sequence_file:
+                tmp_file = self._sequence_file + ".tmp"
+                with open(tmp_file, "w") as f:
+                    f.write(str(self._high_water_id))
+                os.replace(tmp_file, self._sequence_file)
+            return self._high_water_id
 
     def add_item(self, item):
-        self._data.append(item)
+        self._store(item)
+        self._touch()
     
     def remove_item(self, item_id):
-        new_data = [item for item in self._data if item._id != item_id]
-        self._data = new_data[:]
+        self._discard(item_id)
+        self._touch()
     
     def search_by_id(self, item_id):
-        for item in self._data:
-            if item._id == item_id:
-                return item
-        return None
+        return self._data.get(item_id)
+
+    def existing_ids(self, item_ids) -> set:
+        """The subset of item_ids that is already stored"""
+        return {item_id for item_id in item_ids if item_id in self._data}
     
     def get_data(self):
-        return self._data
+        return list(self._data.values())
+
+    def iter_data(self):
+        # iterate over a snapshot of the references so writers on other threads can't break the loop
+        yield from list(self._data.values())
+
+    def _order_key(self, order_by):
+        # the store is not tied to one model, the key of each model is built the first time one of its items shows up
+        keys = {}
+        def key(item):
+            model = type(item)
+            if model not in keys:
+                keys[model] = model.order_key(order_by)
+            return keys[model](item)
+        return key
+
+    def get_page(self, offset = 0, limit = 50, order_by = "id", **criteria):
+        key = self._order_key(order_by)
+        items = self.find_by(**criteria) if criteria else self.iter_data()
+        if order_by.startswith("-"):
+            ordered = heapq.nlargest(offset + limit, items, key = key)
+        else:
+            ordered = heapq.nsmallest(offset + limit, items, key = key)
+        return ordered[offset:]
+
+    def _matches(self, item, criteria):
+        return all(getattr(item, "_" + field, None) == value for field, value in criteria.items())
+
+    def count_by_status(self) -> dict:
+        """status -> number of items, read off the status index"""
+        return {status: len(ids) for status, ids in self._equality_index["status"].items()}
+
+    def find_by(self, **criteria) -> list:
+        indexed = [field for field in criteria if field in self._equality_index]
+        if not indexed:
+            return [item for item in self.iter_data() if self._matches(item, criteria)]
+        candidate_ids = list(self._equality_index[indexed[0]].get(criteria[indexed[0]], ()))
+        candidates = (self._data.get(item_id) for item_id in candidate_ids)
+        return [item for item in candidates if item is not None and self._matches(item, criteria)]
+
+    def find_range(self, field, low = None, high = None, **criteria) -> list:
+        """Items whose field lies within [low, high] (either bound may be None) and that match criteria, ordered by field"""
+        if field not in self._range_index:
+            in_range = [item for item in self.iter_data() if getattr(item, "_" + field, None) is not None
+                        and (low is None or getattr(item, "_" + field) >= low)
+                        and (high is None or getattr(item, "_" + field) <= high)]
+            in_range.sort(key = lambda item: getattr(item, "_" + field))
+            return [item for item in in_range if self._matches(item, criteria)]
+        entries = self._range_index[field]
+        start = 0 if low is None else bisect.bisect_left(entries, (low,))
+        stop = len(entries) if high is None else bisect.bisect_right(entries, (high, float('inf')))
+        candidates = (self._data.get(item_id) for _, item_id in entries[start:stop])
+        return [item for item in candidates if item is not None and self._matches(item, criteria)]
     
     def update(self, new_item):
-        for index, item in enumerate(self._data):
-            if item._id == new_item._id:
-                self._data[index] = new_item
+        if new_item._id in self._data:
+            self._store(new_item)
+            self._touch()
+
+    def add_items(self, items):
+        for item in items:
+            self._store(item)
+        self._touch()
+
+    def update_many(self, new_items):
+        for new_item in new_items:
+            if new_item._id in self._data:
+                self._store(new_item)
+        self._touch()
+
+    def remove_many(self, item_ids):
+        for item_id in item_ids:
+            self._discard(item_id)
+        self._touch()
+
+    def __len__(self):
+        return len(self._data)
         
     
 class TextFileRepository(Repository):
-    def __init__(self, file):
+    def __init__(self, file, journal = False, compact_threshold = 500):
         super().__init__()
         self._file = file
+        # in journal mode every mutation appends one line to <file>.journal instead of rewriting the file,
+        # the journal is folded back into the snapshot once it grows past compact_threshold entries
+        self._journal = journal
+        self._journal_file = file + ".journal"
+        self._compact_threshold = compact_threshold
+        self._journal_entries = 0
+        self._compacting = False
+        self._lock = threading.RLock()
         self._load_from_file()
+        self._replay_journal()
+        self._load_sequence(file + ".seq", self._data)
 
     def _save_in_file(self):
-        with open(self._file, "w") as f:
-            for item in self._data:
+        tmp_file = self._file + ".tmp"
+        with open(tmp_file, "w") as f:
+            for item in self._data.values():
                 f.write(self._object_to_line(item) + "\n")
+        os.replace(tmp_file, self._file)
 
     def _load_from_file(self):
         if not os.path.exists(self._file):
@@ -54,56 +224,349 @@ class TextFileRepository(Repository):
             for line in f:
                 super().add_item(self._line_to_object(line.strip()))
 
+    def _replay_journal(self):
+        if not os.path.exists(self._journal_file):
+            return
+        with open(self._journal_file, "r") as f:
+            for line in f:
+                line = line.rstrip("\n")
+                if not line:
+                    continue
+                operation, _, payload = line.partition(',')
+                if operation == "ADD":
+                    super().add_item(self._line_to_object(payload))
+                elif operation == "UPDATE":
+                    super().update(self._line_to_object(payload))
+                elif operation == "DELETE":
+                    super().remove_item(int(payload))
+                self._journal_entries += 1
+        if not self._journal:
+            self.compact()
+
+    def _append_to_journal(self, entries):
+        with open(self._journal_file, "a") as f:
+            f.writelines(f"{operation},{payload}\n" for operation, payload in entries)
+        self._journal_entries += len(entries)
+        if self._journal_entries >= self._compact_threshold and not self._compacting:
+            self._compacting = True
+            threading.Thread(target = self.compact, daemon = True).start()
+
+    def _persist(self, entries):
+        if not entries:
+            return
+        if self._journal:
+            self._append_to_journal(entries)
+        else:
+            self._save_in_file()
+
+    def compact(self):
+        with self._lock:
+            try:
+                self._save_in_file()
+                if os.path.exists(self._journal_file):
+                    os.remove(self._journal_file)
+                self._journal_entries = 0
+            finally:
+                self._compacting = False
+
     def add_item(self, item):
-        super().add_item(item)
-        self._save_in_file()
+        with self._lock:
+            super().add_item(item)
+            self._persist([("ADD", self._object_to_line(item))])
 
     def remove_item(self, item_id):
-        super().remove_item(item_id)
-        self._save_in_file()
+        with self._lock:
+            super().remove_item(item_id)
+            self._persist([("DELETE", item_id)])
     
     def update(self, new_item):
-        super().update(new_item)
-        self._save_in_file()
+        with self._lock:
+            super().update(new_item)
+            self._persist([("UPDATE", self._object_to_line(new_item))])
+
+    def add_items(self, items):
+        with self._lock:
+            items = list(items)
+            super().add_items(items)
+            self._persist([("ADD", self._object_to_line(item)) for item in items])
+
+    def update_many(self, new_items):
+        with self._lock:
+            new_items = list(new_items)
+            super().update_many(new_items)
+            self._persist([("UPDATE", self._object_to_line(item)) for item in new_items])
+
+    def remove_many(self, item_ids):
+        with self._lock:
+            item_ids = list(item_ids)
+            super().remove_many(item_ids)
+            self._persist([("DELETE", item_id) for item_id in item_ids])
 
 class BinaryFileRepository(Repository):
-    def __init__(self,binary_file):
+    # segmented store: a magic header followed by length-prefixed records, one pickled entity per record.
+    # every record header is (live flag, id, capacity, length), so an update can rewrite its own slot in place,
+    # or append a new slot and flip the old one to dead when the entity outgrew it
+    _MAGIC = b"AEROSEG1"
+    _RECORD_HEADER = struct.Struct("<BqII")
+    _LIVE = 1
+    _DEAD = 0
+
+    def __init__(self, binary_file, lazy = True, compact_min_bytes = 65536):
         super().__init__()
         self._file = binary_file
+        self._lazy = lazy
+        self._compact_min_bytes = compact_min_bytes
+        self._index = {}
+        self._live_bytes = 0
+        self._dead_bytes = 0
+        self._handle = None
+        self._lock = threading.RLock()
         self._load_from_file()
+        self._load_sequence(binary_file + ".seq", self._index)
 
     def _load_from_file(self):
-        if not os.path.exists(self._file):
+        if not os.path.exists(self._file) or os.path.getsize(self._file) == 0:
+            self._write_new_file([])
             return
+        with open(self._file, "rb") as f:
+            is_segmented = f.read(len(self._MAGIC)) == self._MAGIC
+        if not is_segmented:
+            self._migrate_pickled_file()
+            return
+        self._handle = open(self._file, "r+b")
+        self._scan_records()
+        if not self._lazy:
+            for item_id in self._index:
+                self._read_record(item_id)
+
+    def _migrate_pickled_file(self):
         try:
             with open(self._file, "rb") as f:
-                self._data = pickle.load(f)
+                items = pickle.load(f)
         except EOFError:
-            self._data = []
-    
-    def _save_in_file(self):
-        with open(self._file, "wb") as f:
-            pickle.dump(self._data, f)
+            items = []
+        self._write_new_file(items)
+        for item in items:
+            self._store(item)
+
+    def _write_new_file(self, items):
+        tmp_file = self._file + ".tmp"
+        with open(tmp_file, "wb") as f:
+            f.write(self._MAGIC)
+            for item in items:
+                payload = pickle.dumps(item)
+                f.write(self._pack_record(item._id, payload, self._capacity_for(payload)))
+        os.replace(tmp_file, self._file)
+        self._reopen()
+
+    def _reopen(self):
+        if self._handle:
+            self._handle.close()
+        self._handle = open(self._file, "r+b")
+        self._index = {}
+        self._live_bytes = 0
+        self._dead_bytes = 0
+        self._scan_records()
+
+    def _scan_records(self):
+        header_size = self._RECORD_HEADER.size
+        offset = len(self._MAGIC)
+        file_size = os.fstat(self._handle.fileno()).st_size
+        while True:
+            # only the headers are read, the bodies are skipped with a seek and loaded lazily
+            self._handle.seek(offset)
+            header = self._handle.read(header_size)
+            if len(header) < header_size:
+                break
+            flag, item_id, capacity, length = self._RECORD_HEADER.unpack(header)
+            record_size = header_size + capacity
+            if offset + record_size > file_size:
+                break
+            if flag == self._LIVE:
+                if item_id in self._index:
+                    # an update was interrupted after appending its new slot, the later slot wins
+                    self._live_bytes -= header_size + self._index[item_id][1]
+                    self._dead_bytes += header_size + self._index[item_id][1]
+                self._index[item_id] = (offset, capacity)
+                self._live_bytes += record_size
+            else:
+                self._dead_bytes += record_size
+            offset += record_size
+        # drop a half-written record left behind by a crash
+        self._handle.truncate(offset)
+
+    def _capacity_for(self, payload):
+        return len(payload) + max(16, len(payload) // 4)
+
+    def _pack_record(self, item_id, payload, capacity):
+        header = self._RECORD_HEADER.pack(self._LIVE, item_id, capacity, len(payload))
+        return header + payload + bytes(capacity - len(payload))
+
+    def _read_record(self, item_id):
+        offset, _ = self._index[item_id]
+        self._handle.seek(offset)
+        _, _, _, length = self._RECORD_HEADER.unpack(self._handle.read(self._RECORD_HEADER.size))
+        item = pickle.loads(self._handle.read(length))
+        self._store(item)
+        return item
+
+    def _write_record(self, item):
+        payload = pickle.dumps(item)
+        slot = self._index.get(item._id)
+        if slot and len(payload) <= slot[1]:
+            self._handle.seek(slot[0])
+            self._handle.write(self._pack_record(item._id, payload, slot[1]))
+            return
+        capacity = self._capacity_for(payload)
+        offset = self._handle.seek(0, os.SEEK_END)
+        self._handle.write(self._pack_record(item._id, payload, capacity))
+        self._live_bytes += self._RECORD_HEADER.size + capacity
+        if slot:
+            self._mark_dead(slot)
+        self._index[item._id] = (offset, capacity)
+
+    def _mark_dead(self, slot):
+        offset, capacity = slot
+        self._handle.seek(offset)
+        self._handle.write(bytes([self._DEAD]))
+        self._live_bytes -= self._RECORD_HEADER.size + capacity
+        self._dead_bytes += self._RECORD_HEADER.size + capacity
+
+    def _maybe_compact(self):
+        self._handle.flush()
+        if self._dead_bytes >= self._compact_min_bytes and self._dead_bytes > self._live_bytes:
+            self.compact()
+
+    def compact(self):
+        with self._lock:
+            tmp_file = self._file + ".tmp"
+            with open(tmp_file, "wb") as f:
+                f.write(self._MAGIC)
+                for item_id, (offset, capacity) in self._index.items():
+                    self._handle.seek(offset)
+                    f.write(self._handle.read(self._RECORD_HEADER.size + capacity))
+            self._handle.close()
+            os.replace(tmp_file, self._file)
+            self._handle = None
+            self._reopen()
+
+    def close(self):
+        with self._lock:
+            if self._handle:
+                self._handle.close()
+                self._handle = None
+
+    def search_by_id(self, item_id):
+        with self._lock:
+            item = self._data.get(item_id)
+            if item is None and item_id in self._index:
+                item = self._read_record(item_id)
+            return item
+
+    def existing_ids(self, item_ids) -> set:
+        with self._lock:
+            return {item_id for item_id in item_ids if item_id in self._index}
+
+    def get_data(self):
+        with self._lock:
+            return [self._data[item_id] if item_id in self._data else self._read_record(item_id)
+                    for item_id in self._index]
+
+    def iter_data(self):
+        with self._lock:
+            item_ids = list(self._index)
+        for item_id in item_ids:
+            item = self.search_by_id(item_id)
+            if item is not None:
+                yield item
+
+    def _load_all(self):
+        for item_id in list(self._index):
+            if item_id not in self._data:
+                self._read_record(item_id)
+
+    def find_by(self, **criteria) -> list:
+        with self._lock:
+            # the secondary indexes only cover loaded records
+            self._load_all()
+            return super().find_by(**criteria)
+
+    def count_by_status(self) -> dict:
+        with self._lock:
+            self._load_all()
+            return super().count_by_status()
+
+    def find_range(self, field, low = None, high = None, **criteria) -> list:
+        with self._lock:
+            self._load_all()
+            return super().find_range(field, low, high, **criteria)
+
+    def __len__(self):
+        return len(self._index)
     
     def add_item(self, item):
-        super().add_item(item)
-        self._save_in_file()
+        with self._lock:
+            super().add_item(item)
+            self._write_record(item)
+            self._maybe_compact()
 
     def remove_item(self,item_id):
-        super().remove_item(item_id)
-        self._save_in_file()
+        with self._lock:
+            super().remove_item(item_id)
+            slot = self._index.pop(item_id, None)
+            if slot:
+                self._mark_dead(slot)
+                self._maybe_compact()
 
     def update(self, new_item):
-        super().update(new_item)
-        self._save_in_file()
+        with self._lock:
+            if new_item._id not in self._index:
+                return
+            self._store(new_item)
+            self._write_record(new_item)
+            self._touch()
+            self._maybe_compact()
+
+    def add_items(self, items):
+        with self._lock:
+            for item in items:
+                self._store(item)
+                self._write_record(item)
+            self._touch()
+            self._maybe_compact()
+
+    def update_many(self, new_items):
+        with self._lock:
+            for new_item in new_items:
+                if new_item._id in self._index:
+                    self._store(new_item)
+                    self._write_record(new_item)
+            self._touch()
+            self._maybe_compact()
+
+    def remove_many(self, item_ids):
+        with self._lock:
+            for item_id in item_ids:
+                self._discard(item_id)
+                slot = self._index.pop(item_id, None)
+                if slot:
+                    self._mark_dead(slot)
+            self._touch()
+            self._maybe_compact()
 
 class DroneTextFileRepository(TextFileRepository):
     def _object_to_line(self, item):
-        return f"{item._id},{item._serial_number},{item._model_type},{item._max_payload},{item._status},{item._battery_level}"
+        charging_since = "" if item._charging_since is None else item._charging_since
+        return f"{item._id},{item._serial_number},{item._model_type},{item._max_payload},{item._status},{item._battery_level},{charging_since}"
     
     def _line_to_object(self, line):
         parts = line.split(',')
-        return Drone(int(parts[0]),  parts[1], parts[2], float(parts[3]), parts[4], parts[5])
+        # the charging start is a later addition, older files only have six fields
+        battery_level = float(parts[5])
+        if battery_level.is_integer():
+            battery_level = int(battery_level)
+        charging_since = float(parts[6]) if len(parts) > 6 and parts[6] else None
+        return Drone(int(parts[0]),  parts[1], parts[2], float(parts[3]), parts[4], battery_level, charging_since)
     
 class ParcelTextFileRepository(TextFileRepository):
     def _object_to_line(self, item):
@@ -121,91 +584,276 @@ class MissionTextFileRepository(TextFileRepository):
         parts = line.split(',')
         return Mission(int(parts[0]),int(parts[1]), int(parts[2]), parts[3], parts[4])
 
-class DroneModel(Base):
-    __tablename__ = "Drones"
-    id = Column(Integer, primary_key = True)
-    serial_number = Column(String)
-    model_type = Column(String)
-    max_payload = Column(Float)
-    battery_level = Column(Integer)
-    status = Column(String)
+_engines = {}
+_engines_lock = threading.Lock()
+
+def _configure_sqlite_connection(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    # WAL lets the scheduler, the charger, the API server and the UI read while another thread writes
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA cache_size=-16000")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
+def _create_engine(connection_string):
+    url = make_url(connection_string)
+    if url.get_backend_name() != "sqlite":
+        return create_engine(connection_string, pool_size = 5, max_overflow = 10, pool_pre_ping = True)
+    if url.database in (None, "", ":memory:"):
+        # an in-memory database only lives as long as its connection, so every session has to share it
+        return create_engine(connection_string, poolclass = StaticPool, connect_args = {"check_same_thread": False})
+    engine = create_engine(connection_string, pool_size = 5, max_overflow = 10,
+                           connect_args = {"check_same_thread": False, "timeout": 5})
+    event.listen(engine, "connect", _configure_sqlite_connection)
+    return engine
+
+def _add_missing_columns(engine):
+    # create_all doesn't alter existing tables, columns added to a model later are appended here (always nullable)
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                with engine.begin() as connection:
+                    connection.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" '
+                                            f'{column.type.compile(engine.dialect)}'))
+
+def get_session_factory(connection_string):
+    """Returns the (engine, session factory) pair shared by every repository of the given database"""
+    with _engines_lock:
+        if connection_string not in _engines:
+            engine = _create_engine(connection_string)
+            Base.metadata.create_all(engine)
+            _add_missing_columns(engine)
+            # create_all skips tables that already exist, so indexes added later have to be created on their own
+            for table in Base.metadata.sorted_tables:
+                for index in table.indexes:
+                    index.create(bind = engine, checkfirst = True)
+            _engines[connection_string] = (engine, sessionmaker(bind = engine))
+        return _engines[connection_string]
+
+class SQLRepository(ABC):
+    _model = None
 
-class DroneSQLRepository:
     def __init__(self, connection_string = "sqlite:///logistics.db"):
-        self.engine = create_engine(connection_string)
-        Base.metadata.create_all(self.engine)
-        self.session = sessionmaker(bind = self.engine)
-
-    def add_item(self, drone):
-        session = self.session()
-        d_model = DroneModel(
-            id = drone.get_id(),
-            serial_number = drone.get_serial_number(),
-            model_type = drone.get_model_type(),
-            max_payload = drone.get_max_payload(),
-            battery_level = drone.get_battery_level(),
-            status = drone.get_status()
-        )
-        try:
-            session.add(d_model)
+        self.engine, self.session = get_session_factory(connection_string)
+        self._version = 0
+
+    def _touch(self):
+        self._version += 1
+
+    def version(self) -> int:
+        return self._version
+
+    @abstractmethod
+    def _to_row(self, item) -> dict:
+        pass
+
+    @abstractmethod
+    def _to_domain(self, row):
+        pass
+
+    def add_item(self, item):
+        with self.session() as session:
+            session.add(self._model(**self._to_row(item)))
             session.commit()
-        except Exception as e:
-            raise e
-        finally:
-            session.close()
+            self._touch()
 
     def get_data(self):
-        session = self.session()
-        db_Drones = session.query(DroneModel).all()
-        drones = [Drone(d.id, d.serial_number, d.model_type, d.max_payload, d.status, d.battery_level) for d in db_Drones]
-        session.close()
-        return drones
-    
-    def search_by_id(self, drone_id):
-        session = self.session()
-        db_drone =  session.query(DroneModel).filter_by(id=drone_id).first()
-        session.close()
+        with self.session() as session:
+            return [self._to_domain(row) for row in session.query(self._model).all()]
+
+    def iter_data(self, batch_size = 500):
+        with self.session() as session:
+            for row in session.query(self._model).order_by(self._model.id).yield_per(batch_size):
+                yield self._to_domain(row)
+
+    def _order_column(self, order_by):
+        column = getattr(self._model, order_by.lstrip("-"), None)
+        if column is None or order_by.lstrip("-") not in self._model.__table__.columns:
+            raise ValueError(f"Can not order {self._model.__tablename__} by {order_by}")
+        return column.desc() if order_by.startswith("-") else column.asc()
+
+    def get_page(self, offset = 0, limit = 50, order_by = "id", **criteria):
+        column = self._order_column(order_by)
+        with self.session() as session:
+            query = session.query(self._model)
+            for criteria_field, value in criteria.items():
+                query = query.filter(self._column(criteria_field) == value)
+            rows = query.order_by(column, self._model.id).offset(offset).limit(limit).all()
+            return [self._to_domain(row) for row in rows]
 
-        if db_drone is None:
-            return None
-        
-        drone = Drone(db_drone.id, db_drone.serial_number,db_drone.model_type, db_drone.max_payload, db_drone.status,
-                      db_drone.battery_level)
-        return drone
-        
-    def update(self, new_drone):
-        session =  self.session()
-        try:
-            db_drone = session.query(DroneModel).filter_by(id=new_drone.get_id()).first()
-            if db_drone:
-                db_drone.max_payload = new_drone.get_max_payload()
-                db_drone.model_type = new_drone.get_model_type()
-                db_drone.serial_number = new_drone.get_serial_number()
-                db_drone.battery_level = new_drone.get_battery_level()
-                db_drone.status = new_drone.get_status()
+    def search_by_id(self, item_id):
+        with self.session() as session:
+            row = session.get(self._model, item_id)
+            if row is None:
+                return None
+            return self._to_domain(row)
+
+    def existing_ids(self, item_ids) -> set:
+        item_ids = list(item_ids)
+        found = set()
+        with self.session() as session:
+            # chunked to stay under SQLite's bound parameter limit
+            for start in range(0, len(item_ids), 500):
+                chunk = item_ids[start:start + 500]
+                found.update(row_id for (row_id,) in session.query(self._model.id).filter(self._model.id.in_(chunk)))
+        return found
+
+    def update(self, new_item):
+        with self.session() as session:
+            row = session.get(self._model, new_item.get_id())
+            if row:
+                for column, value in self._to_row(new_item).items():
+                    setattr(row, column, value)
                 session.commit()
-        except Exception as e:
-            raise e
-        finally:
-            session.close()
+                self._touch()
 
     def remove_item(self, item_id):
-        session = self.session()
-        try:
-            db_drone = session.query(DroneModel).filter_by(id=item_id).first()
-            if db_drone:
-                session.delete(db_drone)
+        with self.session() as session:
+            row = session.get(self._model, item_id)
+            if row:
+                session.delete(row)
                 session.commit()
-        except Exception as e:
-            raise e
-        finally:
-            session.close()
+                self._touch()
+
+    def add_items(self, items):
+        rows = [self._to_row(item) for item in items]
+        if not rows:
+            return
+        with self.session() as session:
+            session.bulk_insert_mappings(self._model, rows)
+            session.commit()
+            self._touch()
+
+    def update_many(self, new_items):
+        rows = [self._to_row(item) for item in new_items]
+        if not rows:
+            return
+        with self.session() as session:
+            # like update(), ids that are not stored are skipped instead of failing the whole batch
+            existing_ids = {row_id for (row_id,) in session.query(self._model.id).filter(
+                self._model.id.in_([row["id"] for row in rows]))}
+            session.bulk_update_mappings(self._model, [row for row in rows if row["id"] in existing_ids])
+            session.commit()
+            self._touch()
+
+    def remove_many(self, item_ids):
+        item_ids = list(item_ids)
+        if not item_ids:
+            return
+        with self.session() as session:
+            session.query(self._model).filter(self._model.id.in_(item_ids)).delete(synchronize_session = False)
+            session.commit()
+            self._touch()
+
+    def _column(self, field):
+        if field not in self._model.__table__.columns:
+            raise ValueError(f"{self._model.__tablename__} has no column {field}")
+        return getattr(self._model, field)
+
+    def find_by(self, **criteria) -> list:
+        with self.session() as session:
+            query = session.query(self._model)
+            for field, value in criteria.items():
+                query = query.filter(self._column(field) == value)
+            return [self._to_domain(row) for row in query.order_by(self._model.id)]
+
+    def find_range(self, field, low = None, high = None, **criteria) -> list:
+        column = self._column(field)
+        with self.session() as session:
+            query = session.query(self._model)
+            if low is not None:
+                query = query.filter(column >= low)
+            if high is not None:
+                query = query.filter(column <= high)
+            for criteria_field, value in criteria.items():
+                query = query.filter(self._column(criteria_field) == value)
+            return [self._to_domain(row) for row in query.order_by(column, self._model.id)]
 
     def __len__(self):
-        session = self.session()
-        count = session.query(DroneModel).count()
-        session.close()
-        return count
+        with self.session() as session:
+            return session.query(self._model).count()
+
+    def count_by_status(self) -> dict:
+        with self.session() as session:
+            return dict(session.query(self._model.status, func.count()).group_by(self._model.status).all())
+
+    def transaction_factory(self):
+        return self.session
+
+    def _apply_in_session(self, session, changes):
+        # called by UnitOfWork, the caller owns the session and commits once for every repository involved
+        for operation, payload in changes:
+            if operation == "add":
+                session.add(self._model(**self._to_row(payload)))
+            elif operation == "update":
+                row = session.get(self._model, payload.get_id())
+                if row:
+                    for column, value in self._to_row(payload).items():
+                        setattr(row, column, value)
+            else:
+                row = session.get(self._model, payload)
+                if row:
+                    session.delete(row)
+
+    def _after_commit(self, changes):
+        self._touch()
+
+    def next_id(self) -> int:
+        """Allocates an id from the Sequences table, never below the highest id already in the table"""
+        name = self._model.__tablename__
+        highest = select(func.coalesce(func.max(self._model.id), 0)).scalar_subquery()
+        with self.session() as session:
+            # the UPDATE takes the write lock, so concurrent allocations queue up instead of reading the same value
+            updated = session.execute(
+                update(SequenceModel).where(SequenceModel.name == name)
+                .values(value = case((SequenceModel.value > highest, SequenceModel.value), else_ = highest) + 1)
+            ).rowcount
+            if not updated:
+                session.add(SequenceModel(name = name, value = session.execute(select(highest)).scalar() + 1))
+                try:
+                    session.flush()
+                except IntegrityError:
+                    session.rollback()
+                    return self.next_id()
+            value = session.query(SequenceModel.value).filter(SequenceModel.name == name).scalar()
+            session.commit()
+            return value
+
+class SequenceModel(Base):
+    __tablename__ = "Sequences"
+    name = Column(String, primary_key = True)
+    value = Column(Integer)
+
+class DroneModel(Base):
+    __tablename__ = "Drones"
+    id = Column(Integer, primary_key = True)
+    serial_number = Column(String)
+    model_type = Column(String)
+    max_payload = Column(Float, index = True)
+    battery_level = Column(Integer)
+    status = Column(String, index = True)
+    charging_since = Column(Float)
+
+class DroneSQLRepository(SQLRepository):
+    _model = DroneModel
+
+    def _to_row(self, drone):
+        return {
+            "id": drone.get_id(),
+            "serial_number": drone.get_serial_number(),
+            "model_type": drone.get_model_type(),
+            "max_payload": drone.get_max_payload(),
+            "battery_level": drone._battery_level,
+            "status": drone.get_status(),
+            "charging_since": drone.get_charging_since()
+        }
+
+    def _to_domain(self, d):
+        return Drone(d.id, d.serial_number, d.model_type, d.max_payload, d.status, d.battery_level, d.charging_since)
 
 class ParcelModel(Base):
     __tablename__ = "Parcels"
@@ -215,176 +863,44 @@ class ParcelModel(Base):
     weight = Column(Float)
     distance = Column(Float)
     priority = Column(String)
-    status = Column(String)
-
-class ParcelSQLRepository:
-    def __init__(self, connection_string = "sqlite:///logistics.db"):
-        self.engine = create_engine(connection_string)
-        Base.metadata.create_all(self.engine)
-        self.session = sessionmaker(bind = self.engine)
-
-    def add_item(self, parcel):
-        session  = self.session()
-        p_model = ParcelModel(
-            id = parcel.get_id(),
-            recipient_name = parcel.get_recipient_name(),
-            delivery_address = parcel.get_delivery_address(),
-            weight = parcel.get_weight(),
-            distance = parcel.get_distance(),
-            priority = parcel.get_priority(),
-            status = parcel.get_status()
-        )
-        try:
-            session.add(p_model)
-            session.commit()
-        except Exception as e:
-            raise e
-        finally:
-            session.close()
+    status = Column(String, index = True)
 
-    def get_data(self):
-        session = self.session()
-        db_parcels = session.query(ParcelModel).all()
-        session.close()
-        parcels = [Parcel(p.id, p.recipient_name, p.delivery_address, p.weight, p.priority, p.status, p.distance) for p in db_parcels]
-        return parcels
-    
-    def search_by_id(self, parcel_id):
-        session = self.session()
-        db_parcel = session.query(ParcelModel).filter_by(id = parcel_id).first()
-        session.close()
+class ParcelSQLRepository(SQLRepository):
+    _model = ParcelModel
 
-        if db_parcel is None:
-            return None
-        
-        parcel = Parcel(db_parcel.id, db_parcel.recipient_name, db_parcel.delivery_address, db_parcel.weight, db_parcel.priority, db_parcel.status,
-                        db_parcel.distance)
-        return parcel
+    def _to_row(self, parcel):
+        return {
+            "id": parcel.get_id(),
+            "recipient_name": parcel.get_recipient_name(),
+            "delivery_address": parcel.get_delivery_address(),
+            "weight": parcel.get_weight(),
+            "distance": parcel.get_distance(),
+            "priority": parcel.get_priority(),
+            "status": parcel.get_status()
+        }
 
-    def update(self, new_parcel):
-        session = self.session()
-        try:
-            db_parcel = session.query(ParcelModel).filter_by(id = new_parcel.get_id()).first()
-            if db_parcel:
-                db_parcel.recipient_name = new_parcel.get_recipient_name()
-                db_parcel.delivery_address = new_parcel.get_delivery_address()
-                db_parcel.weight = new_parcel.get_weight()
-                db_parcel.distance = new_parcel.get_distance()
-                db_parcel.priority = new_parcel.get_priority()
-                db_parcel.status = new_parcel.get_status()
-                session.commit()
-        except Exception as e:
-            raise e
-        finally:
-            session.close()
-
-    def remove_item(self, parcel_id):
-        session = self.session()
-        try:
-            db_parcel = session.query(ParcelModel).filter_by(id = parcel_id).first()
-            if db_parcel:
-                session.delete(db_parcel)
-                session.commit()
-        except Exception as e:
-            raise e
-        finally:
-            session.close()
-
-    def __len__(self):
-        session = self.session()
-        count = session.query(ParcelModel).count()
-        session.close()
-        return count
+    def _to_domain(self, p):
+        return Parcel(p.id, p.recipient_name, p.delivery_address, p.weight, p.priority, p.status, p.distance)
 
 class MissionModel(Base):
     __tablename__ = "Missions"
     id = Column(Integer, primary_key = True)
     drone_id = Column(Integer)
     parcel_id = Column(Integer)
-    start_time = Column(String)
-    status = Column(String)
-
-class MissionSQLRepository:
-    def __init__(self, connection_string = "sqlite:///logistics.db"):
-        self.engine = create_engine(connection_string)
-        Base.metadata.create_all(self.engine)
-        self.session = sessionmaker(bind = self.engine)
-
-    def add_item(self, mission):
-        session  = self.session()
-        m_model = MissionModel(
-            id = mission.get_id(),
-            drone_id = mission.get_drone_id(),
-            parcel_id = mission.get_parcel_id(),
-            start_time = mission.get_start_time(),
-            status = mission.get_status()
-        )
-        try:
-            session.add(m_model)
-            session.commit()
-        except Exception as e:
-            raise e
-        finally:
-            session.close()
-
-    def get_data(self):
-        session = self.session()
-        db_missions = session.query(MissionModel).all()
-        session.close()
-        missions = [Mission(m.id, m.drone_id, m.parcel_id, m.start_time, m.status) for m in db_missions]
-        return missions
-    
-    def search_by_id(self, mission_id):
-        session = self.session()
-        db_mission = session.query(MissionModel).filter_by(id = mission_id).first()
-        session.close()
-
-        if db_mission is None:
-            return None
-        
-        mission = Mission(db_mission.id, db_mission.drone_id, db_mission.parcel_id, db_mission.start_time, db_mission.status)
-        return mission
-
-    def update(self, new_mission):
-        session = self.session()
-        try:
-            db_mission = session.query(MissionModel).filter_by(id = new_mission.get_id()).first()
-            if db_mission:
-                db_mission.drone_id = new_mission.get_drone_id()
-                db_mission.parcel_id = new_mission.get_parcel_id()
-                db_mission.start_time = new_mission.get_start_time()
-                db_mission.status = new_mission.get_status()
-                session.commit()
-        except Exception as e:
-            raise e
-        finally:
-            session.close()
-
-    def remove_item(self, mission_id):
-        session = self.session()
-        try:
-            db_mission = session.query(MissionModel).filter_by(id = mission_id).first()
-            if db_mission:
-                session.delete(db_mission)
-                session.commit()
-        except Exception as e:
-            raise e
-        finally:
-            session.close()
-
-    def __len__(self):
-        session = self.session()
-        count = session.query(MissionModel).count()
-        session.close()
-        return count
-        
-
-
-        
-
-
-
-        
-
-    
-    
+    start_time = Column(String, index = True)
+    status = Column(String, index = True)
+
+class MissionSQLRepository(SQLRepository):
+    _model = MissionModel
+
+    def _to_row(self, mission):
+        return {
+            "id": mission.get_id(),
+            "drone_id": mission.get_drone_id(),
+            "parcel_id": mission.get_parcel_id(),
+            "start_time": mission.get_start_time(),
+            "status": mission.get_status()
+        }
+
+    def _to_domain(self, m):
+        return Mission(m.id, m.drone_id, m.parcel_id, m.start_time, m.status)
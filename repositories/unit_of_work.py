@@ -0,0 +1,70 @@
+import itertools
+from sqlalchemy.orm import sessionmaker
+from services.metrics import REGISTRY
+
+REPOSITORY_WRITE_SECONDS = REGISTRY.histogram("aerologistics_repository_write_seconds", "Time spent writing to the repositories")
+
+class UnitOfWork:
+    # collects the writes of one service operation and flushes them together: SQL repositories (or composites
+    # with a SQL primary) sharing a database are written in a single session and commit, every other repository
+    # gets one bulk call per run of same-kind changes, so a file backend persists once instead of once per write
+    _SINGLE = {"add": "add_item", "update": "update", "remove": "remove_item"}
+    _BULK = {"add": "add_items", "update": "update_many", "remove": "remove_many"}
+
+    def __init__(self):
+        self._changes = []
+
+    def add(self, repo, item):
+        self._changes.append((repo, "add", item))
+
+    def update(self, repo, item):
+        self._changes.append((repo, "update", item))
+
+    def remove(self, repo, item_id):
+        self._changes.append((repo, "remove", item_id))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self._changes = []
+        return False
+
+    def commit(self):
+        with REPOSITORY_WRITE_SECONDS.time(operation = "commit"):
+            self._commit()
+
+    def _commit(self):
+        changes, self._changes = self._changes, []
+        by_repo = {}
+        for repo, operation, payload in changes:
+            by_repo.setdefault(id(repo), (repo, []))[1].append((operation, payload))
+
+        transactional = {}
+        direct = []
+        for repo, repo_changes in by_repo.values():
+            factory = getattr(repo, "transaction_factory", None)
+            factory = factory() if callable(factory) else None
+            if isinstance(factory, sessionmaker):
+                transactional.setdefault(id(factory), (factory, []))[1].append((repo, repo_changes))
+            else:
+                direct.append((repo, repo_changes))
+
+        for factory, members in transactional.values():
+            with factory() as session:
+                for repo, repo_changes in members:
+                    repo._apply_in_session(session, repo_changes)
+                session.commit()
+            for repo, repo_changes in members:
+                repo._after_commit(repo_changes)
+
+        for repo, repo_changes in direct:
+            for operation, run in itertools.groupby(repo_changes, key = lambda change: change[0]):
+                payloads = [payload for _, payload in run]
+                if len(payloads) == 1:
+                    getattr(repo, self._SINGLE[operation])(payloads[0])
+                else:
+                    getattr(repo, self._BULK[operation])(payloads)
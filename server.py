@@ -0,0 +1,45 @@
+import argparse
+import sys
+import uvicorn
+import api_server
+from settings import load_settings, build_repositories
+from services.fleetservice import DroneService
+from services.logistics_service import LogisticService
+
+# Standalone dashboard/API server. Each uvicorn worker is its own process reading the shared database,
+# while the desktop app (with embedded_api = false) keeps doing the writes and running the scheduler.
+# Run it with: python server.py --workers 4
+
+def _connect(read_only = False):
+    settings = load_settings()
+    if settings['repository'].strip('"') != 'db':
+        raise ValueError("The standalone server needs repository = \"db\", file repositories are not shared between processes")
+    d_repo, p_repo, m_repo = build_repositories(settings)
+    # the services are only read from here, the weather service and AI are never reached by a route
+    d_service = DroneService(d_repo, read_only = read_only)
+    l_service = LogisticService(p_repo, m_repo, d_repo, None, None, seed = not read_only)
+    snapshot_ttl = int(settings.get('api_snapshot_ttl', '5').strip('"'))
+    return d_service, l_service, snapshot_ttl
+
+def create_app():
+    """App factory for the uvicorn workers, each one connects on its own"""
+    # the parent process seeded the tables and started the idle drones charging, a worker only reads them
+    d_service, l_service, snapshot_ttl = _connect(read_only = True)
+    api_server.set_repo(d_service, l_service)
+    api_server.set_snapshot_ttl(snapshot_ttl)
+    return api_server.app
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "AeroLogistics dashboard and JSON API")
+    parser.add_argument("--host", default = "0.0.0.0")
+    parser.add_argument("--port", type = int, default = 8000)
+    parser.add_argument("--workers", type = int, default = 2)
+    args = parser.parse_args()
+    try:
+        # connecting once up front creates the tables and the generated fleet before the workers race for them
+        _connect()
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    uvicorn.run("server:create_app", factory = True, host = args.host, port = args.port,
+                workers = args.workers, log_level = "error")
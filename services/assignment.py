@@ -0,0 +1,55 @@
+import numpy as np
+
+def min_cost_assignment(cost) -> tuple:
+    """
+    Hungarian algorithm (shortest augmenting paths with potentials) for a rectangular cost matrix.
+    Returns (rows, cols) of the minimum cost matching, every row or every column is matched,
+    whichever dimension is smaller. Same contract as scipy's linear_sum_assignment.
+    """
+    cost = np.asarray(cost, dtype = float)
+    transposed = cost.shape[0] > cost.shape[1]
+    if transposed:
+        cost = cost.T
+    n, m = cost.shape
+    if n == 0:
+        empty = np.zeros(0, dtype = int)
+        return empty, empty
+
+    # 1-based like the textbook version, column 0 is the virtual start of every augmenting path
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    p = np.zeros(m + 1, dtype = int)
+    way = np.zeros(m + 1, dtype = int)
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype = bool)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            free = ~used[1:]
+            reduced = cost[i0 - 1] - u[i0] - v[1:]
+            better = free & (reduced < minv[1:])
+            minv[1:][better] = reduced[better]
+            way[1:][better] = j0
+            candidates = np.where(free, minv[1:], np.inf)
+            j1 = int(np.argmin(candidates)) + 1
+            delta = candidates[j1 - 1]
+            u[p[used]] += delta
+            v[used] -= delta
+            minv[~used] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+
+    cols = np.nonzero(p[1:])[0]
+    rows = p[1:][cols] - 1
+    if transposed:
+        rows, cols = cols, rows
+    order = np.argsort(rows)
+    return rows[order], cols[order]
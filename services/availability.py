@@ -0,0 +1,79 @@
+import bisect
+import threading
+from models.status import DroneStatus
+
+class FleetAvailabilityIndex:
+    # IDLE drones sorted by (max payload, id), so the best fit for a parcel is a bisect to the first drone
+    # that can carry it followed by a walk until one also has the battery for the trip.
+    # Both services push every drone they change through track(), the lock keeps the charger,
+    # the scheduler and the UI/API threads from seeing a half-updated index
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._entries = []
+        self._drones = {}
+
+    def rebuild(self, drones):
+        with self._lock:
+            self._entries = []
+            self._drones = {}
+            for drone in drones:
+                self.track(drone)
+
+    def track(self, drone):
+        with self._lock:
+            self._remove(drone.get_id())
+            if drone.get_status() == DroneStatus.IDLE:
+                bisect.insort(self._entries, (drone.get_max_payload(), drone.get_id()))
+                self._drones[drone.get_id()] = drone
+
+    def track_many(self, drones):
+        with self._lock:
+            for drone in drones:
+                self.track(drone)
+
+    def discard(self, drone_id : int):
+        with self._lock:
+            self._remove(drone_id)
+
+    def claim(self, drone_id : int) -> bool:
+        """Takes a specific drone out of the index, False when it is not idle or another assignment already took it"""
+        with self._lock:
+            if drone_id not in self._drones:
+                return False
+            self._remove(drone_id)
+            return True
+
+    def claim_many(self, drone_ids) -> set:
+        with self._lock:
+            return {drone_id for drone_id in drone_ids if self.claim(drone_id)}
+
+    def _remove(self, drone_id):
+        drone = self._drones.pop(drone_id, None)
+        if drone is None:
+            return
+        position = bisect.bisect_left(self._entries, (drone.get_max_payload(), drone_id))
+        if position < len(self._entries) and self._entries[position] == (drone.get_max_payload(), drone_id):
+            del self._entries[position]
+
+    def best_fit(self, weight : float, required_battery, claim : bool = False):
+        """
+        First IDLE drone by payload that carries weight and whose battery covers required_battery(max_payload).
+        With claim the drone leaves the index in the same critical section, so two assignments can't pick it
+        """
+        with self._lock:
+            position = bisect.bisect_left(self._entries, (weight, float('-inf')))
+            for payload, drone_id in self._entries[position:]:
+                drone = self._drones[drone_id]
+                if drone.get_battery_level() >= required_battery(payload):
+                    if claim:
+                        self._remove(drone_id)
+                    return drone
+            return None
+
+    def idle_drones(self) -> list:
+        with self._lock:
+            return [self._drones[drone_id] for _, drone_id in self._entries]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
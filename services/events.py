@@ -0,0 +1,24 @@
+import threading
+
+class EventBus:
+    # the services publish every entity they change, listeners run on the publishing thread
+    # so they should only hand the event off (e.g. to the API server's push queues)
+    def __init__(self):
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, listener):
+        """listener(kind, item) is called for every change, kind is drone/parcel/mission or drone_removed/parcel_removed"""
+        with self._lock:
+            self._listeners = self._listeners + [listener]
+
+    def unsubscribe(self, listener):
+        with self._lock:
+            self._listeners = [current for current in self._listeners if current is not listener]
+
+    def publish(self, kind : str, item):
+        for listener in self._listeners:
+            try:
+                listener(kind, item)
+            except Exception as e:
+                print(f"WARNING: Event listener failed {e}")
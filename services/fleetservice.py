@@ -1,50 +1,55 @@
 from models.drone import Drone
+from models.status import DroneStatus
 from exceptions import IDNotFound
 from exceptions import DuplicateID, DroneInFlight, DroneFlightAssigned
+from repositories.unit_of_work import REPOSITORY_WRITE_SECONDS
 from faker import Faker
 import random
-import threading
-import time
 
 class DroneService:
-    def __init__(self, repository):
+    def __init__(self, repository, availability = None, events = None, seed = True, read_only = False):
         self._repository = repository
-        if len(self._repository.get_data()) == 0:
+        self._availability = availability
+        self._events = events
+        # a read_only service (an API worker next to the process that owns the fleet) never writes on startup
+        if seed and not read_only and len(self._repository) == 0:
             self.__generate_drones()
+        if not read_only:
+            self._start_idle_charging()
+        if self._availability is not None:
+            self._availability.rebuild(self._repository.find_by(status = DroneStatus.IDLE))
 
     def __generate_drones(self):
         statuses = ['IDLE', 'MAINTENANCE']
         models = ['Swift-X1', 'HeavyLift-V2', 'Interceptor-9']
         fake = Faker()
+        drones = []
         for i in range(1, 21):
             drone_serial = fake.bothify(text='DRN-####-????') 
             drone_model = random.choice(models)
             drone_status = random.choice(statuses)
             drone_battery = random.randint(0,100)
             payload = round(random.uniform(0.5, 10.0), 2)
-            drone = Drone(i, drone_serial, drone_model, payload, drone_status, drone_battery)
-            self._repository.add_item(drone)
+            drones.append(Drone(i, drone_serial, drone_model, payload, drone_status, drone_battery))
+        self._repository.add_items(drones)
 
-    def _charge_drone(self):
-        charge = threading.Thread(target = self._drone_charger, daemon=True)
-        charge.start()
-
-    def _drone_charger(self):
-        while True:
-            try:
-                drones = self._repository.get_data()
-                for drone in drones:
-                    if drone.get_status() == "IDLE":
-                        if drone.get_battery_level() < 80:
-                            drone.charge_battery(3)
-                        elif drone.get_battery_level() < 100:
-                            drone.charge_battery(1)
-                    self._repository.update(drone)
-                    time.sleep(0.1)
-            except Exception as e:
-                print(f"Error trying to charge the drones {e}")
-            time.sleep(10)
+    def _start_idle_charging(self):
+        # idle drones stored before charging was modelled lazily have no charging start yet, they start now
+        # and are written once, after that the battery only changes in storage on status changes
+        idle_drones = [drone for drone in self._repository.find_by(status = DroneStatus.IDLE)
+                       if drone.get_charging_since() is None]
+        for drone in idle_drones:
+            drone.start_charging()
+        if idle_drones:
+            with REPOSITORY_WRITE_SECONDS.time(operation = "start_charging"):
+                self._repository.update_many(idle_drones)
 
+    def _drones_changed(self, drones):
+        if self._availability is not None:
+            self._availability.track_many(drones)
+        if self._events is not None:
+            for drone in drones:
+                self._events.publish("drone", drone)
 
     def search_by_id(self, drone_id : int):
         return self._repository.search_by_id(drone_id)
@@ -60,26 +65,33 @@ class DroneService:
         if battery_level > 100:
             raise ValueError("Maximum battery level is 100")
         drone = Drone(id, serial_number, model_type, payload, status, battery_level)
+        if drone.get_status() == DroneStatus.IDLE:
+            drone.start_charging()
         self._repository.add_item(drone)
+        self._drones_changed([drone])
 
     def remove_drone(self, id : int):
         drone = self._repository.search_by_id(id)
         if not drone:
             raise IDNotFound(id, "Drone")
-        if drone.get_status() == "IN_FLIGHT":
+        if drone.get_status() == DroneStatus.IN_FLIGHT:
             raise DroneInFlight(id)
-        if drone.get_status() == "ASSIGNED":
+        if drone.get_status() == DroneStatus.ASSIGNED:
             raise DroneFlightAssigned(id)
         self._repository.remove_item(id)
+        if self._availability is not None:
+            self._availability.discard(id)
+        if self._events is not None:
+            self._events.publish("drone_removed", id)
 
     def update_drone(self, id : int, new_serial_number : str, new_model_type : str, new_payload : float, 
                      new_status : str, battery_level : int):
         drone = self._repository.search_by_id(id)
         if not drone:
             raise IDNotFound(id, "Drone")
-        if drone.get_status() == "IN_FLIGHT":
+        if drone.get_status() == DroneStatus.IN_FLIGHT:
             raise DroneInFlight(id)
-        if drone.get_status() == "ASSIGNED":
+        if drone.get_status() == DroneStatus.ASSIGNED:
             raise DroneFlightAssigned(id)
         if new_payload <= 0:
             raise ValueError("Drone PayLoad must be greater than 0")
@@ -88,14 +100,35 @@ class DroneService:
         if battery_level > 100:
             raise ValueError("Maximum battery level is 100")
         new_drone = Drone(id, new_serial_number, new_model_type, new_payload, new_status, battery_level)
-        self._repository.update(new_drone)
+        if new_drone.get_status() == DroneStatus.IDLE:
+            new_drone.start_charging()
+        with REPOSITORY_WRITE_SECONDS.time(operation = "update"):
+            self._repository.update(new_drone)
+        self._drones_changed([new_drone])
 
     def list_the_drones(self) -> list:
         return self._repository.get_data()
+
+    def iter_drones(self):
+        return self._repository.iter_data()
+
+    def get_drones_page(self, offset : int = 0, limit : int = 50, order_by : str = "id", **criteria) -> list:
+        # checked against the model up front, a store that holds no drones has nothing to check the field on
+        Drone.order_key(order_by)
+        return self._repository.get_page(offset, limit, order_by, **criteria)
+
+    def drones_version(self) -> int:
+        return self._repository.version()
+
+    def count_by_status(self) -> dict:
+        return self._repository.count_by_status()
+
+    def replicated_repositories(self) -> dict:
+        """The composite repositories behind the service by name, their replication is reported on /metrics"""
+        return {"drones": self._repository} if hasattr(self._repository, "queue_depth") else {}
     
     def search_drone(self, query) -> list:
-        drones = self._repository.get_data()
-        filtered_drones = [drone for drone in drones if drone.fuzzy_match(query)]
+        filtered_drones = [drone for drone in self._repository.iter_data() if drone.fuzzy_match(query)]
         return filtered_drones
 
     
@@ -0,0 +1,73 @@
+import csv
+import itertools
+import json
+
+PARCEL_COLUMNS = ("id", "recipient_name", "delivery_address", "weight", "priority", "distance")
+
+class RecordParser:
+    # turns one line of an NDJSON or CSV upload into a record dict, so the API and the CLI can both feed it
+    # line by line without holding the whole upload. A CSV upload starts with a header naming PARCEL_COLUMNS
+    FORMATS = ("ndjson", "csv")
+
+    def __init__(self, format : str):
+        if format not in self.FORMATS:
+            raise ValueError(f"Unsupported format {format}, expected one of {', '.join(self.FORMATS)}")
+        self._format = format
+        self._header = None
+
+    def parse(self, line : str):
+        """Returns the record of a line, None for blank lines and the CSV header, ValueError for a malformed line"""
+        if not line.strip():
+            return None
+        if self._format == "ndjson":
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Invalid JSON: {e.msg}")
+            if not isinstance(record, dict):
+                raise ValueError("Expected a JSON object")
+            return record
+
+        values = next(csv.reader([line]))
+        if self._header is None:
+            self._header = [value.strip() for value in values]
+            missing = [column for column in PARCEL_COLUMNS if column not in self._header and column != "priority"]
+            if missing:
+                raise ValueError(f"CSV header is missing {', '.join(missing)}")
+            return None
+        if len(values) != len(self._header):
+            raise ValueError(f"Expected {len(self._header)} columns, got {len(values)}")
+        return dict(zip(self._header, values))
+
+def ingest_chunk(service, parser : RecordParser, numbered_lines) -> tuple:
+    """Parses a chunk of (line number, line) pairs and stores its records, returns (added, [(line number, error)])"""
+    records, errors = [], []
+    for line_number, line in numbered_lines:
+        try:
+            record = parser.parse(line)
+        except ValueError as e:
+            errors.append((line_number, str(e)))
+            continue
+        if record is not None:
+            records.append((line_number, record))
+    added, rejected = service.add_parcels(records)
+    return added, sorted(errors + rejected)
+
+def ingest_lines(service, lines, format : str, chunk_size : int = 1000, on_error = None) -> tuple:
+    """
+    Streams lines into the service chunk_size lines at a time, every rejected line is passed
+    to on_error(line number, message). Returns (added, failed)
+    """
+    parser = RecordParser(format)
+    added, failed = 0, 0
+    numbered = enumerate(lines, 1)
+    while True:
+        chunk = list(itertools.islice(numbered, chunk_size))
+        if not chunk:
+            return added, failed
+        count, errors = ingest_chunk(service, parser, chunk)
+        added += count
+        failed += len(errors)
+        if on_error:
+            for line_number, message in errors:
+                on_error(line_number, message)
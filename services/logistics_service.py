@@ -1,27 +1,45 @@
 from exceptions import IDNotFound, DuplicateID, WeightExceeded, DroneUnavailable, NoDroneAvailable,ParcelAlreadyDelivered, InvalidTime
 from models.parcel import Parcel
 from models.mission import Mission
+from models.status import DroneStatus, MissionStatus, ParcelStatus, Priority
+from repositories.unit_of_work import UnitOfWork, REPOSITORY_WRITE_SECONDS
+from services.assignment import min_cost_assignment
+from services.scheduler import MissionScheduler
+from services.metrics import REGISTRY
 from faker import Faker
+import math
 import random
+import numpy as np
 from datetime import datetime
-import threading
-import time
 from exceptions import ParcelAlreadyAssigned, ParcelAssigned, ParcelDelivered, NotEnoughBattery
 
+_ASSIGN_SECONDS = REGISTRY.histogram("aerologistics_assign_mission_seconds", "Time spent assigning one mission automatically")
+_FIND_DRONE_SECONDS = REGISTRY.histogram("aerologistics_find_best_drone_seconds", "Time spent picking the best drone for a parcel")
+_LAUNCH_SECONDS = REGISTRY.histogram("aerologistics_mission_launch_seconds", "Time the scheduler spends launching a due mission")
+_MISSIONS_ASSIGNED = REGISTRY.counter("aerologistics_missions_assigned_total", "Missions created, by how they were assigned")
+_PARCELS_INGESTED = REGISTRY.counter("aerologistics_parcels_ingested_total", "Parcel records from bulk uploads, by result")
+
 class LogisticService:
-    def __init__(self, parcels_repo, missions_repo, drone_repo, weather_service, ai):
+    def __init__(self, parcels_repo, missions_repo, drone_repo, weather_service, ai, availability = None, events = None,
+                 seed = True):
         self._parcels_repo = parcels_repo
         self._missions_repo = missions_repo
         self._drone_repo = drone_repo
         self._weather_service = weather_service
         self._ai = ai
-        if len(self._parcels_repo.get_data()) == 0:
+        # optional FleetAvailabilityIndex shared with the DroneService, without it best fit falls back to the repository
+        self._availability = availability
+        self._events = events
+        self._scheduler = MissionScheduler(self._launch_mission)
+        # seed = False leaves an empty store empty, for entry points that fill it themselves
+        if seed and len(self._parcels_repo) == 0:
             self.__generate_parcels()
 
     def __generate_parcels(self):
-        possible_priority = ["HIGH", "STANDARD"]
-        possible_status = ["DELIVERED", "PENDING"]
+        possible_priority = [Priority.HIGH, Priority.STANDARD]
+        possible_status = [ParcelStatus.DELIVERED, ParcelStatus.PENDING]
         fake = Faker()
+        parcels = []
         for i in range(1, 21):
             parcel_recipient_name = fake.name().replace(',', ' ')
             parcel_delivery_address = fake.address().replace('\n', '-').replace(',', ';')
@@ -29,32 +47,51 @@ class LogisticService:
             distance = random.randint(10,100)
             priority = random.choice(possible_priority)
             status = random.choice(possible_status)
-            parcel = Parcel(i, parcel_recipient_name, parcel_delivery_address, weight, priority,status, distance)
-            self._parcels_repo.add_item(parcel)
+            parcels.append(Parcel(i, parcel_recipient_name, parcel_delivery_address, weight, priority,status, distance))
+        self._parcels_repo.add_items(parcels)
 
     def _start_background_scheduler(self):
-        thread = threading.Thread(target = self._scheduled_missions_deploy, daemon=True)
-        thread.start()
+        for mission in self._missions_repo.find_by(status = MissionStatus.SCHEDULED):
+            self._scheduler.schedule(mission.get_id(), mission.get_start_time())
+        self._scheduler.start()
+
+    @_LAUNCH_SECONDS.time()
+    def _launch_mission(self, mission_id : int):
+        mission = self._missions_repo.search_by_id(mission_id)
+        if not mission or mission.get_status() != MissionStatus.SCHEDULED:
+            return
+        mission.set_status(MissionStatus.EN_ROUTE)
+        drone = self._drone_repo.search_by_id(mission.get_drone_id())
+        with UnitOfWork() as uow:
+            uow.update(self._missions_repo, mission)
+            if drone:
+                drone.set_status(DroneStatus.IN_FLIGHT)
+                uow.update(self._drone_repo, drone)
+        if drone:
+            self._drones_changed([drone])
+        self._publish("mission", [mission])
+
+    def _drones_changed(self, drones):
+        if self._availability is not None:
+            self._availability.track_many(drones)
+        self._publish("drone", drones)
+
+    def _release(self, parcels, drones):
+        # an assignment failed after its drones were claimed from the availability index, nothing was stored,
+        # so the parcels go back to PENDING and the drones back to IDLE and into the index
+        for parcel in parcels:
+            parcel.set_status(ParcelStatus.PENDING)
+        for drone in drones:
+            if drone.get_status() != DroneStatus.IDLE:
+                drone.set_status(DroneStatus.IDLE)
+        if self._availability is not None:
+            self._availability.track_many(drones)
+
+    def _publish(self, kind : str, items):
+        if self._events is not None:
+            for item in items:
+                self._events.publish(kind, item)
 
-    def _scheduled_missions_deploy(self):
-        while True:
-            try:
-                missions = self._missions_repo.get_data()
-                filtered_missions = [mission for mission in missions if mission.get_status() == "SCHEDULED"]
-                for mission in filtered_missions:
-                    mission_start_time = datetime.strptime(mission.get_start_time(), "%Y-%m-%d %H:%M:%S")
-                    if mission_start_time <= datetime.now():
-                        mission.set_status("EN_ROUTE")
-                        self._missions_repo.update(mission)
-                        drone = self._drone_repo.search_by_id(mission.get_drone_id())
-                        if drone:
-                            drone.set_status("IN_FLIGHT")
-                            self._drone_repo.update(drone)
-            except Exception as e:
-                print(f"SCHEDULER ERROR {e}")
-            time.sleep(10)
-
-                
     def search_by_id(self, parcel_id : int):
         return self._parcels_repo.search_by_id(parcel_id)
      
@@ -67,25 +104,111 @@ class LogisticService:
         if weight <= 0:
             raise ValueError("Parcel Weight must be positive")
         
-        status = "PENDING"
+        status = ParcelStatus.PENDING
         if distance <= 0:
             raise ValueError("Parcel distance must be greater than 0")
         
         parcel = Parcel(parcel_id, recipient_name, delivery_address, weight, priority,status, distance)
         self._parcels_repo.add_item(parcel)
+        self._publish("parcel", [parcel])
+
+    def add_parcels(self, records) -> tuple:
+        """
+        Bulk version of add_parcel for a chunk of (line number, record dict) pairs: records are validated like
+        add_parcel, duplicates are found with one existing_ids lookup and the valid ones are written in one batch
+        (parcel by parcel if the batch fails, so a row the backend refuses is reported like a bad record).
+        Returns (number added, [(line number, error message)]) without stopping at the first bad record
+        """
+        errors = []
+        parcels = []
+        seen = set()
+        for line_number, record in records:
+            try:
+                parcel = self._parcel_from_record(record)
+            except (ValueError, TypeError) as e:
+                errors.append((line_number, str(e)))
+                continue
+            if parcel.get_id() in seen:
+                errors.append((line_number, str(DuplicateID(parcel.get_id(), "Parcel"))))
+                continue
+            seen.add(parcel.get_id())
+            parcels.append((line_number, parcel))
+
+        existing = self._parcels_repo.existing_ids(seen)
+        for line_number, parcel in parcels:
+            if parcel.get_id() in existing:
+                errors.append((line_number, str(DuplicateID(parcel.get_id(), "Parcel"))))
+        new_parcels = self._store_parcels([(line_number, parcel) for line_number, parcel in parcels
+                                           if parcel.get_id() not in existing], errors)
+        _PARCELS_INGESTED.inc(len(new_parcels), result = "added")
+        _PARCELS_INGESTED.inc(len(errors), result = "rejected")
+        errors.sort()
+        return len(new_parcels), errors
+
+    def _store_parcels(self, numbered_parcels, errors) -> list:
+        """Writes the parcels in one batch, a failing batch is retried one parcel at a time and only the failing ones are reported"""
+        if not numbered_parcels:
+            return []
+        try:
+            with UnitOfWork() as uow:
+                for _, parcel in numbered_parcels:
+                    uow.add(self._parcels_repo, parcel)
+            return [parcel for _, parcel in numbered_parcels]
+        except Exception as e:
+            if len(numbered_parcels) == 1:
+                errors.append((numbered_parcels[0][0], str(e)))
+                return []
+        # a file backend may have written part of the batch before it failed, those parcels are not written twice
+        stored = self._parcels_repo.existing_ids(parcel.get_id() for _, parcel in numbered_parcels)
+        added = [parcel for _, parcel in numbered_parcels if parcel.get_id() in stored]
+        for pair in numbered_parcels:
+            if pair[1].get_id() not in stored:
+                added.extend(self._store_parcels([pair], errors))
+        return added
+
+    def _parcel_from_record(self, record : dict) -> Parcel:
+        missing = [field for field in ("id", "recipient_name", "delivery_address", "weight", "distance")
+                   if record.get(field) in (None, "")]
+        if missing:
+            raise ValueError(f"Missing {', '.join(missing)}")
+        try:
+            parcel_id = int(record["id"])
+        except (TypeError, ValueError):
+            raise ValueError(f"Parcel id must be an integer, got {record['id']!r}")
+        if not -2 ** 63 <= parcel_id < 2 ** 63:
+            raise ValueError(f"Parcel id {parcel_id} does not fit in 64 bits")
+        try:
+            weight = float(record["weight"])
+            distance = float(record["distance"])
+        except (TypeError, ValueError):
+            raise ValueError("Parcel weight and distance must be numbers")
+        if not (math.isfinite(weight) and math.isfinite(distance)):
+            raise ValueError("Parcel weight and distance must be finite")
+        if weight <= 0:
+            raise ValueError("Parcel Weight must be positive")
+        if distance <= 0:
+            raise ValueError("Parcel distance must be greater than 0")
+        priority = record.get("priority") or Priority.STANDARD
+        if not isinstance(priority, str) or priority not in {member.value for member in Priority}:
+            raise ValueError(f"Unknown priority {priority!r}")
+        # the text backend separates fields with commas and rows with newlines, same replacements as the generated parcels
+        recipient_name, delivery_address = (str(record[field]).replace("\r\n", "\n").replace("\n", "-").replace(",", ";")
+                                            for field in ("recipient_name", "delivery_address"))
+        return Parcel(parcel_id, recipient_name, delivery_address, weight, priority, ParcelStatus.PENDING, distance)
 
     def remove_parcel(self, parcel_id : int):
         exist_parcel = self._parcels_repo.search_by_id(parcel_id)
         if not exist_parcel:
             raise IDNotFound(parcel_id,"Parcel")
         
-        if exist_parcel.get_status() == "DELIVERED":
+        if exist_parcel.get_status() == ParcelStatus.DELIVERED:
             raise ParcelDelivered(parcel_id)
         
-        if exist_parcel.get_status() == "ASSIGNED":
+        if exist_parcel.get_status() == ParcelStatus.ASSIGNED:
             raise ParcelAssigned(parcel_id)
         
         self._parcels_repo.remove_item(parcel_id)
+        self._publish("parcel_removed", [parcel_id])
 
     def update_parcel(self, parcel_id : int, recipient_name : str, delivery_address : str, 
                       weight : float, priority : str,status : str, distance : float):
@@ -93,10 +216,10 @@ class LogisticService:
         if not exist_parcel:
             raise IDNotFound(parcel_id,"Parcel")
         
-        if exist_parcel.get_status() == "DELIVERED":
+        if exist_parcel.get_status() == ParcelStatus.DELIVERED:
             raise ParcelDelivered(parcel_id)
         
-        if exist_parcel.get_status() == "ASSIGNED":
+        if exist_parcel.get_status() == ParcelStatus.ASSIGNED:
             raise ParcelAssigned(parcel_id)
         
         if weight <= 0:
@@ -106,19 +229,29 @@ class LogisticService:
             raise ValueError("Parcel distance must be greater than 0")
         
         new_parcel = Parcel(parcel_id, recipient_name, delivery_address, weight, priority,status, distance)
-        self._parcels_repo.update(new_parcel)
+        with REPOSITORY_WRITE_SECONDS.time(operation = "update"):
+            self._parcels_repo.update(new_parcel)
+        self._publish("parcel", [new_parcel])
 
     def get_parcels(self) -> list:
         return self._parcels_repo.get_data()
+
+    def iter_parcels(self):
+        return self._parcels_repo.iter_data()
+
+    def get_parcels_page(self, offset : int = 0, limit : int = 50, order_by : str = "id", **criteria) -> list:
+        # checked against the model up front, a store that holds no parcels has nothing to check the field on
+        Parcel.order_key(order_by)
+        return self._parcels_repo.get_page(offset, limit, order_by, **criteria)
+
+    def parcels_version(self) -> int:
+        return self._parcels_repo.version()
     
     def get_delivered_parcels(self) -> list:
-        parcels = self._parcels_repo.get_data()
-        delivered_parcels = [parcel for parcel in parcels if parcel.get_status() == "DELIVERED"]
-        return delivered_parcels
+        return self._parcels_repo.find_by(status = ParcelStatus.DELIVERED)
     
     def search_parcels(self, query) -> list:
-        parcels = self._parcels_repo.get_data()
-        filtered_drones = [parcel for parcel in parcels if parcel.fuzzy_match(query)]
+        filtered_drones = [parcel for parcel in self._parcels_repo.iter_data() if parcel.fuzzy_match(query)]
         return filtered_drones
     
     def assign_a_mission_manually(self, mission_id : int,drone_id : int, parcel_id : int, start_time : str):
@@ -128,22 +261,22 @@ class LogisticService:
         parcel = self._parcels_repo.search_by_id(parcel_id)
         if not parcel:
             raise IDNotFound(parcel_id, "Parcel")
-        if parcel.get_status() == "DELIVERED":
+        if parcel.get_status() == ParcelStatus.DELIVERED:
             raise ParcelAlreadyDelivered(parcel.get_id())
-        if parcel.get_status() == "ASSIGNED":
+        if parcel.get_status() == ParcelStatus.ASSIGNED:
             raise ParcelAlreadyAssigned(parcel.get_id())
         if parcel.get_weight() > drone.get_max_payload():
             raise WeightExceeded(drone.get_max_payload(), parcel.get_weight())
-        if drone.get_status() != "IDLE":
+        if drone.get_status() != DroneStatus.IDLE:
             raise DroneUnavailable(drone.get_id())
         
         scheduled_dt = datetime.strptime(start_time, "%Y-%m-%d %H:%M:%S")
         if scheduled_dt > datetime.now():
-            status = "SCHEDULED"
-            new_drone_status = "FLIGHT SCHEDULED"
+            status = MissionStatus.SCHEDULED
+            new_drone_status = DroneStatus.FLIGHT_SCHEDULED
         elif scheduled_dt == datetime.now():
-            status = "EN_ROUTE"
-            new_drone_status = "IN_FLIGHT"
+            status = MissionStatus.EN_ROUTE
+            new_drone_status = DroneStatus.IN_FLIGHT
         else:
             raise InvalidTime(start_time)
         
@@ -151,79 +284,222 @@ class LogisticService:
                                                                    drone.get_max_payload())
         if  required_battery > drone.get_battery_level():
             raise NotEnoughBattery(drone.get_id())
-        mission = Mission(mission_id, drone_id, parcel_id, start_time, status)
-        parcel.set_status("ASSIGNED")
-        self._parcels_repo.update(parcel)
-        self._missions_repo.add_item(mission)
-        drone.set_status(new_drone_status)
-        self._drone_repo.update(drone)
+        if self._availability is not None and not self._availability.claim(drone_id):
+            raise DroneUnavailable(drone_id)
+        try:
+            mission = Mission(mission_id, drone_id, parcel_id, start_time, status)
+            parcel.set_status(ParcelStatus.ASSIGNED)
+            drone.set_status(new_drone_status)
+            with UnitOfWork() as uow:
+                uow.update(self._parcels_repo, parcel)
+                uow.add(self._missions_repo, mission)
+                uow.update(self._drone_repo, drone)
+        except Exception:
+            self._release([parcel], [drone])
+            raise
+        self._drones_changed([drone])
+        _MISSIONS_ASSIGNED.inc(mode = "manual")
+        self._publish("parcel", [parcel])
+        self._publish("mission", [mission])
+        if status == MissionStatus.SCHEDULED:
+            self._scheduler.schedule(mission_id, scheduled_dt)
 
     def _generate_mission_id(self) -> int:
-        missions = self._missions_repo.get_data()
-        existing_ids = {mission.get_id() for mission in missions}
-        id = 1
-        while id in existing_ids:
-            id += 1
-        return id
+        return self._missions_repo.next_id()
+
+    def _generate_mission_ids(self, count : int) -> list:
+        return [self._missions_repo.next_id() for _ in range(count)]
     
+    @_ASSIGN_SECONDS.time()
     def assign_a_mission_automatically(self, parcel_id : int, start_time : str) -> int:
         parcel = self._parcels_repo.search_by_id(parcel_id)
         if not parcel:
             raise IDNotFound(parcel_id, "Parcel")
-        if parcel.get_status() == "DELIVERED":
+        if parcel.get_status() == ParcelStatus.DELIVERED:
             raise ParcelAlreadyDelivered(parcel.get_id())
-        if parcel.get_status() == "ASSIGNED":
+        if parcel.get_status() == ParcelStatus.ASSIGNED:
             raise ParcelAlreadyAssigned(parcel.get_id())
         scheduled_dt = datetime.strptime(start_time, "%Y-%m-%d %H:%M:%S")
         if scheduled_dt > datetime.now():
-            status = "SCHEDULED"
-            new_drone_status = "FLIGHT SCHEDULED"
+            status = MissionStatus.SCHEDULED
+            new_drone_status = DroneStatus.FLIGHT_SCHEDULED
         elif scheduled_dt == datetime.now():
-            status = "EN_ROUTE"
-            new_drone_status = "IN_FLIGHT"
+            status = MissionStatus.EN_ROUTE
+            new_drone_status = DroneStatus.IN_FLIGHT
         else:
             raise InvalidTime(start_time)
         best_drone = self._find_best_drone(parcel, scheduled_dt)
         if not best_drone:
             raise NoDroneAvailable(parcel_id)
-        mission_id = self._generate_mission_id()
-        parcel.set_status("ASSIGNED")
-        self._parcels_repo.update(parcel)
-        mission = Mission(mission_id, best_drone._id, parcel_id, start_time, status)
-        self._missions_repo.add_item(mission)
-        best_drone.set_status(new_drone_status)
-        self._drone_repo.update(best_drone)
+        try:
+            mission_id = self._generate_mission_id()
+            parcel.set_status(ParcelStatus.ASSIGNED)
+            mission = Mission(mission_id, best_drone._id, parcel_id, start_time, status)
+            best_drone.set_status(new_drone_status)
+            with UnitOfWork() as uow:
+                uow.update(self._parcels_repo, parcel)
+                uow.add(self._missions_repo, mission)
+                uow.update(self._drone_repo, best_drone)
+        except Exception:
+            self._release([parcel], [best_drone])
+            raise
+        self._drones_changed([best_drone])
+        _MISSIONS_ASSIGNED.inc(mode = "automatic")
+        self._publish("parcel", [parcel])
+        self._publish("mission", [mission])
+        if status == MissionStatus.SCHEDULED:
+            self._scheduler.schedule(mission_id, scheduled_dt)
         return best_drone.get_id()
 
+    def assign_many(self, parcel_ids : list, start_time : str) -> dict:
+        """
+        Assigns a batch of parcels at once with a min-cost matching between parcels and idle drones.
+        HIGH parcels are served first, then as many parcels as possible, then the tightest payload fit.
+        Returns {parcel_id: drone_id} for the parcels that got a drone.
+        """
+        parcels = []
+        for parcel_id in dict.fromkeys(parcel_ids):
+            parcel = self._parcels_repo.search_by_id(parcel_id)
+            if not parcel:
+                raise IDNotFound(parcel_id, "Parcel")
+            if parcel.get_status() == ParcelStatus.DELIVERED:
+                raise ParcelAlreadyDelivered(parcel.get_id())
+            if parcel.get_status() == ParcelStatus.ASSIGNED:
+                raise ParcelAlreadyAssigned(parcel.get_id())
+            parcels.append(parcel)
+        scheduled_dt = datetime.strptime(start_time, "%Y-%m-%d %H:%M:%S")
+        if scheduled_dt > datetime.now():
+            status = MissionStatus.SCHEDULED
+            new_drone_status = DroneStatus.FLIGHT_SCHEDULED
+        elif scheduled_dt == datetime.now():
+            status = MissionStatus.EN_ROUTE
+            new_drone_status = DroneStatus.IN_FLIGHT
+        else:
+            raise InvalidTime(start_time)
+
+        if self._availability is not None:
+            idle_drones = self._availability.idle_drones()
+        else:
+            idle_drones = self._drone_repo.find_by(status = DroneStatus.IDLE)
+        drones = [drone for drone in idle_drones if drone.get_status() == DroneStatus.IDLE]
+        if not parcels or not drones:
+            return {}
+
+        drainage = self._predict_drainage(scheduled_dt)
+        payloads = np.array([drone.get_max_payload() for drone in drones], dtype = float)
+        batteries = np.array([drone.get_battery_level() for drone in drones], dtype = float)
+        weights = np.array([parcel.get_weight() for parcel in parcels], dtype = float)[:, None]
+        distances = np.array([parcel.get_distance() for parcel in parcels], dtype = float)[:, None]
+        high = np.array([parcel.get_priority() == Priority.HIGH for parcel in parcels])[:, None]
+
+        required_battery = self._required_battery(distances, weights, payloads[None, :], drainage)
+        slack = payloads[None, :] - weights
+        feasible = (slack >= 0) & (batteries[None, :] >= required_battery)
+
+        # lexicographic cost folded into one number: a HIGH match outweighs any number of standard matches,
+        # any match outweighs the total slack of the batch. Infeasible pairs cost 0, the same as leaving a parcel unassigned
+        match_bonus = slack[feasible].sum() + 1 if feasible.any() else 1
+        high_bonus = match_bonus * (len(parcels) + 1)
+        cost = np.where(feasible, slack - match_bonus - high_bonus * high, 0.0)
+        rows, cols = min_cost_assignment(cost)
+        pairs = [(parcels[row], drones[col]) for row, col in zip(rows, cols) if feasible[row, col]]
+        if self._availability is not None:
+            # a drone taken by a concurrent assignment since the snapshot leaves its parcel unassigned
+            claimed = self._availability.claim_many([drone.get_id() for _, drone in pairs])
+            pairs = [(parcel, drone) for parcel, drone in pairs if drone.get_id() in claimed]
+
+        assignments = {}
+        assigned_parcels, missions, assigned_drones = [], [], []
+        try:
+            mission_ids = iter(self._generate_mission_ids(len(pairs)))
+            for parcel, drone in pairs:
+                parcel.set_status(ParcelStatus.ASSIGNED)
+                drone.set_status(new_drone_status)
+                missions.append(Mission(next(mission_ids), drone.get_id(), parcel.get_id(), start_time, status))
+                assigned_parcels.append(parcel)
+                assigned_drones.append(drone)
+                assignments[parcel.get_id()] = drone.get_id()
+
+            if missions:
+                with UnitOfWork() as uow:
+                    for parcel, mission, drone in zip(assigned_parcels, missions, assigned_drones):
+                        uow.update(self._parcels_repo, parcel)
+                        uow.add(self._missions_repo, mission)
+                        uow.update(self._drone_repo, drone)
+        except Exception:
+            self._release([parcel for parcel, _ in pairs], [drone for _, drone in pairs])
+            raise
+
+        if missions:
+            self._drones_changed(assigned_drones)
+            _MISSIONS_ASSIGNED.inc(len(missions), mode = "batch")
+            self._publish("parcel", assigned_parcels)
+            self._publish("mission", missions)
+            if status == MissionStatus.SCHEDULED:
+                for mission in missions:
+                    self._scheduler.schedule(mission.get_id(), scheduled_dt)
+        return assignments
+
     def modify_mission_status(self, mission_id : int, status : str):
         mission = self._missions_repo.search_by_id(mission_id)
         if not mission:
             raise IDNotFound(mission_id, "Mission")
         mission.set_status(status)
-        self._missions_repo.update(mission)
+        if status != MissionStatus.SCHEDULED:
+            self._scheduler.cancel(mission_id)
         drone = self._drone_repo.search_by_id(mission.get_drone_id())
         parcel = self._parcels_repo.search_by_id(mission.get_parcel_id())
-        if status == "FAILED":
-            drone_status = "MAINTENANCE"
-            parcel_status = "PENDING"
+        if status == MissionStatus.FAILED:
+            drone_status = DroneStatus.MAINTENANCE
+            parcel_status = ParcelStatus.PENDING
         else:
-            drone_status = "IDLE"
-            parcel_status = "DELIVERED"
+            drone_status = DroneStatus.IDLE
+            parcel_status = ParcelStatus.DELIVERED
         start_time = mission.get_start_time()
         scheduled_dt = datetime.strptime(start_time, "%Y-%m-%d %H:%M:%S")
-        battery_consumed = self._calculate_necessary_battery_level(parcel.get_distance(), scheduled_dt, parcel.get_weight())
+        battery_consumed = self._calculate_necessary_battery_level(parcel.get_distance(), scheduled_dt, parcel.get_weight(),
+                                                                   drone.get_max_payload())
         parcel.set_status(parcel_status)
         drone.update_battery(battery_consumed)
         drone.set_status(drone_status)
-        self._drone_repo.update(drone)
+        with UnitOfWork() as uow:
+            uow.update(self._missions_repo, mission)
+            uow.update(self._parcels_repo, parcel)
+            uow.update(self._drone_repo, drone)
+        self._drones_changed([drone])
+        self._publish("parcel", [parcel])
+        self._publish("mission", [mission])
+
+    def scheduled_missions(self) -> int:
+        return self._scheduler.pending()
 
     def get_missions(self) -> list:
         return self._missions_repo.get_data()
+
+    def iter_missions(self):
+        return self._missions_repo.iter_data()
+
+    def get_missions_page(self, offset : int = 0, limit : int = 50, order_by : str = "id", **criteria) -> list:
+        Mission.order_key(order_by)
+        return self._missions_repo.get_page(offset, limit, order_by, **criteria)
+
+    def missions_version(self) -> int:
+        return self._missions_repo.version()
+
+    def count_parcels_by_status(self) -> dict:
+        return self._parcels_repo.count_by_status()
+
+    def replicated_repositories(self) -> dict:
+        """The composite repositories behind the service by name, their replication is reported on /metrics"""
+        repos = {"parcels": self._parcels_repo, "missions": self._missions_repo}
+        return {name: repo for name, repo in repos.items() if hasattr(repo, "queue_depth")}
     
-    def _calculate_necessary_battery_level(self, parcel_distance : float, scheduled_dt, 
-                                           parcel_weight : float, drone_max_payload : float) -> int:
+    def _predict_drainage(self, scheduled_dt) -> float:
         weather = self._weather_service.get_current_weather(scheduled_dt)
-        drainage = self._ai.predict_drain_multiplier(weather['wind_speed'], weather['temperature'], weather['is_raining'])
+        return self._ai.predict_drain_multiplier(weather['wind_speed'], weather['temperature'], weather['is_raining'])
+
+    def _required_battery(self, parcel_distance : float, parcel_weight : float, drone_max_payload, drainage : float):
+        # drone_max_payload may be a NumPy array, the formula then yields the requirement of every drone at once
         distance_in_meters = parcel_distance * 1000
         load_factor = drone_max_payload / parcel_weight
         required_battery_to_comeback = distance_in_meters / 600
@@ -231,18 +507,32 @@ class LogisticService:
         required_battery = (required_battery_to_comeback + required_battery_to_deliver) * drainage + 5
         return required_battery
     
+    def _calculate_necessary_battery_level(self, parcel_distance : float, scheduled_dt, 
+                                           parcel_weight : float, drone_max_payload : float) -> int:
+        drainage = self._predict_drainage(scheduled_dt)
+        return self._required_battery(parcel_distance, parcel_weight, drone_max_payload, drainage)
+    
+    @_FIND_DRONE_SECONDS.time()
     def _find_best_drone(self, parcel : Parcel, scheduled_dt : str):
-        mini = float('inf')
-        best_drone = None
-        drones = self._drone_repo.get_data()
-        for drone in drones:
-            required_battery = self._calculate_necessary_battery_level(parcel.get_distance(), scheduled_dt, parcel.get_weight(),
-                                                                       drone.get_max_payload())
-            if drone.get_max_payload() >= parcel.get_weight() and drone.get_max_payload() - parcel.get_weight() < mini \
-            and drone.get_status() == "IDLE" and drone.get_battery_level() >= required_battery:
-                mini = drone.get_max_payload() - parcel.get_weight()
-                best_drone = drone
-        return best_drone
-        
-
-
+        if self._availability is not None:
+            drainage = self._predict_drainage(scheduled_dt)
+            required_battery = lambda payload: self._required_battery(parcel.get_distance(), parcel.get_weight(), payload, drainage)
+            # claimed drones leave the index right away, so concurrent assignments never pick the same one
+            return self._availability.best_fit(parcel.get_weight(), required_battery, claim = True)
+        drones = self._drone_repo.find_range("max_payload", low = parcel.get_weight(), status = DroneStatus.IDLE)
+        if not drones:
+            return None
+        # weather and parcel are the same for every candidate, so the drain is predicted once
+        # and the greedy best fit is evaluated over the whole fleet in one vectorized pass
+        drainage = self._predict_drainage(scheduled_dt)
+        count = len(drones)
+        payloads = np.fromiter((drone.get_max_payload() for drone in drones), dtype = float, count = count)
+        batteries = np.fromiter((drone.get_battery_level() for drone in drones), dtype = float, count = count)
+        idle = np.fromiter((drone.get_status() == DroneStatus.IDLE for drone in drones), dtype = bool, count = count)
+        required_battery = self._required_battery(parcel.get_distance(), parcel.get_weight(), payloads, drainage)
+        slack = payloads - parcel.get_weight()
+        feasible = idle & (slack >= 0) & (batteries >= required_battery)
+        if not feasible.any():
+            return None
+        # argmin returns the first minimum, the same drone the greedy loop kept with its strict comparison
+        return drones[int(np.argmin(np.where(feasible, slack, np.inf)))]
@@ -0,0 +1,179 @@
+import bisect
+import threading
+import time
+from contextlib import ContextDecorator
+
+# A small in-process metrics registry rendered in the Prometheus text exposition format.
+# Recording is a lock and a couple of additions, gauges that need the repositories take a callback
+# that only runs when /metrics is scraped
+
+_DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _format_value(value) -> str:
+    if value == float('inf'):
+        return "+Inf"
+    return repr(value) if isinstance(value, float) else str(value)
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + "}"
+
+def _label_key(labels : dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+class _Metric:
+    _TYPE = None
+
+    def __init__(self, name : str, help : str):
+        self.name = name
+        self.help = help
+        self._lock = threading.Lock()
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self._TYPE}"]
+        lines.extend(self._samples())
+        return lines
+
+class Counter(_Metric):
+    _TYPE = "counter"
+
+    def __init__(self, name : str, help : str):
+        super().__init__(name, help)
+        self._values = {}
+
+    def inc(self, amount = 1, **labels):
+        if amount < 0:
+            raise ValueError("Counters can only go up")
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(_label_key(labels), 0)
+
+    def _samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        return [f"{self.name}{_format_labels(key)} {_format_value(value)}" for key, value in values]
+
+class Gauge(_Metric):
+    _TYPE = "gauge"
+
+    def __init__(self, name : str, help : str, callback = None):
+        """callback() is called on every scrape and returns a number or a {label tuple: number} dict"""
+        super().__init__(name, help)
+        self._values = {}
+        self.callback = callback
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def _samples(self):
+        with self._lock:
+            values = dict(self._values)
+        if self.callback is not None:
+            try:
+                result = self.callback()
+            except Exception as e:
+                print(f"WARNING: Gauge {self.name} failed {e}")
+                result = {}
+            values.update(result if isinstance(result, dict) else {(): result})
+        return [f"{self.name}{_format_labels(key)} {_format_value(value)}" for key, value in values.items()]
+
+class _Timer(ContextDecorator):
+    def __init__(self, histogram, labels):
+        self._histogram = histogram
+        self._labels = labels
+
+    def _recreate_cm(self):
+        # a fresh timer per decorated call, so concurrent calls don't share a start time
+        return _Timer(self._histogram, self._labels)
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self._histogram.observe(time.perf_counter() - self._started, **self._labels)
+        return False
+
+class Histogram(_Metric):
+    _TYPE = "histogram"
+
+    def __init__(self, name : str, help : str, buckets = _DEFAULT_BUCKETS):
+        super().__init__(name, help)
+        self._buckets = tuple(sorted(buckets))
+        self._series = {}
+
+    def observe(self, value : float, **labels):
+        position = bisect.bisect_left(self._buckets, value)
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self._buckets) + 1), 0.0, 0]
+            series[0][position] += 1
+            series[1] += value
+            series[2] += 1
+
+    def time(self, **labels):
+        """Times a with block, or every call when used as a decorator"""
+        return _Timer(self, labels)
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            series = self._series.get(_label_key(labels))
+            return 0 if series is None else series[2]
+
+    def _samples(self):
+        with self._lock:
+            series = [(key, list(counts), total, count) for key, (counts, total, count) in self._series.items()]
+        lines = []
+        for key, counts, total, count in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self._buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(key + (('le', _format_value(bound)),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _get_or_create(self, cls, name, help, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as a {metric._TYPE}")
+            return metric
+
+    def counter(self, name : str, help : str) -> Counter:
+        return self._get_or_create(Counter, name, help)
+
+    def gauge(self, name : str, help : str, callback = None) -> Gauge:
+        gauge = self._get_or_create(Gauge, name, help)
+        if callback is not None:
+            gauge.callback = callback
+        return gauge
+
+    def histogram(self, name : str, help : str, buckets = _DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help, buckets)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = MetricsRegistry()
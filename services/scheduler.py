@@ -0,0 +1,77 @@
+import heapq
+import itertools
+import threading
+from datetime import datetime
+
+class MissionScheduler:
+    # pending missions sit in a min-heap keyed by start time, the worker sleeps on a condition variable until
+    # the earliest deadline and is woken early whenever a mission is scheduled or cancelled.
+    # Cancelled or rescheduled entries stay in the heap and are skipped when they reach the top
+    def __init__(self, launch):
+        self._launch = launch
+        self._condition = threading.Condition()
+        self._heap = []
+        self._entries = {}
+        self._counter = itertools.count()
+        self._running = False
+
+    def schedule(self, mission_id : int, start_time):
+        if isinstance(start_time, str):
+            start_time = datetime.strptime(start_time, "%Y-%m-%d %H:%M:%S")
+        with self._condition:
+            entry = (start_time, next(self._counter), mission_id)
+            self._entries[mission_id] = entry
+            heapq.heappush(self._heap, entry)
+            if self._heap[0] is entry:
+                self._condition.notify()
+
+    def cancel(self, mission_id : int):
+        with self._condition:
+            if self._entries.pop(mission_id, None) is not None:
+                self._condition.notify()
+
+    def pending(self) -> int:
+        with self._condition:
+            return len(self._entries)
+
+    def start(self):
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+        thread = threading.Thread(target = self._run, daemon = True)
+        thread.start()
+
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+
+    def _next_due(self):
+        with self._condition:
+            while self._running:
+                if not self._heap:
+                    self._condition.wait()
+                    continue
+                start_time, _, mission_id = entry = self._heap[0]
+                if self._entries.get(mission_id) is not entry:
+                    heapq.heappop(self._heap)
+                    continue
+                delay = (start_time - datetime.now()).total_seconds()
+                if delay > 0:
+                    self._condition.wait(delay)
+                    continue
+                heapq.heappop(self._heap)
+                del self._entries[mission_id]
+                return mission_id
+            return None
+
+    def _run(self):
+        while True:
+            mission_id = self._next_due()
+            if mission_id is None:
+                return
+            try:
+                self._launch(mission_id)
+            except Exception as e:
+                print(f"SCHEDULER ERROR {e}")
@@ -1,50 +1,121 @@
+import bisect
 import requests
+import threading
+import time
 from datetime import datetime
+from services.metrics import REGISTRY
+
+_WEATHER_SECONDS = REGISTRY.histogram("aerologistics_weather_lookup_seconds", "Time spent looking up the forecast for a mission")
+_WEATHER_REFRESHES = REGISTRY.counter("aerologistics_weather_refreshes_total", "Forecast downloads, by result")
 
 class WeatherService:
-    def __init__(self, api_key, city):
+    def __init__(self, api_key, city, ttl = 600, max_stale = 3600, refresh_interval = None, retry_after = 60):
         self._api_key = api_key
         self._city = city
         self._url = f"http://api.openweathermap.org/data/2.5/forecast?q={city}&appid={api_key}&units=metric"
+        # the forecast is kept for ttl seconds, after that it is still served for up to max_stale seconds
+        # while a background refresh fetches the new one, so lookups only wait on the network when nothing recent exists
+        self._ttl = ttl
+        self._max_stale = max_stale
+        # after a failed download no lookup tries again for retry_after seconds, they get the default weather instead
+        self._retry_after = retry_after
+        self._failed_at = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._timestamps = []
+        self._entries = []
+        self._fetched_at = None
+        if refresh_interval:
+            refresher = threading.Thread(target = self._refresh_periodically, args = (refresh_interval,), daemon = True)
+            refresher.start()
 
+    @_WEATHER_SECONDS.time()
     def get_current_weather(self, time : datetime) -> dict:
+        timestamps, entries = self._forecast()
+        if not timestamps:
+            return self._default_weather()
+
+        target_timestamp = time.timestamp()
+        position = bisect.bisect_left(timestamps, target_timestamp)
+        best = min((i for i in (position - 1, position) if 0 <= i < len(timestamps)),
+                   key = lambda i: abs(target_timestamp - timestamps[i]))
+
+        if abs(target_timestamp - timestamps[best]) > 432000:
+            return self._default_weather()
+        return dict(entries[best])
+
+    def _forecast(self):
+        with self._lock:
+            now = time.monotonic()
+            age = None if self._fetched_at is None else now - self._fetched_at
+            backing_off = self._failed_at is not None and now - self._failed_at < self._retry_after
+            timestamps, entries = self._timestamps, self._entries
+            if age is not None and age <= self._ttl:
+                return timestamps, entries
+            if age is not None and age <= self._max_stale:
+                if not self._refreshing and not backing_off:
+                    self._refreshing = True
+                    threading.Thread(target = self._background_refresh, daemon = True).start()
+                return timestamps, entries
+            if backing_off:
+                return [], []
+        self.refresh()
+        with self._lock:
+            return self._timestamps, self._entries
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def _refresh_periodically(self, interval):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"WARNING: Weather refresh failed {e}")
+            time.sleep(interval)
+
+    def refresh(self) -> bool:
+        """Downloads the forecast and swaps it into the cache, a failed download or malformed payload keeps the old one"""
         try:
             response = requests.get(self._url, timeout= 5)
             response.raise_for_status()
 
             data = response.json()
-
-            target_timestamp = time.timestamp()
-
-            best_match_weather = None
-            min_time = float('inf')
-            for entry in data['list']:
-                entry_time = entry['dt']
-                if abs(target_timestamp - entry_time) < min_time:
-                    min_time = abs(target_timestamp - entry_time)
-                    best_match_weather = entry
-            
-            if min_time > 432000:
-                return self._default_weather()
-            
-            temp = best_match_weather['main']['temp']
-            wind_kmh = best_match_weather['wind']['speed'] * 3.6
-            condition = best_match_weather['weather'][0]['main'].lower()
-
-            is_raining = 1 if condition in ['rain', 'drizzle', 'thunderstorm', 'snow'] else 0
-            return {
-                "wind_speed" : wind_kmh,
-                "temperature" : temp,
-                "is_raining" : is_raining
-            }
-        except requests.exceptions.RequestException as e:
+            forecast = sorted(((entry['dt'], self._parse_entry(entry)) for entry in data['list']), key = lambda pair: pair[0])
+        except (requests.exceptions.RequestException, KeyError, IndexError, TypeError, ValueError) as e:
             print(f"API ERROR {e}")
-            return self._default_weather()
-        
+            with self._lock:
+                self._failed_at = time.monotonic()
+            _WEATHER_REFRESHES.inc(result = "failed")
+            return False
+
+        with self._lock:
+            self._timestamps = [timestamp for timestamp, _ in forecast]
+            self._entries = [entry for _, entry in forecast]
+            self._fetched_at = time.monotonic()
+            self._failed_at = None
+        _WEATHER_REFRESHES.inc(result = "ok")
+        return True
+
+    def _parse_entry(self, entry) -> dict:
+        temp = entry['main']['temp']
+        wind_kmh = entry['wind']['speed'] * 3.6
+        condition = entry['weather'][0]['main'].lower()
+
+        is_raining = 1 if condition in ['rain', 'drizzle', 'thunderstorm', 'snow'] else 0
+        return {
+            "wind_speed" : wind_kmh,
+            "temperature" : temp,
+            "is_raining" : is_raining
+        }
+
     def _default_weather(self) -> dict:
         return {
                 "wind_speed" : 1,
                 "temperature" : 20,
                 "is_raining" : 0
             }
-
@@ -0,0 +1,80 @@
+import configparser
+from repositories import repository
+from repositories.composite_repository import CompositeRepository
+from repositories.mmap_repository import DroneMemoryMappedRepository, ParcelMemoryMappedRepository
+
+def load_settings(path = 'settings.properties'):
+    """Reads the key = value properties file into a configparser section, raises FileNotFoundError if it is missing"""
+    config = configparser.ConfigParser()
+    with open(path, 'r') as f:
+        config_string = '[settings]\n' + f.read()
+    config.read_string(config_string)
+    return config['settings']
+
+def build_repositories(settings):
+    """Returns the (drones, parcels, missions) repositories for the configured backend, ValueError for an unknown one"""
+    repo_type = settings['repository'].strip('"')
+    text_journal = settings.get('text_journal', 'false').strip('"').lower() == 'true'
+    async_replication = settings.get('async_replication', 'false').strip('"').lower() == 'true'
+
+    if repo_type == 'text':
+        d_file = settings['drones_txt_path'].strip('"')
+        p_file = settings['parcels_txt_path'].strip('"')
+        m_file = settings['missions_txt_path'].strip('"')
+        d_repo = repository.DroneTextFileRepository(d_file, journal = text_journal)
+        p_repo = repository.ParcelTextFileRepository(p_file, journal = text_journal)
+        m_repo = repository.MissionTextFileRepository(m_file, journal = text_journal)
+    elif repo_type == 'binary':
+        d_file = settings['drones_binary_path'].strip('"')
+        p_file = settings['parcels_binary_path'].strip('"')
+        m_file = settings['missions_binary_path'].strip('"')
+        d_repo = repository.BinaryFileRepository(d_file)
+        p_repo = repository.BinaryFileRepository(p_file)
+        m_repo = repository.BinaryFileRepository(m_file)
+    elif repo_type == 'mmap':
+        d_file = settings['drones_mmap_path'].strip('"')
+        p_file = settings['parcels_mmap_path'].strip('"')
+        m_file = settings['missions_binary_path'].strip('"')
+        d_repo = DroneMemoryMappedRepository(d_file)
+        p_repo = ParcelMemoryMappedRepository(p_file)
+        m_repo = repository.BinaryFileRepository(m_file)
+    elif repo_type == "db":
+        db_file = settings['database_path'].strip('"')
+        db_string = f"sqlite:///{db_file}"
+        d_repo = repository.DroneSQLRepository(db_string)
+        p_repo = repository.ParcelSQLRepository(db_string)
+        m_repo = repository.MissionSQLRepository(db_string)
+    elif repo_type == "master":
+        db_file = settings['database_path'].strip('"')
+        db_string = f"sqlite:///{db_file}"
+        drone_sql = repository.DroneSQLRepository(db_string)
+        parcel_sql = repository.ParcelSQLRepository(db_string)
+        mission_sql = repository.MissionSQLRepository(db_string)
+        d_file = settings['drones_binary_path'].strip('"')
+        p_file = settings['parcels_binary_path'].strip('"')
+        m_file = settings['missions_binary_path'].strip('"')
+        drone_binary = repository.BinaryFileRepository(d_file)
+        parcel_binary = repository.BinaryFileRepository(p_file)
+        mission_binary = repository.BinaryFileRepository(m_file)
+        d_file = settings['drones_txt_path'].strip('"')
+        p_file = settings['parcels_txt_path'].strip('"')
+        m_file = settings['missions_txt_path'].strip('"')
+        drone_text = repository.DroneTextFileRepository(d_file, journal = text_journal)
+        parcel_text = repository.ParcelTextFileRepository(p_file, journal = text_journal)
+        mission_text = repository.MissionTextFileRepository(m_file, journal = text_journal)
+        d_repo = CompositeRepository(drone_sql, [drone_binary, drone_text], async_replication = async_replication)
+        p_repo = CompositeRepository(parcel_sql, [parcel_binary, parcel_text], async_replication = async_replication)
+        m_repo = CompositeRepository(mission_sql, [mission_binary, mission_text], async_replication = async_replication)
+    else:
+        raise ValueError(f"Invalid repository type {repo_type}")
+    return d_repo, p_repo, m_repo
+
+def flush_repositories(*repos):
+    """Waits for queued writes (async replication, mmap pages) to reach disk, meant to run at exit"""
+    for repo in repos:
+        flush = getattr(repo, "flush", None)
+        if callable(flush):
+            try:
+                flush()
+            except Exception as e:
+                print(f"WARNING: Flushing {type(repo).__name__} failed {e}")
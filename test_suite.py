@@ -1,11 +1,42 @@
 import unittest
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 from datetime import datetime, timedelta
+import os
+import asyncio
+import itertools
+import json
+import requests
+import random
+import tempfile
+import pickle
+import sqlite3
+import threading
+import time
+import numpy as np
 
 from services.logistics_service import LogisticService
 from services.fleetservice import DroneService
+from services.weather_service import WeatherService
+from services.assignment import min_cost_assignment
+from services.scheduler import MissionScheduler
+from services.availability import FleetAvailabilityIndex
+from services.events import EventBus
+from services.metrics import REGISTRY, MetricsRegistry
+from services.ingest import ingest_lines
+from AI.BatteryPredictionAI import BatteryPredictionAi
 from models.drone import Drone
 from models.parcel import Parcel
+from models.mission import Mission
+from models.status import DroneStatus, MissionStatus, ParcelStatus, Priority
+from repositories.composite_repository import CompositeRepository
+from repositories.unit_of_work import UnitOfWork
+from repositories.mmap_repository import DroneMemoryMappedRepository, ParcelMemoryMappedRepository
+from repositories.repository import Repository, BinaryFileRepository, DroneTextFileRepository, ParcelTextFileRepository
+from repositories.repository import DroneSQLRepository, ParcelSQLRepository, MissionSQLRepository
+from sqlalchemy import event, text
+import api_server
+from fastapi.testclient import TestClient
+import httpx
 from exceptions import NoDroneAvailable, ParcelAlreadyAssigned , ParcelAlreadyDelivered, WeightExceeded, DroneUnavailable, InvalidTime
 
 class TestDroneSystem(unittest.TestCase):
@@ -51,7 +82,7 @@ class TestDroneSystem(unittest.TestCase):
         start_time = (datetime.now() + timedelta(hours=1)).strftime("%Y-%m-%d %H:%M:%S")
         
         self.mock_parcel_repo.search_by_id.return_value = self.standard_parcel
-        self.mock_drone_repo.get_data.return_value = [self.good_drone]
+        self.mock_drone_repo.find_range.return_value = [self.good_drone]
         
         self.mock_weather_service.get_current_weather.return_value = {
             "wind_speed": 5, "temperature": 20, "is_raining": 0
@@ -78,7 +109,7 @@ class TestDroneSystem(unittest.TestCase):
 
         start_time = "2026-01-05 12:00:00"
         self.mock_parcel_repo.search_by_id.return_value = london_parcel
-        self.mock_drone_repo.get_data.return_value = [weak_drone]
+        self.mock_drone_repo.find_range.return_value = [weak_drone]
         
         self.mock_weather_service.get_current_weather.return_value = {
             "wind_speed": 0, "temperature": 20, "is_raining": 0
@@ -120,6 +151,123 @@ class TestDroneSystem(unittest.TestCase):
         self.assertTrue(cost_stormy > cost_sunny, "Storm cost should be higher")
         print("AI Penalty Logic verified.")
 
+    def test_vectorized_best_drone_matches_greedy(self):
+        """
+        Compares the vectorized best-fit selection against the original per-drone greedy loop.
+        """
+        print("Test: Vectorized Best Drone Selection")
+        self.mock_weather_service.get_current_weather.return_value = {"wind_speed": 10, "temperature": 12, "is_raining": 1}
+        self.mock_ai.predict_drain_multiplier.return_value = 1.3
+        dt = datetime.now() + timedelta(hours=1)
+        rng = random.Random(7)
+        statuses = ["IDLE", "IDLE", "IDLE", "MAINTENANCE", "IN_FLIGHT"]
+        drones = [Drone(i, f"SN-{i}", "Swift-X1", round(rng.uniform(0.5, 10.0), 1), rng.choice(statuses), rng.randint(0, 100))
+                  for i in range(1, 10001)]
+
+        for _ in range(20):
+            parcel = Parcel(1, "User", "Addr", round(rng.uniform(0.5, 10.0), 2), "STANDARD", "PENDING", rng.randint(1, 30))
+            candidates = [d for d in drones if d.get_status() == "IDLE" and d.get_max_payload() >= parcel.get_weight()]
+            self.mock_drone_repo.find_range.return_value = candidates
+
+            expected, mini = None, float('inf')
+            for drone in candidates:
+                required = self.logistic_service._calculate_necessary_battery_level(
+                    parcel.get_distance(), dt, parcel.get_weight(), drone.get_max_payload())
+                if drone.get_max_payload() - parcel.get_weight() < mini and drone.get_battery_level() >= required:
+                    mini = drone.get_max_payload() - parcel.get_weight()
+                    expected = drone
+
+            self.mock_ai.predict_drain_multiplier.reset_mock()
+            self.assertIs(self.logistic_service._find_best_drone(parcel, dt), expected)
+            self.assertLessEqual(self.mock_ai.predict_drain_multiplier.call_count, 1, "Drain should be predicted once")
+        print("Vectorized selection matches the greedy choice.")
+
+    def test_assign_many_beats_greedy_order(self):
+        """
+        Two parcels where greedy best-fit in list order strands the second one, the batch matching assigns both.
+        """
+        print("Test: Batch Assignment Optimal Matching")
+        self.mock_weather_service.get_current_weather.return_value = {"wind_speed": 0, "temperature": 20, "is_raining": 0}
+        self.mock_ai.predict_drain_multiplier.return_value = 1.0
+        start_time = (datetime.now() + timedelta(hours=1)).strftime("%Y-%m-%d %H:%M:%S")
+        small_parcel = Parcel(1, "A", "Addr", 4.0, "STANDARD", "PENDING", 10)
+        heavy_parcel = Parcel(2, "B", "Addr", 8.0, "STANDARD", "PENDING", 15)
+        tight_drone = Drone(1, "SN-1", "Swift-X1", 9.0, "IDLE", 100)
+        low_battery_drone = Drone(2, "SN-2", "Swift-X1", 12.0, "IDLE", 90)
+        self.mock_parcel_repo.search_by_id.side_effect = {1: small_parcel, 2: heavy_parcel}.get
+        self.mock_drone_repo.find_by.return_value = [tight_drone, low_battery_drone]
+        self.mock_mission_repo.next_id.side_effect = itertools.count(1).__next__
+
+        assignments = self.logistic_service.assign_many([1, 2], start_time)
+
+        self.assertEqual(assignments, {1: 2, 2: 1})
+        self.assertEqual(heavy_parcel.get_status(), ParcelStatus.ASSIGNED)
+        self.assertEqual(tight_drone.get_status(), DroneStatus.FLIGHT_SCHEDULED)
+        missions = self.mock_mission_repo.add_items.call_args[0][0]
+        self.assertEqual(sorted(m.get_id() for m in missions), [1, 2])
+        self.mock_parcel_repo.update_many.assert_called_once()
+        self.mock_drone_repo.update_many.assert_called_once()
+        print("Both parcels assigned in one batch.")
+
+    def test_assign_many_prefers_high_priority(self):
+        """
+        With one drone for two parcels the HIGH priority parcel gets it, whatever the order.
+        """
+        print("Test: Batch Assignment HIGH Priority")
+        self.mock_weather_service.get_current_weather.return_value = {"wind_speed": 0, "temperature": 20, "is_raining": 0}
+        self.mock_ai.predict_drain_multiplier.return_value = 1.0
+        start_time = (datetime.now() + timedelta(hours=1)).strftime("%Y-%m-%d %H:%M:%S")
+        standard = Parcel(1, "A", "Addr", 5.0, "STANDARD", "PENDING", 5)
+        urgent = Parcel(2, "B", "Addr", 2.0, "HIGH", "PENDING", 5)
+        self.mock_parcel_repo.search_by_id.side_effect = {1: standard, 2: urgent}.get
+        self.mock_drone_repo.find_by.return_value = [Drone(1, "SN-1", "Swift-X1", 5.0, "IDLE", 100)]
+
+        self.assertEqual(self.logistic_service.assign_many([1, 2], start_time), {2: 1})
+        self.assertEqual(standard.get_status(), ParcelStatus.PENDING)
+        print("HIGH parcel served first.")
+
+    def test_min_cost_assignment_matches_brute_force(self):
+        """
+        The Hungarian solver against every possible matching on small rectangular matrices.
+        """
+        print("Test: Min Cost Assignment Solver")
+        rng = np.random.default_rng(0)
+        for _ in range(200):
+            n, m = (int(x) for x in rng.integers(1, 6, 2))
+            cost = rng.integers(0, 20, (n, m)).astype(float)
+            rows, cols = min_cost_assignment(cost)
+            self.assertEqual(len(rows), min(n, m))
+            self.assertEqual(len(set(cols.tolist())), len(cols))
+            if n <= m:
+                best = min(sum(cost[i, perm[i]] for i in range(n)) for perm in itertools.permutations(range(m), n))
+            else:
+                best = min(sum(cost[perm[j], j] for j in range(m)) for perm in itertools.permutations(range(n), m))
+            self.assertAlmostEqual(cost[rows, cols].sum(), best)
+        print("Solver optimal on all samples.")
+
+    def test_modify_mission_status_persists_parcel_and_drone(self):
+        """
+        Completing a mission stores the delivered parcel and the drone's drained battery together.
+        """
+        print("Test: Modify Mission Status")
+        self.mock_weather_service.get_current_weather.return_value = {"wind_speed": 0, "temperature": 20, "is_raining": 0}
+        self.mock_ai.predict_drain_multiplier.return_value = 1.0
+        mission = Mission(3, 1, 10, "2030-01-01 10:00:00", "EN ROUTE")
+        drone = Drone(1, "SN-1", "Swift-X1", 4.0, "IN_FLIGHT", 100)
+        self.mock_mission_repo.search_by_id.return_value = mission
+        self.mock_drone_repo.search_by_id.return_value = drone
+        self.mock_parcel_repo.search_by_id.return_value = self.standard_parcel
+
+        self.logistic_service.modify_mission_status(3, "DELIVERED")
+
+        self.assertEqual(self.standard_parcel.get_status(), ParcelStatus.DELIVERED)
+        self.mock_parcel_repo.update.assert_called_once_with(self.standard_parcel)
+        self.mock_mission_repo.update.assert_called_once_with(mission)
+        self.mock_drone_repo.update.assert_called_once_with(drone)
+        self.assertEqual(drone.get_status(), DroneStatus.IDLE)
+        self.assertLess(drone._battery_level, 100)
+        print("Parcel and drone updated together.")
+
     def test_add_drone_valid(self):
         print("Test: Add Valid Drone")
         self.mock_drone_repo.search_by_id.return_value = None
@@ -129,6 +277,17 @@ class TestDroneSystem(unittest.TestCase):
         self.mock_drone_repo.add_item.assert_called_once()
         print("Drone added.")
 
+    def test_generated_fleet_added_in_one_batch(self):
+        print("Test: Generated Fleet Uses Bulk Insert")
+        repo = MagicMock()
+        repo.get_data.return_value = []
+        DroneService(repo)
+
+        repo.add_items.assert_called_once()
+        repo.add_item.assert_not_called()
+        self.assertEqual(len(repo.add_items.call_args[0][0]), 20)
+        print("Fleet generated with a single bulk insert.")
+
     def test_add_drone_invalid_battery(self):
         print("Test: Add Drone Invalid Battery")
         self.mock_drone_repo.search_by_id.return_value = None
@@ -261,7 +420,7 @@ class TestDroneSystem(unittest.TestCase):
         
         parcel = Parcel(50, "User", "Addr", 2.0, "STD", "PENDING", 5.0)
         self.mock_parcel_repo.search_by_id.return_value = parcel
-        self.mock_drone_repo.get_data.return_value = []
+        self.mock_drone_repo.find_range.return_value = []
         
         start_time = (datetime.now() + timedelta(hours=1)).strftime("%Y-%m-%d %H:%M:%S")
 
@@ -286,5 +445,1149 @@ class TestDroneSystem(unittest.TestCase):
              
         print("Correctly rejected past time.")
 
+class _GatedRepository(Repository):
+    """In-memory repository whose bulk writes block until the gate is opened"""
+    def __init__(self):
+        super().__init__()
+        self.gate = threading.Event()
+        self.calls = 0
+        self.removed = []
+
+    def add_items(self, items):
+        self.gate.wait()
+        self.calls += 1
+        super().add_items(items)
+
+    def update_many(self, new_items):
+        self.gate.wait()
+        self.calls += 1
+        super().update_many(new_items)
+
+    def remove_many(self, item_ids):
+        self.gate.wait()
+        self.calls += 1
+        self.removed.extend(item_ids)
+        super().remove_many(item_ids)
+
+class TestRepositories(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _path(self, name):
+        return os.path.join(self.tmp_dir.name, name)
+
+    def test_memory_repository_crud(self):
+        """
+        Verifies the id-indexed in-memory repository keeps insertion order and updates/removes by id.
+        """
+        print("Test: In-Memory Repository CRUD")
+        repo = Repository()
+        for i in range(1, 6):
+            repo.add_item(Drone(i, f"SN-{i}", "Swift-X1", 5.0, "IDLE", 100))
+
+        repo.update(Drone(3, "SN-3", "HeavyLift-V2", 9.0, "MAINTENANCE", 40))
+        repo.update(Drone(42, "SN-42", "Ghost", 1.0, "IDLE", 10))
+        repo.remove_item(2)
+        repo.remove_item(99)
+
+        self.assertEqual([d.get_id() for d in repo.get_data()], [1, 3, 4, 5])
+        self.assertEqual(repo.search_by_id(3).get_model_type(), "HeavyLift-V2")
+        self.assertIsNone(repo.search_by_id(2))
+        self.assertIsNone(repo.search_by_id(42))
+        self.assertEqual(len(repo), 4)
+        print("Repository CRUD verified.")
+
+    def test_file_repositories_reload(self):
+        """
+        Verifies that the text and binary repositories persist through the indexed base class.
+        """
+        print("Test: File Repositories Reload")
+        text_repo = DroneTextFileRepository(self._path("drones.txt"))
+        binary_repo = BinaryFileRepository(self._path("drones.bin"))
+        for repo in (text_repo, binary_repo):
+            repo.add_item(Drone(1, "SN-1", "Swift-X1", 5.0, "IDLE", 100))
+            repo.add_item(Drone(2, "SN-2", "Swift-X1", 6.0, "IDLE", 90))
+            repo.remove_item(1)
+
+        reloaded_text = DroneTextFileRepository(self._path("drones.txt"))
+        reloaded_binary = BinaryFileRepository(self._path("drones.bin"))
+        for repo in (reloaded_text, reloaded_binary):
+            self.assertIsNone(repo.search_by_id(1))
+            self.assertEqual(repo.search_by_id(2).get_max_payload(), 6.0)
+        print("File repositories reloaded correctly.")
+
+    def test_text_repository_journal_replay(self):
+        """
+        Verifies that journal mode appends mutations and replays them over the snapshot on load.
+        """
+        print("Test: Text Repository Journal Replay")
+        path = self._path("drones.txt")
+        repo = DroneTextFileRepository(path, journal=True, compact_threshold=1000)
+        for i in range(1, 4):
+            repo.add_item(Drone(i, f"SN-{i}", "Swift-X1", 5.0, "IDLE", 50))
+        repo.update(Drone(2, "SN-2", "Swift-X1", 5.0, "IDLE", 80))
+        repo.remove_item(3)
+
+        self.assertFalse(os.path.exists(path), "Journal mode should not rewrite the snapshot")
+        with open(path + ".journal") as f:
+            self.assertEqual(len(f.readlines()), 5)
+
+        reloaded = DroneTextFileRepository(path, journal=True)
+        self.assertEqual([d.get_id() for d in reloaded.get_data()], [1, 2])
+        self.assertEqual(int(reloaded.search_by_id(2).get_battery_level()), 80)
+
+        reloaded.compact()
+        self.assertFalse(os.path.exists(path + ".journal"))
+        self.assertEqual(len(DroneTextFileRepository(path)), 2)
+        print("Journal replayed and compacted correctly.")
+
+    def test_binary_repository_incremental_updates(self):
+        """
+        Verifies that a single update rewrites its record in place and that records load lazily.
+        """
+        print("Test: Binary Repository Incremental Updates")
+        path = self._path("drones.bin")
+        repo = BinaryFileRepository(path)
+        for i in range(1, 51):
+            repo.add_item(Drone(i, f"SN-{i}", "Swift-X1", 5.0, "IDLE", 50))
+        size_before = os.path.getsize(path)
+
+        drone = repo.search_by_id(7)
+        drone.charge_battery(3)
+        repo.update(drone)
+        self.assertEqual(os.path.getsize(path), size_before, "Battery update should be written in place")
+
+        repo.update(Drone(8, "SN-8" * 40, "Swift-X1", 5.0, "IDLE", 50))
+        repo.remove_item(9)
+
+        reloaded = BinaryFileRepository(path)
+        self.assertEqual(len(reloaded._data), 0, "Records should be read lazily")
+        self.assertEqual(reloaded.search_by_id(7).get_battery_level(), 53)
+        self.assertEqual(reloaded.search_by_id(8).get_serial_number(), "SN-8" * 40)
+        self.assertIsNone(reloaded.search_by_id(9))
+        self.assertEqual(len(reloaded.get_data()), 49)
+
+        reloaded.compact()
+        self.assertEqual(reloaded._dead_bytes, 0)
+        self.assertEqual(reloaded.search_by_id(8).get_serial_number(), "SN-8" * 40)
+
+        complete_size = os.path.getsize(path)
+        with open(path, "ab") as f:
+            f.write(BinaryFileRepository._RECORD_HEADER.pack(1, 60, 64, 40) + bytes(10))
+        recovered = BinaryFileRepository(path)
+        self.assertEqual(len(recovered), 49, "A record cut short by a crash should be dropped")
+        self.assertEqual(os.path.getsize(path), complete_size)
+        print("Binary records updated incrementally.")
+
+    def test_binary_repository_migrates_pickled_list(self):
+        print("Test: Binary Repository Legacy Migration")
+        path = self._path("parcels.bin")
+        with open(path, "wb") as f:
+            pickle.dump([Parcel(1, "Ann", "Street", 1.0, "HIGH", "PENDING", 10)], f)
+
+        repo = BinaryFileRepository(path)
+        self.assertEqual(repo.search_by_id(1).get_recipient_name(), "Ann")
+        self.assertEqual(BinaryFileRepository(path).search_by_id(1).get_recipient_name(), "Ann")
+        print("Legacy pickle migrated.")
+
+    def test_sql_repositories_share_engine(self):
+        """
+        Verifies that repositories on the same database share one WAL-configured engine.
+        """
+        print("Test: SQL Repositories Shared Engine")
+        db_string = f"sqlite:///{self._path('logistics.db')}"
+        drone_repo = DroneSQLRepository(db_string)
+        parcel_repo = ParcelSQLRepository(db_string)
+        mission_repo = MissionSQLRepository(db_string)
+        self.assertIs(drone_repo.engine, parcel_repo.engine)
+        self.assertIs(parcel_repo.session, mission_repo.session)
+
+        with drone_repo.engine.connect() as connection:
+            self.assertEqual(connection.execute(text("PRAGMA journal_mode")).scalar(), "wal")
+
+        drone_repo.add_item(Drone(1, "SN-1", "Swift-X1", 5.0, "IDLE", 50))
+        drone_repo.update(Drone(1, "SN-1", "Swift-X1", 5.0, "MAINTENANCE", 40))
+        self.assertEqual(drone_repo.search_by_id(1).get_status(), "MAINTENANCE")
+        self.assertEqual(len(drone_repo), 1)
+        drone_repo.remove_item(1)
+        self.assertIsNone(drone_repo.search_by_id(1))
+        drone_repo.engine.dispose()
+        print("Shared engine verified.")
+
+    def test_bulk_operations_on_all_backends(self):
+        """
+        Verifies add_items/update_many/remove_many behave the same on every backend.
+        """
+        print("Test: Bulk Operations On All Backends")
+        repos = [
+            Repository(),
+            DroneTextFileRepository(self._path("drones.txt")),
+            DroneTextFileRepository(self._path("journal.txt"), journal=True),
+            BinaryFileRepository(self._path("drones.bin")),
+            DroneSQLRepository(f"sqlite:///{self._path('bulk.db')}"),
+        ]
+        for repo in repos:
+            repo.add_items([Drone(i, f"SN-{i}", "Swift-X1", 5.0, "IDLE", 50) for i in range(1, 11)])
+            repo.update_many([Drone(i, f"SN-{i}", "Swift-X1", 5.0, "MAINTENANCE", 60) for i in (2, 4)])
+            repo.remove_many([1, 3, 99])
+
+            self.assertEqual(len(repo), 8)
+            self.assertIsNone(repo.search_by_id(1))
+            self.assertEqual(repo.search_by_id(4).get_status(), "MAINTENANCE")
+            self.assertEqual(repo.search_by_id(5).get_status(), "IDLE")
+        repos[-1].engine.dispose()
+        print("Bulk operations consistent across backends.")
+
+    def test_composite_async_replication_coalesces(self):
+        """
+        Verifies async replication writes the primary inline and coalesces queued changes per id.
+        """
+        print("Test: Composite Async Replication")
+        primary = Repository()
+        secondary = _GatedRepository()
+        composite = CompositeRepository(primary, [secondary], async_replication=True)
+
+        composite.add_item(Drone(1, "SN-1", "Swift-X1", 5.0, "IDLE", 50))
+        for battery in range(51, 60):
+            composite.update(Drone(1, "SN-1", "Swift-X1", 5.0, "IDLE", battery))
+        composite.add_items([Drone(2, "SN-2", "Swift-X1", 5.0, "IDLE", 50)])
+        composite.remove_item(2)
+        secondary._store(Drone(3, "SN-3", "Swift-X1", 5.0, "IDLE", 10))
+        primary.add_item(Drone(3, "SN-3", "Swift-X1", 5.0, "IDLE", 10))
+        composite.remove_item(3)
+        composite.add_item(Drone(3, "SN-3B", "HeavyLift-V2", 9.0, "IDLE", 80))
+
+        self.assertEqual(primary.search_by_id(1).get_battery_level(), 59)
+        self.assertEqual(composite.queue_depth(), 14)
+        self.assertGreater(composite.replication_lag(), 0.0)
+
+        secondary.gate.set()
+        composite.flush()
+        self.assertEqual(composite.queue_depth(), 0)
+        self.assertEqual(composite.replication_lag(), 0.0)
+        self.assertEqual(secondary.search_by_id(1).get_battery_level(), 59)
+        self.assertIsNone(secondary.search_by_id(2))
+        self.assertEqual(sorted(secondary.removed), [2, 3], "A remove coalesced with a later add still runs first")
+        self.assertEqual(secondary.search_by_id(3).get_serial_number(), "SN-3B")
+        self.assertLessEqual(secondary.calls, 3)
+        print("Replication coalesced and drained.")
+
+    def test_streaming_and_paged_reads(self):
+        """
+        Verifies iter_data streams every row and get_page returns ordered slices on SQL and memory backends.
+        """
+        print("Test: Streaming And Paged Reads")
+        sql_repo = DroneSQLRepository(f"sqlite:///{self._path('paged.db')}")
+        memory_repo = Repository()
+        drones = [Drone(i, f"SN-{i}", "Swift-X1", float(i % 7) + 1, "IDLE", 50) for i in range(1, 1201)]
+        for repo in (sql_repo, memory_repo):
+            repo.add_items(drones)
+
+            streamed_ids = [drone.get_id() for drone in repo.iter_data()]
+            self.assertEqual(streamed_ids, list(range(1, 1201)))
+
+            page = repo.get_page(offset=100, limit=10)
+            self.assertEqual([d.get_id() for d in page], list(range(101, 111)))
+
+            heaviest = repo.get_page(limit=3, order_by="-max_payload")
+            self.assertTrue(all(d.get_max_payload() == 7.0 for d in heaviest))
+            with self.assertRaises(ValueError):
+                repo.get_page(order_by="not_a_column")
+        sql_repo.engine.dispose()
+        print("Streaming and paging verified.")
+
+    def test_find_by_uses_secondary_indexes(self):
+        """
+        Verifies find_by/find_range agree across backends and follow in-place status changes.
+        """
+        print("Test: Predicate Pushdown Queries")
+        sql_repo = DroneSQLRepository(f"sqlite:///{self._path('find.db')}")
+        repos = [Repository(), BinaryFileRepository(self._path("find.bin")), sql_repo]
+        make_drones = lambda: [Drone(i, f"SN-{i}", "Swift-X1", float(i % 10), "IDLE" if i % 3 else "MAINTENANCE", 50)
+                               for i in range(1, 301)]
+        drones = make_drones()
+        expected_idle = sorted(d.get_id() for d in drones if d.get_status() == "IDLE")
+        expected_range = sorted((d.get_max_payload(), d.get_id()) for d in drones
+                                if d.get_status() == "IDLE" and 4.0 <= d.get_max_payload() <= 6.0)
+        for repo in repos:
+            repo.add_items(make_drones())
+            self.assertEqual(sorted(d.get_id() for d in repo.find_by(status="IDLE")), expected_idle)
+            in_range = repo.find_range("max_payload", low=4.0, high=6.0, status="IDLE")
+            self.assertEqual([(d.get_max_payload(), d.get_id()) for d in in_range], expected_range)
+
+            drone = repo.search_by_id(1)
+            drone.set_status("IN_FLIGHT")
+            repo.update(drone)
+            self.assertNotIn(1, [d.get_id() for d in repo.find_by(status="IDLE")])
+            self.assertEqual([d.get_id() for d in repo.find_by(status="IN_FLIGHT")], [1])
+            self.assertEqual(repo.count_by_status(), {"IDLE": len(expected_idle) - 1, "MAINTENANCE": 100, "IN_FLIGHT": 1})
+        sql_repo.engine.dispose()
+        print("Indexed queries verified.")
+
+    def test_memory_mapped_repository_in_place_updates(self):
+        """
+        Verifies the memory-mapped store writes battery/status in place and a read-only view sees the changes.
+        """
+        print("Test: Memory-Mapped Repository")
+        path = self._path("drones.mmap")
+        repo = DroneMemoryMappedRepository(path, initial_capacity=4)
+        repo.add_items([Drone(i, f"SN-{i}", "Swift-X1", 2.5 * i, "IDLE", 50) for i in range(1, 11)])
+        reader = DroneMemoryMappedRepository(path, readonly=True)
+        heap_size = os.path.getsize(path + ".heap")
+
+        drone = repo.search_by_id(3)
+        drone.charge_battery(3)
+        drone.set_status("MAINTENANCE")
+        repo.update(drone)
+        repo.set_battery_level(4, 12.5)
+        self.assertEqual(os.path.getsize(path + ".heap"), heap_size, "Unchanged strings should not be rewritten")
+
+        self.assertEqual(reader.search_by_id(3).get_battery_level(), 53)
+        self.assertEqual(reader.search_by_id(3).get_status(), "MAINTENANCE")
+        self.assertEqual(reader.search_by_id(4).get_battery_level(), 12.5)
+        self.assertEqual(reader.search_by_id(10).get_serial_number(), "SN-10")
+
+        repo.remove_item(5)
+        repo.add_item(Drone(11, "SN-11", "HeavyLift-V2", 9.0, "IDLE", 100))
+        self.assertIsNone(reader.search_by_id(5))
+        self.assertEqual(reader.search_by_id(11).get_model_type(), "HeavyLift-V2")
+        self.assertEqual(len(reader), 10)
+        repo.remove_item(2)
+        repo.add_item(Drone(13, "SN-13", "Swift-X1", 1.0, "IDLE", 80))
+        self.assertEqual(sorted(d.get_id() for d in reader.iter_data()), [1, 3, 4, 6, 7, 8, 9, 10, 11, 13])
+        self.assertEqual(reader.count_by_status(), {"IDLE": 9, "MAINTENANCE": 1})
+        self.assertEqual([d.get_id() for d in repo.find_range("max_payload", low=20.0, status="IDLE")], [8, 9, 10])
+        self.assertEqual(repo.high_water_id(), 13)
+        with self.assertRaises(ValueError):
+            repo.get_page(order_by="-not_a_field")
+        with self.assertRaises(ValueError):
+            repo.add_item(Drone(12, "SN-12", "Swift-X1", 1.0, "LOST", 10))
+
+        parcels = ParcelMemoryMappedRepository(self._path("parcels.mmap"))
+        parcels.add_item(Parcel(1, "Ann", "Street 1", 2.0, "HIGH", "PENDING", 12))
+        parcels.set_status(1, "DELIVERED")
+        self.assertEqual(parcels.find_by(status="DELIVERED")[0].get_recipient_name(), "Ann")
+        for store in (reader, repo, parcels):
+            store.close()
+        print("Memory-mapped store verified.")
+
+    def test_unit_of_work_single_commit_and_rollback(self):
+        """
+        An assignment across SQL parcel, mission and drone repositories is one commit, a failing write rolls all back.
+        """
+        print("Test: Unit Of Work")
+        db_string = f"sqlite:///{self._path('uow.db')}"
+        drones, parcels, missions = DroneSQLRepository(db_string), ParcelSQLRepository(db_string), MissionSQLRepository(db_string)
+        drones.add_item(Drone(1, "SN-1", "Swift-X1", 5.0, "IDLE", 100))
+        parcels.add_item(Parcel(1, "Ann", "Street 1", 2.0, "HIGH", "PENDING", 3))
+        missions.add_item(Mission(7, 1, 1, "2030-01-01 10:00:00", "DELIVERED"))
+        secondary = Repository()
+        composite_missions = CompositeRepository(missions, [secondary])
+
+        commits = []
+        event.listen(drones.engine, "commit", lambda connection: commits.append(1))
+        version = composite_missions.version()
+        with UnitOfWork() as uow:
+            uow.update(parcels, Parcel(1, "Ann", "Street 1", 2.0, "HIGH", "ASSIGNED", 3))
+            uow.add(composite_missions, Mission(8, 1, 1, "2030-01-01 12:00:00", "SCHEDULED"))
+            uow.update(drones, Drone(1, "SN-1", "Swift-X1", 5.0, "FLIGHT SCHEDULED", 100))
+        self.assertEqual(len(commits), 1)
+        self.assertEqual(parcels.search_by_id(1).get_status(), "ASSIGNED")
+        self.assertEqual(missions.search_by_id(8).get_status(), "SCHEDULED")
+        self.assertEqual(secondary.search_by_id(8).get_status(), "SCHEDULED", "Secondaries follow after the commit")
+        self.assertNotEqual(composite_missions.version(), version, "A composite with a SQL primary should see its own commits")
+
+        with self.assertRaises(Exception):
+            with UnitOfWork() as uow:
+                uow.update(parcels, Parcel(1, "Ann", "Street 1", 2.0, "HIGH", "DELIVERED", 3))
+                uow.update(drones, Drone(1, "SN-1", "Swift-X1", 5.0, "IDLE", 60))
+                uow.add(missions, Mission(7, 1, 1, "2030-01-01 12:00:00", "SCHEDULED"))
+        self.assertEqual(parcels.search_by_id(1).get_status(), "ASSIGNED", "Nothing should be half applied")
+        self.assertEqual(drones.search_by_id(1).get_battery_level(), 100)
+
+        text_repo = DroneTextFileRepository(self._path("uow.txt"))
+        with UnitOfWork() as uow:
+            for i in range(1, 4):
+                uow.add(text_repo, Drone(i, f"SN-{i}", "Swift-X1", 5.0, "IDLE", 50))
+        self.assertEqual(len(DroneTextFileRepository(self._path("uow.txt"))), 3)
+        drones.engine.dispose()
+        print("One commit per unit of work, failures roll back.")
+
+    def test_next_id_allocation_on_all_backends(self):
+        """
+        Verifies every backend hands out increasing ids that survive reloads and never reuse deleted ids.
+        """
+        print("Test: Mission Id Sequences")
+        db_string = f"sqlite:///{self._path('sequence.db')}"
+        factories = [
+            lambda: DroneTextFileRepository(self._path("seq.txt")),
+            lambda: BinaryFileRepository(self._path("seq.bin")),
+            lambda: DroneSQLRepository(db_string),
+            lambda: DroneMemoryMappedRepository(self._path("seq.mmap")),
+        ]
+        memory = Repository()
+        memory.add_item(Drone(4, "SN-4", "Swift-X1", 5.0, "IDLE", 50))
+        self.assertEqual(memory.next_id(), 5)
+        for factory in factories:
+            repo = factory()
+            repo.add_items([Drone(i, f"SN-{i}", "Swift-X1", 5.0, "IDLE", 50) for i in (1, 2, 7)])
+            self.assertEqual(repo.next_id(), 8)
+            repo.remove_item(7)
+            self.assertEqual(repo.next_id(), 9)
+            repo.add_item(Drone(20, "SN-20", "Swift-X1", 5.0, "IDLE", 50))
+            self.assertEqual(repo.next_id(), 21)
+            if hasattr(repo, "close"):
+                repo.close()
+            reopened = factory()
+            self.assertEqual(reopened.next_id(), 22, f"{type(repo).__name__} lost its high-water mark")
+            composite = CompositeRepository(reopened, [Repository()])
+            self.assertEqual(composite.next_id(), 23)
+            if hasattr(reopened, "close"):
+                reopened.close()
+        print("Sequences persisted on every backend.")
+
+    def test_next_id_is_unique_under_concurrency(self):
+        """
+        Many threads allocating ids at once never get the same one.
+        """
+        print("Test: Concurrent Id Allocation")
+        for repo in (DroneTextFileRepository(self._path("race.txt")), MissionSQLRepository(f"sqlite:///{self._path('race.db')}")):
+            allocated = []
+            lock = threading.Lock()
+
+            def allocate():
+                ids = [repo.next_id() for _ in range(25)]
+                with lock:
+                    allocated.extend(ids)
+
+            threads = [threading.Thread(target=allocate) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(sorted(allocated), list(range(1, 201)))
+        print("No duplicate ids.")
+
+    def test_bulk_csv_ingest_reports_bad_lines(self):
+        """
+        A CSV import is written in chunks, duplicates are found against the stored ids and in the upload itself,
+        and every bad line is reported while the rest of the file still goes in.
+        """
+        print("Test: Bulk Parcel Ingest")
+        db_string = f"sqlite:///{self._path('ingest.db')}"
+        composite = CompositeRepository(ParcelSQLRepository(db_string), [BinaryFileRepository(self._path("parcels.bin"))])
+        for repo in (Repository(), BinaryFileRepository(self._path("p.bin")), ParcelMemoryMappedRepository(self._path("p.mmap")), composite):
+            repo.add_items([Parcel(i, f"R{i}", "Addr", 1.0, "STANDARD", "PENDING", 2) for i in (1, 2)])
+            self.assertEqual(repo.existing_ids([1, 3, 2, 4]), {1, 2})
+
+        with patch.object(composite, "get_data", side_effect=AssertionError("full table read to check for an empty store")):
+            service = LogisticService(composite, Repository(), Repository(), MagicMock(), MagicMock())
+        empty = Repository()
+        LogisticService(empty, Repository(), Repository(), MagicMock(), MagicMock(), seed=False)
+        self.assertEqual(len(empty), 0, "An import target should not be seeded")
+        lines = ["id,recipient_name,delivery_address,weight,priority,distance\n"]
+        lines += [f'{i},Name {i},"Street {i}, City",1.5,STANDARD,4\n' for i in range(3, 13)]
+        lines += ["2,Old,Addr,1.0,HIGH,3\n", "5,Again,Addr,1.0,HIGH,3\n", "20,Heavy,Addr,-1,HIGH,3\n",
+                  "21,Short,Addr\n", "22,Odd,Addr,1.0,URGENT,3\n", "\n", "23,Last,Addr,2.0,,3\n"]
+        errors = []
+        added, failed = ingest_lines(service, lines, "csv", chunk_size=4, on_error=lambda line, message: errors.append(line))
+        self.assertEqual((added, failed), (11, 5))
+        self.assertEqual(errors, [12, 13, 14, 15, 16])
+        self.assertEqual(composite.search_by_id(7).get_delivery_address(), "Street 7; City")
+        self.assertEqual(composite.search_by_id(23).get_priority(), Priority.STANDARD)
+        self.assertEqual(len(composite.get_data()), 13)
+
+        text_path = self._path("parcels.txt")
+        text_service = LogisticService(ParcelTextFileRepository(text_path), Repository(), Repository(), MagicMock(), MagicMock(),
+                                       seed=False)
+        record = {"id": 1, "recipient_name": "Doe, Jane", "delivery_address": "Line 1\nCity, 12", "weight": 1, "distance": 2}
+        lines = [json.dumps(record)] + [json.dumps(dict(record, id=2, priority=priority)) for priority in (["HIGH"], {"x": 1})]
+        self.assertEqual(ingest_lines(text_service, lines, "ndjson"), (1, 2), "Unhashable priorities are per-line errors")
+        reloaded = ParcelTextFileRepository(text_path).search_by_id(1)
+        self.assertEqual((reloaded.get_recipient_name(), reloaded.get_delivery_address()), ("Doe; Jane", "Line 1-City; 12"))
+
+        sql_parcels = ParcelSQLRepository(f"sqlite:///{self._path('bounds.db')}")
+        sql_service = LogisticService(sql_parcels, Repository(), Repository(), MagicMock(), MagicMock(), seed=False)
+        lines = [json.dumps(dict(record, id=parcel_id)) for parcel_id in (1, 10 ** 20, 3)]
+        lines += [json.dumps(dict(record, id=4, weight=value)) for value in ("nan", "inf")] + ['{"id": 5, "recipient_name": "A", "delivery_address": "B", "weight": 1, "distance": NaN}']
+        self.assertEqual(ingest_lines(sql_service, lines, "ndjson"), (2, 4), "Oversized ids and non-finite numbers are per-line errors")
+        sql_parcels.engine.dispose()
+
+        failing = Repository()
+        real_add_item = failing.add_item
+        def add_item(parcel):
+            if parcel.get_id() == 5:
+                raise OSError("row refused")
+            real_add_item(parcel)
+        with patch.object(failing, "add_items", side_effect=OSError("batch refused")), patch.object(failing, "add_item", side_effect=add_item):
+            failing_service = LogisticService(failing, Repository(), Repository(), MagicMock(), MagicMock(), seed=False)
+            added, rejected = failing_service.add_parcels([(i, dict(record, id=i)) for i in range(4, 8)])
+        self.assertEqual((added, rejected), (3, [(5, "row refused")]), "A failing batch is retried row by row")
+        self.assertEqual(sorted(p.get_id() for p in failing.get_data()), [4, 6, 7])
+        print("Valid lines imported, bad lines reported.")
+
+class _LegacyDrone:
+    """Pickles like a Drone saved before the models were slotted, with a plain __dict__ state"""
+    def __init__(self, state):
+        self._state = state
+
+    def __reduce__(self):
+        return (object.__new__, (Drone,), self._state)
+
+class TestModels(unittest.TestCase):
+
+    def test_models_are_slotted_with_enum_codes(self):
+        print("Test: Slotted Models With Enum Codes")
+        drone = Drone(1, "SN-1", "Swift-X1", 5.0, "IDLE", 100)
+        parcel = Parcel(2, "Ann", "Street", 1.0, "HIGH", "PENDING", 10)
+        mission = Mission(3, 1, 2, "2030-01-01 10:00:00", "SCHEDULED")
+        for item in (drone, parcel, mission):
+            self.assertFalse(hasattr(item, "__dict__"))
+
+        self.assertIs(drone.get_status(), DroneStatus.IDLE)
+        self.assertIs(parcel.get_priority(), Priority.HIGH)
+        self.assertEqual(parcel.get_status(), "PENDING")
+        drone.set_status("FLIGHT SCHEDULED")
+        self.assertIs(drone.get_status(), DroneStatus.FLIGHT_SCHEDULED)
+        self.assertEqual(f"{drone.get_status()}", "FLIGHT SCHEDULED")
+        self.assertTrue(drone.fuzzy_match("flight"))
+        self.assertTrue(parcel.fuzzy_match("ann"))
+
+        custom = Drone(4, "SN-4", "Swift-X1", 5.0, "CUSTOM STATE", 100)
+        self.assertEqual(custom.get_status(), "CUSTOM STATE")
+        print("Slotted models verified.")
+
+    def test_legacy_pickles_still_load(self):
+        print("Test: Legacy Pickled Models Load")
+        legacy_state = {"_id": 7, "_serial_number": "SN-7", "_model_type": "Swift-X1", "_max_payload": 3.0,
+                        "_status": "MAINTENANCE", "_battery_level": 40}
+        drone = pickle.loads(pickle.dumps(_LegacyDrone(legacy_state)))
+        self.assertIsInstance(drone, Drone)
+        self.assertIs(drone.get_status(), DroneStatus.MAINTENANCE)
+        self.assertEqual(drone.get_battery_level(), 40)
+
+        parcel = pickle.loads(pickle.dumps(Parcel(2, "Ann", "Street", 1.0, "HIGH", "DELIVERED", 10)))
+        self.assertIs(parcel.get_status(), ParcelStatus.DELIVERED)
+        print("Legacy pickles migrated.")
+
+    def test_battery_charges_lazily_on_the_curve(self):
+        """
+        An idle drone's battery follows the charge curve when read and is settled on status changes.
+        """
+        print("Test: Lazy Battery Charging")
+        drone = Drone(1, "SN-1", "Swift-X1", 5.0, "IDLE", 50, charging_since=1000.0)
+        self.assertEqual(drone.get_battery_level(1000.0), 50)
+        self.assertEqual(drone.get_battery_level(1050.0), 65)
+        self.assertEqual(drone.get_battery_level(1100.0), 80)
+        self.assertEqual(drone.get_battery_level(1200.0), 90)
+        self.assertEqual(drone.get_battery_level(5000.0), 100)
+
+        drone = Drone(2, "SN-2", "Swift-X1", 5.0, "IDLE", 20, charging_since=time.time() - 100)
+        drone.set_status("FLIGHT SCHEDULED")
+        self.assertIsNone(drone.get_charging_since())
+        self.assertEqual(drone.get_battery_level(), 50, "Charge gained so far should be kept when leaving IDLE")
+        drone.update_battery(30)
+        drone.set_status("IDLE")
+        self.assertIsNotNone(drone.get_charging_since())
+        self.assertEqual(drone.get_battery_level(drone.get_charging_since() + 10), 23)
+        print("Battery evaluated lazily and settled on transitions.")
+
+    def test_charging_start_persisted_by_every_backend(self):
+        """
+        The charging start round-trips through every backend, an old SQL table gains the column.
+        """
+        print("Test: Charging Start Persistence")
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "old.db")
+            connection = sqlite3.connect(db_path)
+            connection.execute('CREATE TABLE "Drones" (id INTEGER PRIMARY KEY, serial_number VARCHAR, model_type VARCHAR, '
+                               'max_payload FLOAT, battery_level INTEGER, status VARCHAR)')
+            connection.execute('INSERT INTO "Drones" VALUES (9, \'SN-9\', \'Swift-X1\', 4.0, 30, \'IDLE\')')
+            connection.commit()
+            connection.close()
+            sql_repo = DroneSQLRepository(f"sqlite:///{db_path}")
+            self.assertIsNone(sql_repo.search_by_id(9).get_charging_since())
+
+            with open(os.path.join(tmp, "old.txt"), "w") as f:
+                f.write("9,SN-9,Swift-X1,4.0,IDLE,30\n")
+            self.assertEqual(DroneTextFileRepository(os.path.join(tmp, "old.txt")).search_by_id(9).get_battery_level(), 30)
+
+            factories = [
+                lambda: sql_repo,
+                lambda: DroneTextFileRepository(os.path.join(tmp, "drones.txt")),
+                lambda: BinaryFileRepository(os.path.join(tmp, "drones.bin")),
+                lambda: DroneMemoryMappedRepository(os.path.join(tmp, "drones.mmap")),
+            ]
+            for factory in factories:
+                repo = factory()
+                repo.add_item(Drone(1, "SN-1", "Swift-X1", 5.0, "IDLE", 40, charging_since=1234.5))
+                repo.add_item(Drone(2, "SN-2", "Swift-X1", 5.0, "MAINTENANCE", 70))
+                if hasattr(repo, "close"):
+                    repo.close()
+                reopened = factory()
+                self.assertEqual(reopened.search_by_id(1).get_charging_since(), 1234.5, type(repo).__name__)
+                self.assertEqual(reopened.search_by_id(1).get_battery_level(1244.5), 43)
+                self.assertIsNone(reopened.search_by_id(2).get_charging_since())
+                if hasattr(reopened, "close"):
+                    reopened.close()
+            sql_repo.engine.dispose()
+        print("Charging start persisted.")
+
+    def test_drone_service_starts_idle_drones_charging_once(self):
+        """
+        Idle drones without a charging start get one at startup in a single batch, nothing polls afterwards.
+        """
+        print("Test: Idle Drones Start Charging")
+        repo = Repository()
+        repo.add_items([Drone(1, "SN-1", "Swift-X1", 5.0, "IDLE", 40), Drone(2, "SN-2", "Swift-X1", 5.0, "MAINTENANCE", 40)])
+        service = DroneService(repo)
+        self.assertIsNotNone(repo.search_by_id(1).get_charging_since())
+        self.assertIsNone(repo.search_by_id(2).get_charging_since())
+        self.assertFalse(hasattr(service, "_drone_charger"))
+        print("Idle drones charging without a sweep thread.")
+
+class TestWeatherService(unittest.TestCase):
+
+    def _response(self, base):
+        response = MagicMock()
+        response.json.return_value = {"list": [
+            {"dt": base + hours * 3600, "main": {"temp": 10 + hours}, "wind": {"speed": 1},
+             "weather": [{"main": "Rain" if hours == 6 else "Clear"}]}
+            for hours in (9, 0, 6, 3)
+        ]}
+        return response
+
+    def test_forecast_cached_and_nearest_slot(self):
+        """
+        Checks that one download serves many lookups and that the closest forecast slot is returned.
+        """
+        print("Test: Weather Forecast Cache")
+        base = datetime(2030, 1, 1, 12, 0).timestamp()
+        with patch("services.weather_service.requests.get", return_value = self._response(base)) as get:
+            service = WeatherService("key", "City", ttl = 600)
+            for _ in range(50):
+                weather = service.get_current_weather(datetime.fromtimestamp(base + 5 * 3600))
+            self.assertEqual(get.call_count, 1)
+            self.assertEqual(weather["temperature"], 16)
+            self.assertEqual(weather["is_raining"], 1)
+            self.assertEqual(service.get_current_weather(datetime.fromtimestamp(base - 3600))["temperature"], 10)
+            self.assertEqual(service.get_current_weather(datetime.fromtimestamp(base + 200 * 3600)), service._default_weather())
+        print("Forecast downloaded once, nearest slot found.")
+
+    def test_stale_forecast_served_while_refreshing(self):
+        """
+        Checks that an expired forecast is still served while a background refresh runs.
+        """
+        print("Test: Weather Stale While Revalidate")
+        base = datetime(2030, 1, 1, 12, 0).timestamp()
+        release = threading.Event()
+        with patch("services.weather_service.requests.get", return_value = self._response(base)) as get:
+            service = WeatherService("key", "City", ttl = 600, max_stale = 3600)
+            service.refresh()
+            service._fetched_at -= 1200
+
+            def slow_get(*args, **kwargs):
+                release.wait(5)
+                return self._response(base)
+            get.side_effect = slow_get
+
+            weather = service.get_current_weather(datetime.fromtimestamp(base))
+            self.assertEqual(weather["temperature"], 10, "Stale forecast should be returned without waiting")
+            self.assertTrue(service._refreshing)
+            release.set()
+            for _ in range(100):
+                if not service._refreshing:
+                    break
+                threading.Event().wait(0.05)
+            self.assertFalse(service._refreshing)
+            self.assertEqual(get.call_count, 2)
+        print("Stale forecast served, refresh done in background.")
+
+    def test_failed_refresh_backs_off(self):
+        """
+        Checks that after a failed download lookups get the default weather without waiting on the network again,
+        and that a malformed payload counts as a failure instead of raising.
+        """
+        print("Test: Weather Refresh Back-Off")
+        base = datetime(2030, 1, 1, 12, 0).timestamp()
+        with patch("services.weather_service.requests.get", side_effect = requests.exceptions.ConnectionError("down")) as get:
+            service = WeatherService("key", "City", ttl = 600, retry_after = 60)
+            for _ in range(20):
+                self.assertEqual(service.get_current_weather(datetime.fromtimestamp(base)), service._default_weather())
+            self.assertEqual(get.call_count, 1, "Lookups after a failure should not hit the network")
+
+            service._failed_at -= 120
+            malformed = MagicMock()
+            malformed.json.return_value = {"list": [{"dt": base}]}
+            get.side_effect = None
+            get.return_value = malformed
+            self.assertEqual(service.get_current_weather(datetime.fromtimestamp(base)), service._default_weather())
+            self.assertEqual(get.call_count, 2)
+
+            service._failed_at -= 120
+            get.return_value = self._response(base)
+            self.assertEqual(service.get_current_weather(datetime.fromtimestamp(base))["temperature"], 10)
+            self.assertIsNone(service._failed_at)
+        print("Failed refreshes back off.")
+
+class TestBatteryPredictionAi(unittest.TestCase):
+
+    def test_persisted_model_matches_sklearn(self):
+        """
+        Checks that the stored coefficients reproduce the scikit-learn model, one sample and in batch.
+        """
+        print("Test: Battery Model Inference")
+        from sklearn.linear_model import LinearRegression
+        reference = LinearRegression().fit(BatteryPredictionAi._X_TRAIN, BatteryPredictionAi._Y_TRAIN)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            model_file = os.path.join(tmp, "battery_model.json")
+            BatteryPredictionAi(model_file)
+            self.assertTrue(os.path.exists(model_file))
+            with patch.object(BatteryPredictionAi, "_train_model", side_effect = AssertionError("retrained")):
+                ai = BatteryPredictionAi(model_file)
+
+        rng = np.random.default_rng(3)
+        wind = rng.uniform(0, 60, 500)
+        temperature = rng.uniform(-15, 35, 500)
+        raining = rng.integers(0, 2, 500)
+        expected = np.maximum(1.0, reference.predict(np.column_stack([wind, temperature, raining])))
+
+        batch = ai.predict_drain_multiplier_batch(wind, temperature, raining)
+        np.testing.assert_allclose(batch, expected, rtol = 1e-9)
+        for i in range(0, 500, 50):
+            self.assertAlmostEqual(ai.predict_drain_multiplier(wind[i], temperature[i], raining[i]), expected[i], places = 9)
+        print("Stored model loaded without retraining and matches scikit-learn.")
+
+class TestMissionScheduler(unittest.TestCase):
+
+    def test_launches_in_deadline_order_without_polling(self):
+        """
+        Missions fire at their start time in order, an earlier mission added later wakes the worker.
+        """
+        print("Test: Heap Mission Scheduler")
+        launched = []
+        done = threading.Event()
+
+        def launch(mission_id):
+            launched.append((mission_id, datetime.now()))
+            if len(launched) == 2:
+                done.set()
+
+        scheduler = MissionScheduler(launch)
+        scheduler.start()
+        now = datetime.now()
+        scheduler.schedule(1, now + timedelta(seconds = 0.4))
+        scheduler.schedule(2, now + timedelta(seconds = 0.2))
+        scheduler.schedule(3, now + timedelta(seconds = 0.3))
+        scheduler.cancel(3)
+
+        self.assertTrue(done.wait(3))
+        scheduler.stop()
+        self.assertEqual([mission_id for mission_id, _ in launched], [2, 1])
+        late = (launched[0][1] - (now + timedelta(seconds = 0.2))).total_seconds()
+        self.assertLess(late, 0.1, "Mission should launch within milliseconds of its start time")
+        self.assertEqual(scheduler.pending(), 0)
+        print("Missions launched on time, cancelled mission skipped.")
+
+    def test_service_launches_scheduled_mission(self):
+        """
+        A scheduled mission found at startup is launched: mission EN ROUTE, drone IN FLIGHT.
+        """
+        print("Test: Service Scheduled Mission Launch")
+        parcel_repo, mission_repo, drone_repo = MagicMock(), MagicMock(), MagicMock()
+        parcel_repo.get_data.return_value = [Parcel(1, "A", "Addr", 1.0, "STANDARD", "ASSIGNED", 5)]
+        start = (datetime.now() + timedelta(seconds = 0.2)).strftime("%Y-%m-%d %H:%M:%S")
+        mission = Mission(1, 1, 1, start, "SCHEDULED")
+        drone = Drone(1, "SN-1", "Swift-X1", 5.0, "FLIGHT SCHEDULED", 100)
+        mission_repo.find_by.return_value = [mission]
+        mission_repo.search_by_id.return_value = mission
+        drone_repo.search_by_id.return_value = drone
+        launched = threading.Event()
+        drone_repo.update.side_effect = lambda item: launched.set()
+
+        service = LogisticService(parcel_repo, mission_repo, drone_repo, MagicMock(), MagicMock())
+        service._start_background_scheduler()
+        self.assertTrue(launched.wait(3))
+        service._scheduler.stop()
+        self.assertEqual(mission.get_status(), MissionStatus.EN_ROUTE)
+        self.assertEqual(drone.get_status(), DroneStatus.IN_FLIGHT)
+        print("Scheduled mission launched.")
+
+class TestFleetAvailabilityIndex(unittest.TestCase):
+
+    def test_best_fit_matches_repository_scan(self):
+        """
+        The index picks the same drone as the vectorized repository scan and follows status changes.
+        """
+        print("Test: Fleet Availability Index")
+        rng = random.Random(11)
+        drones = [Drone(i, f"SN-{i}", "Swift-X1", round(rng.uniform(0.5, 10.0), 1), rng.choice(["IDLE", "IDLE", "MAINTENANCE"]),
+                        rng.randint(0, 100)) for i in range(1, 501)]
+        repo = Repository()
+        repo.add_items(drones)
+        weather, ai = MagicMock(), MagicMock()
+        weather.get_current_weather.return_value = {"wind_speed": 5, "temperature": 15, "is_raining": 0}
+        ai.predict_drain_multiplier.return_value = 1.2
+        index = FleetAvailabilityIndex()
+        DroneService(repo, index)
+        indexed = LogisticService(Repository(), Repository(), repo, weather, ai, index)
+        scanning = LogisticService(Repository(), Repository(), repo, weather, ai)
+        dt = datetime.now() + timedelta(hours=1)
+
+        self.assertEqual(len(index), sum(d.get_status() == "IDLE" for d in drones))
+        for _ in range(50):
+            parcel = Parcel(1, "A", "Addr", round(rng.uniform(0.5, 10.0), 2), "STANDARD", "PENDING", rng.randint(1, 20))
+            expected = scanning._find_best_drone(parcel, dt)
+            chosen = indexed._find_best_drone(parcel, dt)
+            self.assertIs(chosen, expected)
+            if chosen:
+                self.assertNotIn(chosen, index.idle_drones(), "A chosen drone should be claimed")
+                index.track(chosen)
+
+        drone = index.best_fit(5.0, lambda payload: 0)
+        drone.set_status("MAINTENANCE")
+        index.track(drone)
+        self.assertNotIn(drone, index.idle_drones())
+        drone.set_status("IDLE")
+        index.track(drone)
+        self.assertIs(index.best_fit(5.0, lambda payload: 0), drone)
+        print("Index best fit matches the repository scan.")
+
+    def test_claims_are_exclusive_across_threads(self):
+        """
+        Concurrent claims never hand the same drone out twice.
+        """
+        print("Test: Availability Index Concurrent Claims")
+        index = FleetAvailabilityIndex()
+        index.rebuild([Drone(i, f"SN-{i}", "Swift-X1", 1.0 + i % 7, "IDLE", 100) for i in range(1, 201)])
+        claimed = []
+        lock = threading.Lock()
+
+        def claim():
+            while True:
+                drone = index.best_fit(0.5, lambda payload: 0, claim=True)
+                if drone is None:
+                    return
+                with lock:
+                    claimed.append(drone.get_id())
+
+        threads = [threading.Thread(target=claim) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(claimed), list(range(1, 201)))
+        self.assertEqual(len(index), 0)
+        print("Every drone claimed exactly once.")
+
+    def test_every_assignment_path_claims_and_failures_release(self):
+        """
+        Manual and batch assignments claim their drones from the index, and an assignment that fails after
+        claiming puts the drone back instead of losing it until restart.
+        """
+        print("Test: Availability Index Claims On Every Path")
+        drone_repo, parcel_repo, mission_repo = Repository(), Repository(), Repository()
+        drone_repo.add_items([Drone(i, f"SN-{i}", "Swift-X1", 5.0, "IDLE", 100) for i in range(1, 4)])
+        parcel_repo.add_items([Parcel(i, f"R{i}", "Addr", 1.0, "STANDARD", "PENDING", 2) for i in range(1, 6)])
+        index = FleetAvailabilityIndex()
+        DroneService(drone_repo, index)
+        service = LogisticService(parcel_repo, mission_repo, drone_repo, MagicMock(), MagicMock(), index)
+        service._predict_drainage = MagicMock(return_value=1.0)
+        start = (datetime.now() + timedelta(hours=1)).strftime("%Y-%m-%d %H:%M:%S")
+
+        with patch.object(mission_repo, "next_id", side_effect=RuntimeError("sequence unavailable")):
+            with self.assertRaises(RuntimeError):
+                service.assign_a_mission_automatically(1, start)
+        self.assertEqual(len(index), 3)
+        self.assertEqual(parcel_repo.search_by_id(1).get_status(), "PENDING")
+
+        service.assign_a_mission_manually(50, 2, 1, start)
+        self.assertNotIn(2, [drone.get_id() for drone in index.idle_drones()])
+        index.claim(3)
+        self.assertEqual(service.assign_many([2, 3], start), {2: 1})
+        self.assertEqual(len(index), 0)
+        with self.assertRaises(NoDroneAvailable):
+            service.assign_a_mission_automatically(3, start)
+        print("Drones claimed on every path and released on failure.")
+
+class TestApiServer(unittest.TestCase):
+
+    def setUp(self):
+        self.drone_repo, self.parcel_repo, self.mission_repo = Repository(), Repository(), Repository()
+        self.drone_repo.add_items([Drone(i, f"SN-{i}", "Swift-X1", 5.0, "IDLE" if i % 2 else "MAINTENANCE", 50) for i in range(1, 8)])
+        self.parcel_repo.add_items([Parcel(i, f"R{i}", "Addr", 2.0, "STANDARD", "DELIVERED" if i <= 2 else "PENDING", 5)
+                                    for i in range(1, 6)])
+        self.drone_service = DroneService(self.drone_repo)
+        self.logistic_service = LogisticService(self.parcel_repo, self.mission_repo, self.drone_repo, MagicMock(), MagicMock())
+        api_server.set_repo(self.drone_service, self.logistic_service)
+        self.client = TestClient(api_server.app)
+
+    def tearDown(self):
+        api_server.set_repo(None, None)
+
+    def test_json_pagination_filters_and_fields(self):
+        """
+        JSON endpoints page with limit/offset, filter by status and return only the requested fields.
+        """
+        print("Test: JSON API Pagination")
+        first = self.client.get("/api/drones", params={"limit": 3}).json()
+        self.assertEqual([d["id"] for d in first["items"]], [1, 2, 3])
+        self.assertEqual(first["next_offset"], 3)
+        idle = self.client.get("/api/drones", params={"status": "IDLE", "fields": "id,status"}).json()
+        self.assertEqual(idle["items"], [{"id": i, "status": "IDLE"} for i in (1, 3, 5, 7)])
+        self.assertIsNone(idle["next_offset"])
+        delivered = self.client.get("/api/parcels/delivered", params={"fields": "id"}).json()
+        self.assertEqual(delivered["items"], [{"id": 1}, {"id": 2}])
+        self.assertEqual(self.client.get("/api/missions").json()["items"], [])
+        self.assertEqual(self.client.get("/api/missions", params={"order_by": "bogus"}).status_code, 400,
+                         "An unknown field is rejected even when there is nothing to page")
+        self.assertEqual(self.client.get("/api/drones", params={"fields": "id,secret"}).status_code, 400)
+        self.assertEqual(self.client.get("/api/parcels", params={"order_by": "secret"}).status_code, 400)
+        charging = self.client.get("/api/drones", params={"order_by": "-charging_since", "fields": "id,charging_since"}).json()
+        self.assertIsNone(charging["items"][-1]["charging_since"], "Drones that never charged sort last when descending")
+        self.assertIsNotNone(charging["items"][0]["charging_since"])
+        print("Pages, filters and field selection work.")
+
+    def test_etag_not_modified_until_a_change(self):
+        """
+        A matching If-None-Match gets a 304 without a body until the repository changes.
+        """
+        print("Test: JSON API ETag")
+        response = self.client.get("/api/parcels", params={"status": "PENDING"})
+        etag = response.headers["etag"]
+        with patch.object(self.parcel_repo, "get_page", side_effect=AssertionError("repository read on 304")):
+            cached = self.client.get("/api/parcels", params={"status": "PENDING"}, headers={"If-None-Match": etag})
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.content, b"")
+
+        self.logistic_service.add_parcel(9, "New", "Addr", 1.0, "STANDARD", 3)
+        changed = self.client.get("/api/parcels", params={"status": "PENDING"}, headers={"If-None-Match": etag})
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed.headers["etag"], etag)
+        self.assertIn(9, [p["id"] for p in changed.json()["items"]])
+        print("304 served until the parcels changed.")
+
+    def test_pages_are_patched_by_pushed_deltas(self):
+        """
+        The pages no longer poll, every service change reaches the open /events streams as one rendered delta
+        and a stream that falls too far behind is told to resync.
+        """
+        print("Test: Live Push Updates")
+        page = self.client.get("/drones").text
+        self.assertNotIn('http-equiv="refresh"', page)
+        self.assertIn('id="drone-3"', page)
+
+        bus = EventBus()
+        self.drone_service = DroneService(self.drone_repo, events=bus)
+        self.logistic_service = LogisticService(self.parcel_repo, self.mission_repo, self.drone_repo, MagicMock(), MagicMock(),
+                                                events=bus)
+        api_server.set_event_bus(bus)
+        loop = asyncio.new_event_loop()
+        client = (loop, asyncio.Queue(maxsize=3))
+        api_server._sse_clients.add(client)
+        try:
+            self.logistic_service.add_parcel(9, "New", "Addr", 1.0, "STANDARD", 3)
+            self.drone_service.update_drone(2, "SN-2", "Swift-X1", 5.0, "IDLE", 40)
+            self.drone_service.remove_drone(4)
+            loop.run_until_complete(asyncio.sleep(0))
+            messages = [client[1].get_nowait() for _ in range(3)]
+            self.assertTrue(messages[0].startswith("event: parcel\n"))
+            parcel = json.loads(messages[0].split("data: ", 1)[1])
+            self.assertEqual((parcel["id"], parcel["status"]), (9, "PENDING"))
+            self.assertIn('id="parcel-9"', parcel["html"])
+            drone = json.loads(messages[1].split("data: ", 1)[1])
+            self.assertEqual((drone["id"], drone["status"], drone["battery_level"]), (2, "IDLE", 40))
+            self.assertIsNotNone(drone["charging_since"])
+            self.assertEqual(messages[2], 'event: drone_removed\ndata: {"id": 4}\n\n')
+            self.assertNotIn(("drone", 4), api_server._row_cache, "Removed rows should leave the row cache")
+
+            for i in range(5):
+                self.logistic_service.add_parcel(20 + i, "New", "Addr", 1.0, "STANDARD", 3)
+            loop.run_until_complete(asyncio.sleep(0))
+            backlog = []
+            while not client[1].empty():
+                backlog.append(client[1].get_nowait())
+            self.assertIn("event: resync\ndata: {}\n\n", backlog)
+            self.assertLessEqual(len(backlog), 3)
+        finally:
+            api_server._sse_clients.discard(client)
+            bus.unsubscribe(api_server._broadcast)
+            loop.close()
+        print("Deltas pushed per change, slow streams resync.")
+
+    def test_standalone_pages_poll_without_event_bus(self):
+        """
+        A standalone worker has no event bus, its pages poll once per snapshot window instead of waiting on pushes.
+        """
+        print("Test: Standalone Polling Fallback")
+        bus = api_server._event_bus
+        api_server._event_bus = None
+        api_server.set_snapshot_ttl(5)
+        try:
+            page = self.client.get("/drones").text
+            self.assertIn('<body data-poll="5">', page)
+            self.assertIn("Polling Updates", page)
+            self.assertIn("pollPage", self.client.get("/static/live.js").text)
+        finally:
+            api_server._event_bus = bus
+            api_server.set_snapshot_ttl(None)
+        self.assertNotIn("data-poll", self.client.get("/drones").text)
+        print("Standalone pages poll every snapshot window.")
+
+    def test_read_only_worker_service_never_writes(self):
+        """
+        A read-only DroneService, as built by every standalone API worker, neither seeds nor starts idle drones charging.
+        """
+        print("Test: Read-Only Worker Service")
+        repo = Repository()
+        repo.add_items([Drone(i, f"SN-{i}", "Swift-X1", 5.0, "IDLE", 50) for i in (1, 2)])
+        with patch.object(repo, "update_many", side_effect=AssertionError("startup write from an API worker")), \
+             patch.object(repo, "add_items", side_effect=AssertionError("startup write from an API worker")):
+            DroneService(repo, read_only=True)
+            DroneService(Repository(), read_only=True)
+        self.assertIsNone(repo.search_by_id(1).get_charging_since())
+        print("Read-only workers leave the store alone.")
+
+    def test_pages_cached_until_repository_changes(self):
+        """
+        A page is rebuilt only after its repository changed, and then only the changed rows are rendered again.
+        CSS and script are long lived static assets.
+        """
+        print("Test: Cached HTML Pages")
+        first = self.client.get("/parcels_history").text
+        with patch.object(self.parcel_repo, "find_by", side_effect=AssertionError("repository read for a cached page")):
+            self.assertEqual(self.client.get("/parcels_history").text, first)
+
+        with patch.object(api_server, "_render_parcel_row", wraps=api_server._render_parcel_row) as render:
+            self.logistic_service.update_parcel(3, "R3", "Addr", 2.0, "STANDARD", ParcelStatus.DELIVERED, 5)
+            history = self.client.get("/parcels_history").text
+        self.assertIn('id="parcel-3"', history)
+        self.assertEqual(render.call_count, 1)
+
+        self.assertNotIn("<style>", first)
+        css = self.client.get("/static/dashboard.css")
+        self.assertIn("max-age=31536000", css.headers["cache-control"])
+        self.assertIn(f"/static/dashboard.css?v={api_server._STATIC_VERSIONS['dashboard.css']}", first)
+        self.assertEqual(self.client.get("/static/missing.css").status_code, 404)
+        print("Pages cached per version, rows rendered once.")
+
+    def test_slow_repository_read_does_not_block_other_routes(self):
+        """
+        Repository reads run on the bounded I/O pool, so a cached page is served while a slow read is still running.
+        """
+        print("Test: Async Request Handling")
+        self.client.get("/drones")
+        read_threads = []
+        real_get_page = self.parcel_repo.get_page
+        def slow_get_page(*args, **kwargs):
+            read_threads.append(threading.current_thread().name)
+            time.sleep(0.5)
+            return real_get_page(*args, **kwargs)
+
+        async def requests():
+            transport = httpx.ASGITransport(app=api_server.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                slow = asyncio.ensure_future(client.get("/api/parcels"))
+                await asyncio.sleep(0.05)
+                started = time.perf_counter()
+                page = await client.get("/drones")
+                page_seconds = time.perf_counter() - started
+                return (await slow), page, page_seconds
+
+        with patch.object(self.parcel_repo, "get_page", side_effect=slow_get_page):
+            slow, page, page_seconds = asyncio.run(requests())
+        self.assertEqual(slow.status_code, 200)
+        self.assertEqual(page.status_code, 200)
+        self.assertLess(page_seconds, 0.3)
+        self.assertTrue(read_threads[0].startswith("api-io"))
+        print(f"Cached page served in {page_seconds * 1000:.1f}ms during a 500ms read.")
+
+    def test_metrics_exposition(self):
+        """
+        /metrics exposes the hot path histograms and the fleet gauges in the Prometheus text format.
+        """
+        print("Test: Metrics Endpoint")
+        assigned = REGISTRY.histogram("aerologistics_assign_mission_seconds", "").count()
+        self.logistic_service._predict_drainage = MagicMock(return_value=1.0)
+        start = (datetime.now() + timedelta(hours=1)).strftime("%Y-%m-%d %H:%M:%S")
+        self.logistic_service.assign_a_mission_automatically(3, start)
+        self.assertEqual(REGISTRY.histogram("aerologistics_assign_mission_seconds", "").count(), assigned + 1)
+
+        with patch.object(self.drone_repo, "iter_data", side_effect=AssertionError("full scan on a scrape")), \
+             patch.object(self.parcel_repo, "iter_data", side_effect=AssertionError("full scan on a scrape")):
+            response = self.client.get("/metrics")
+        self.assertTrue(response.headers["content-type"].startswith("text/plain; version=0.0.4"))
+        body = response.text
+        self.assertIn("# TYPE aerologistics_assign_mission_seconds histogram", body)
+        self.assertIn('aerologistics_assign_mission_seconds_bucket{le="+Inf"}', body)
+        self.assertIn('aerologistics_drones{status="IDLE"} 3', body)
+        self.assertIn('aerologistics_drones{status="FLIGHT SCHEDULED"} 1', body)
+        self.assertIn('aerologistics_parcels{status="ASSIGNED"} 1', body)
+        self.assertIn("aerologistics_scheduled_missions 1", body)
+        print("Histograms and gauges exposed.")
+
+    def test_metrics_report_replication_of_composites(self):
+        """
+        Composite repositories expose their replication queue depth and lag per repository, plain ones are left out.
+        """
+        print("Test: Replication Metrics")
+        composite = CompositeRepository(self.drone_repo, [Repository()], async_replication=True)
+        try:
+            api_server.set_repo(DroneService(composite), self.logistic_service)
+            body = self.client.get("/metrics").text
+            self.assertIn('aerologistics_replication_queue_depth{repository="drones"} 0', body)
+            self.assertIn('aerologistics_replication_lag_seconds{repository="drones"} 0', body)
+            self.assertNotIn('repository="parcels"', body)
+        finally:
+            composite.flush()
+        print("Replication depth and lag exposed.")
+
+    def test_histogram_buckets_are_cumulative(self):
+        """
+        Observations land in the first bucket whose bound is not below them and bucket counts are cumulative.
+        """
+        print("Test: Metrics Histogram")
+        registry = MetricsRegistry()
+        histogram = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.observe(value, operation="update")
+        with histogram.time(operation="commit"):
+            pass
+        registry.counter("writes_total", "Writes").inc(2)
+        body = registry.render()
+        self.assertIn('latency_seconds_bucket{operation="update",le="0.1"} 2', body)
+        self.assertIn('latency_seconds_bucket{operation="update",le="1.0"} 3', body)
+        self.assertIn('latency_seconds_bucket{operation="update",le="+Inf"} 4', body)
+        self.assertIn('latency_seconds_count{operation="update"} 4', body)
+        self.assertEqual(histogram.count(operation="commit"), 1)
+        self.assertIn("writes_total 2", body)
+        with self.assertRaises(ValueError):
+            registry.gauge("writes_total", "Writes")
+        print("Cumulative buckets rendered.")
+
+    def test_ndjson_upload_endpoint(self):
+        """
+        The ingest endpoint streams an NDJSON upload into the repository and answers with the rejected lines.
+        """
+        print("Test: Bulk Parcel Upload")
+        body = "\n".join([json.dumps({"id": 10 + i, "recipient_name": f"R{i}", "delivery_address": "Addr",
+                                       "weight": 1.0, "priority": "HIGH", "distance": 3}) for i in range(5)]
+                         + ["{not json", json.dumps({"id": 3, "recipient_name": "Dup", "delivery_address": "Addr",
+                                                     "weight": 1.0, "distance": 3}), "[1, 2]"])
+        response = self.client.post("/api/parcels/ingest", params={"chunk_size": 2}, content=body.encode(),
+                                    headers={"Content-Type": "application/x-ndjson"})
+        result = response.json()
+        self.assertEqual((result["added"], result["failed"]), (5, 3))
+        self.assertEqual([error["line"] for error in result["errors"]], [6, 7, 8])
+        self.assertIn("already exists", result["errors"][1]["error"])
+        self.assertEqual(self.parcel_repo.search_by_id(14).get_priority(), Priority.HIGH)
+        self.assertEqual(self.client.post("/api/parcels/ingest", params={"format": "xml"}, content=b"").status_code, 400)
+        print("Upload imported with per-line errors.")
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file